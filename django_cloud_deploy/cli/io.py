@@ -105,6 +105,71 @@ class _ProgressBar(object):
             time.sleep(0.5)
 
 
+class _TransferProgressBar(object):
+    """A progress bar showing how many bytes of a transfer are done.
+
+    Output of the progress bar will be like the following:
+        <message>|██████████∙∙∙∙∙∙∙∙| 12.3/40.0 MiB
+    """
+
+    # The bar shows the done fraction of the transfer in this many steps.
+    _STEPS = 1000
+
+    def __init__(self, message: str, tty: bool = True, width: int = 80):
+        """Constructor of the class.
+
+        Args:
+            message: A prefix of the progress bar showing what it is about.
+            tty: Whether the progress bar is being used in a terminal.
+            width: Width of the whole progress bar, including the prefix and
+                suffix.
+        """
+        self._tty = tty
+        self._size = progressbar.FormatCustomText(
+            '%(done).1f/%(total).1f MiB', {
+                'done': 0.0,
+                'total': 0.0
+            })
+        if tty:
+            widgets = [
+                message,
+                progressbar.Bar(marker='█', fill='∙'), ' ', self._size
+            ]
+        else:
+            # Not showing progress bar when not writing to an interactive
+            # console. This is because the progress bar might not show properly.
+            widgets = [message, ' ', self._size]
+        self._bar = progressbar.ProgressBar(
+            widgets=widgets, max_value=self._STEPS, term_width=width)
+        self._bar_lock = threading.Lock()
+
+    def start(self):
+        with self._bar_lock:
+            self._bar.start()
+
+    def update(self, done_bytes: int, total_bytes: int):
+        """Show the progress of the transfer.
+
+        Args:
+            done_bytes: How many bytes are transferred so far.
+            total_bytes: How many bytes are known to be transferred in total.
+                It can grow during the transfer.
+        """
+        with self._bar_lock:
+            self._size.update_mapping(
+                done=done_bytes / 2**20, total=total_bytes / 2**20)
+            if self._tty and total_bytes:
+                self._bar.update(
+                    min(self._STEPS, self._STEPS * done_bytes // total_bytes),
+                    force=True)
+
+    def finish(self):
+        with self._bar_lock:
+            if self._tty:
+                self._bar.update(self._STEPS)
+            self._bar.finish()
+
+
 class IO(abc.ABC):
 
     def __init__(self):
@@ -138,6 +203,20 @@ class IO(abc.ABC):
     def getpass(self, prompt=None):
         """Prompt the user for a password and return the result."""
 
+    @contextlib.contextmanager
+    def transfer_progressbar(self, message: str):
+        """A context manager that shows the progress of a data transfer.
+
+        Args:
+            message: A prefix of the progress bar showing what it is about.
+
+        Yields:
+            A function to call with the number of bytes transferred so far and
+            the total number of bytes known to be transferred.
+        """
+        del message  # Unused by default.
+        yield lambda done_bytes, total_bytes: None
+
 
 class ConsoleIO(IO):
     BOLD = '\033[1m'
@@ -195,6 +274,31 @@ class ConsoleIO(IO):
         finally:
             progress_bar.finish()
 
+    @contextlib.contextmanager
+    def transfer_progressbar(self, message: str):
+        """A context manager that shows the progress of a data transfer.
+
+        Output of the progress bar will be like the following:
+            <message>|██████████∙∙∙∙∙∙∙∙| 12.3/40.0 MiB
+
+        Unlike "progressbar", the bar moves only when the yielded function is
+        called, so it reflects the real progress of the transfer.
+
+        Args:
+            message: A prefix of the progress bar showing what it is about.
+
+        Yields:
+            A function to call with the number of bytes transferred so far and
+            the total number of bytes known to be transferred.
+        """
+        is_tty = os.isatty(sys.stdout.fileno())
+        progress_bar = _TransferProgressBar(message, tty=is_tty)
+        try:
+            progress_bar.start()
+            yield progress_bar.update
+        finally:
+            progress_bar.finish()
+
 
 class TestIO(IO):
 
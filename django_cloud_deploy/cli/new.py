@@ -16,9 +16,7 @@
 import argparse
 
 from django_cloud_deploy import tool_requirements
-from django_cloud_deploy import workflow
 from django_cloud_deploy.cli import io
-from django_cloud_deploy.cli import prompt
 
 
 def add_arguments(parser):
@@ -83,6 +81,13 @@ def add_arguments(parser):
         choices=['gae', 'gke'],
         help='The desired backend to deploy the Django App on.')
 
+    parser.add_argument(
+        '--redis',
+        dest='redis',
+        action='store_true',
+        help=('Create a Memorystore Redis instance to cache data and sessions '
+              'of the Django App. Only supported with "--backend=gke".'))
+
     parser.add_argument(
         '--credentials',
         dest='credentials',
@@ -117,6 +122,11 @@ def add_arguments(parser):
 
 
 def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
+    # The workflow imports the Google Cloud, Django and Kubernetes libraries,
+    # which are slow to import. Importing it here keeps "--help" fast.
+    from django_cloud_deploy import workflow
+    from django_cloud_deploy.cli import prompt
+
     if not tool_requirements.check_and_handle_requirements(
             console, args.backend):
         return
@@ -154,11 +164,14 @@ def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
             required_service_accounts=actual_parameters['service_accounts'],
             appengine_service_name=actual_parameters['appengine_service_name'],
             cloud_storage_bucket_name=actual_parameters['bucket_name'],
-            backend=args.backend)
+            backend=args.backend,
+            redis=getattr(args, 'redis', False))
         return admin_url
     except workflow.ProjectExistsError:
         console.error('A project with id "{}" already exists'.format(
             actual_parameters['project_id']))
+    except workflow.UnsupportedOptionError as e:
+        console.error(str(e))
 
 
 if __name__ == '__main__':
@@ -18,8 +18,6 @@ import argparse
 from django_cloud_deploy import config
 from django_cloud_deploy import tool_requirements
 from django_cloud_deploy.cli import io
-from django_cloud_deploy.cli import prompt
-import django_cloud_deploy.workflow as workflow
 
 
 class InvalidConfigError(Exception):
@@ -39,6 +37,13 @@ def add_arguments(parser):
         dest='database_password',
         help='The password for the default database user.')
 
+    parser.add_argument(
+        '--delete-stale-static',
+        dest='delete_stale_static',
+        action='store_true',
+        help=('Delete static files from the Cloud Storage bucket which do not '
+              'exist in the Django project anymore.'))
+
     parser.add_argument(
         '--credentials',
         dest='credentials',
@@ -47,6 +52,10 @@ def add_arguments(parser):
 
 
 def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
+    # The workflow imports the Google Cloud, Django and Kubernetes libraries,
+    # which are slow to import. Importing it here keeps "--help" fast.
+    from django_cloud_deploy import workflow
+    from django_cloud_deploy.cli import prompt
 
     root_prompt = prompt.RootPrompt()
     actual_parameters = root_prompt.prompt(prompt.Command.UPDATE, console,
@@ -71,7 +80,8 @@ def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
         actual_parameters['credentials'])
     workflow_manager.update_project(
         actual_parameters['django_directory_path_update'],
-        actual_parameters['database_password'])
+        actual_parameters['database_password'],
+        delete_stale_static=getattr(args, 'delete_stale_static', False))
 
 
 if __name__ == '__main__':
@@ -15,6 +15,7 @@
 
 from typing import Any, Dict, List
 
+from django_cloud_deploy.cloudlib import discovery_client
 from googleapiclient import discovery
 from google.auth import credentials
 
@@ -32,11 +33,7 @@ class BillingClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build(
-                'cloudbilling',
-                'v1',
-                credentials=credentials,
-                cache_discovery=False))
+            discovery_client.build('cloudbilling', 'v1', credentials))
 
     def check_billing_enabled(self, project_id: str) -> bool:
         """Check is billing enabled for the given project.
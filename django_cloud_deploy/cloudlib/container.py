@@ -19,12 +19,21 @@ service exposing.
 
 import atexit
 import base64
+from concurrent import futures
+import hashlib
 import json
+import math
 import os
+import tarfile
 import tempfile
+import threading
 import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import operation
 import docker
+from docker.utils import build as docker_build
 from googleapiclient import discovery
 from googleapiclient import errors
 import jinja2
@@ -36,6 +45,42 @@ from google.auth.transport import requests
 _TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'data')
 _CLUSTER_TEMPLATE_NAME = 'cluster_definition.json'
 
+# Pod template annotation changed to replace all pods of a deployment.
+_RESTARTED_AT_ANNOTATION = 'kubectl.kubernetes.io/restartedAt'
+
+# Seconds to wait for a new cluster to be running. Creating a cluster usually
+# takes a few minutes.
+_CLUSTER_CREATION_TIMEOUT = 30 * 60
+
+# Seconds to wait for the pods of a deployment to be updated. This is longer
+# than the progress deadline in the generated deployment, so a stuck rollout
+# is reported with the reason given by Kubernetes.
+_ROLLOUT_TIMEOUT = 15 * 60
+
+# Seconds to wait for a new deployment to have a ready pod, and for a new
+# LoadBalancer service to get an external address.
+_READY_TIMEOUT = 10 * 60
+
+# Kubernetes API classes and the resource names in their methods, keyed by the
+# apiVersion and kind of the objects apply_manifests supports.
+_APPLY_METHODS = {
+    ('v1', 'ConfigMap'): ('CoreV1Api', 'namespaced_config_map'),
+    ('v1', 'Secret'): ('CoreV1Api', 'namespaced_secret'),
+    ('v1', 'Service'): ('CoreV1Api', 'namespaced_service'),
+    ('apps/v1', 'Deployment'): ('AppsV1Api', 'namespaced_deployment'),
+    ('autoscaling/v1', 'HorizontalPodAutoscaler'):
+        ('AutoscalingV1Api', 'namespaced_horizontal_pod_autoscaler'),
+    ('extensions/v1beta1', 'Deployment'): ('ExtensionsV1beta1Api',
+                                           'namespaced_deployment'),
+}
+
+# Kinds of objects referred to by other objects, which are applied first.
+_APPLY_FIRST_KINDS = ('ConfigMap', 'Secret')
+
+# Longest watch request, in seconds. The API server closes watches after a few
+# minutes anyway, after which the watch resumes from the last seen version.
+_WATCH_REQUEST_TIMEOUT = 5 * 60
+
 
 class ContainerCreationError(Exception):
     """Exception raised in container creation."""
@@ -47,6 +92,414 @@ class ClusterGetInfoError(Exception):
     pass
 
 
+class ImageBuildError(Exception):
+    """Exception raised in building a docker image."""
+    pass
+
+
+class ImagePushError(Exception):
+    """Exception raised in pushing a docker image."""
+    pass
+
+
+class DeploymentRolloutError(Exception):
+    """Exception raised when the pods of a deployment fail to be updated."""
+    pass
+
+
+class ManifestApplyError(Exception):
+    """Exception raised when Kubernetes objects fail to be applied."""
+    pass
+
+
+class WatchTimeoutError(Exception):
+    """Kubernetes objects did not reach the expected state before a deadline."""
+    pass
+
+
+class _LayerProgress(object):
+    """Sums the per-layer progress reported by docker pulls and pushes.
+
+    Docker reports the progress of each layer separately in its JSON message
+    stream, e.g.
+        {"id": "4e9a", "status": "Pushing",
+         "progressDetail": {"current": 512, "total": 2048}}
+    """
+
+    # Statuses reporting bytes transferred. "Extracting" is not included, as it
+    # counts the same bytes again.
+    _TRANSFER_STATUSES = ('Downloading', 'Pushing')
+
+    # Statuses meaning that a layer does not need more bytes transferred.
+    _DONE_STATUSES = ('Download complete', 'Pull complete', 'Already exists',
+                      'Pushed', 'Layer already exists')
+
+    def __init__(self, callback: Optional[Callable[[int, int], None]]):
+        """Constructor of the class.
+
+        Args:
+            callback: Called with the number of bytes transferred so far and
+                the total number of bytes known to be transferred, whenever
+                they change.
+        """
+        self._callback = callback
+        # Maps layer ids to [transferred bytes, total bytes].
+        self._layers = {}  # type: Dict[str, List[int]]
+
+    def update(self, message: Dict[str, Any]):
+        """Update the progress with a message of a docker JSON stream."""
+        layer_id = message.get('id')
+        status = message.get('status')
+        if not layer_id or not self._callback:
+            return
+        detail = message.get('progressDetail') or {}
+        if status in self._TRANSFER_STATUSES and detail.get('total'):
+            self._layers[layer_id] = [detail.get('current', 0), detail['total']]
+        elif status in self._DONE_STATUSES and layer_id in self._layers:
+            self._layers[layer_id][0] = self._layers[layer_id][1]
+        else:
+            return
+        self._callback(
+            sum(layer[0] for layer in self._layers.values()),
+            sum(layer[1] for layer in self._layers.values()))
+
+
+class TransferProgress(object):
+    """Reports the sum of several concurrent or sequential transfers.
+
+    Example:
+        progress = TransferProgress(callback)
+        pull(progress_callback=progress.transfer('pull'))
+        push(progress_callback=progress.transfer('push'))
+    """
+
+    def __init__(self, callback: Optional[Callable[[int, int], None]]):
+        """Constructor of the class.
+
+        Args:
+            callback: Called with the number of bytes transferred so far and
+                the total number of bytes known to be transferred, summed over
+                all transfers.
+        """
+        self._callback = callback
+        self._transfers = {}  # type: Dict[str, Tuple[int, int]]
+
+    def transfer(self, name: str) -> Callable[[int, int], None]:
+        """Returns the progress callback of a single transfer.
+
+        Args:
+            name: A name unique to the transfer.
+        """
+
+        def callback(done_bytes: int, total_bytes: int):
+            self._transfers[name] = (done_bytes, total_bytes)
+            if self._callback:
+                self._callback(
+                    sum(done for done, _ in self._transfers.values()),
+                    sum(total for _, total in self._transfers.values()))
+
+        return callback
+
+
+class BuildContext(object):
+    """The files docker needs to build an image, as a streamed tar archive.
+
+    The docker SDK writes the whole directory, minus the files excluded by
+    ".dockerignore", to a temporary tar file before sending it to the docker
+    daemon. Instead, this class prunes files which are never needed to build
+    the image of a Django app and generates the archive while it is sent.
+
+    Attributes:
+        size: Number of bytes of the tar archive.
+        file_count: Number of regular files in the archive.
+        fingerprint: A hex string which changes when any file in the build
+            context is added, removed or changed.
+    """
+
+    # Files never needed in the image even if ".dockerignore" does not exclude
+    # them. Patterns in ".dockerignore" can still include them with "!".
+    _DEFAULT_IGNORE_PATTERNS = ['.git', '.tox', '**/__pycache__', '**/*.pyc']
+
+    _BLOCK_SIZE = tarfile.BLOCKSIZE
+    _CHUNK_SIZE = 1 << 16
+
+    def __init__(self,
+                 directory: str,
+                 ignore_patterns: Optional[List[str]] = None):
+        """Constructor of the class.
+
+        Args:
+            directory: Absolute path of the directory containing a Dockerfile.
+            ignore_patterns: Additional patterns, in ".dockerignore" syntax, of
+                files to leave out of the build context.
+        """
+        self._directory = directory
+        patterns = list(self._DEFAULT_IGNORE_PATTERNS)
+        patterns.extend(self._find_virtualenvs(directory))
+        dockerignore_path = os.path.join(directory, '.dockerignore')
+        if os.path.exists(dockerignore_path):
+            with open(dockerignore_path) as dockerignore_file:
+                # Same parsing as docker.api.build.
+                patterns.extend(
+                    line.strip()
+                    for line in dockerignore_file.read().splitlines()
+                    if line.strip() and not line.strip().startswith('#'))
+        patterns.extend(ignore_patterns or [])
+
+        # Tuples of (tar header, absolute path of the content or None, content
+        # size, content hash) for every member of the archive.
+        self._members = []  # type: List[Tuple[bytes, Optional[str], int, str]]
+        self.size = 2 * self._BLOCK_SIZE  # End of archive marker.
+        self.file_count = 0
+        fingerprint = hashlib.sha256()
+        for path in sorted(docker_build.exclude_paths(directory, patterns)):
+            full_path = os.path.join(directory, path)
+            stat = os.lstat(full_path)
+            tar_info = tarfile.TarInfo(path)
+            tar_info.mode = stat.st_mode & 0o7777
+            tar_info.mtime = int(stat.st_mtime)
+            content_path, content_size = None, 0
+            if os.path.islink(full_path):
+                kind, content_hash = 'link', os.readlink(full_path)
+                tar_info.type = tarfile.SYMTYPE
+                tar_info.linkname = content_hash
+            elif os.path.isdir(full_path):
+                kind, content_hash = 'dir', ''
+                tar_info.type = tarfile.DIRTYPE
+            else:
+                kind = 'exec' if os.access(full_path, os.X_OK) else 'file'
+                content_hash = self._hash_file(full_path)
+                self.file_count += 1
+                content_path, content_size = full_path, stat.st_size
+                tar_info.size = content_size
+            fingerprint.update('{}\0{}\0{}\n'.format(
+                path, kind, content_hash).encode('utf-8'))
+            header = tar_info.tobuf(tarfile.PAX_FORMAT, 'utf-8',
+                                    'surrogateescape')
+            self._members.append(
+                (header, content_path, content_size, content_hash))
+            self.size += len(header) + self._padded_size(content_size)
+        self.fingerprint = fingerprint.hexdigest()
+
+    @staticmethod
+    def _find_virtualenvs(directory: str) -> List[str]:
+        """Returns the names of virtualenvs in the top level of a directory."""
+        names = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if (os.path.isfile(os.path.join(path, 'pyvenv.cfg')) or
+                    os.path.isfile(os.path.join(path, 'bin', 'activate'))):
+                names.append(name)
+        return names
+
+    def _hash_file(self, path: str) -> str:
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self._CHUNK_SIZE), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    def _padded_size(self, size: int) -> int:
+        return -(-size // self._BLOCK_SIZE) * self._BLOCK_SIZE
+
+    def stream(self,
+               progress_callback: Optional[Callable[[int, int], None]] = None
+              ) -> Iterator[bytes]:
+        """Generate the tar archive of the build context.
+
+        Args:
+            progress_callback: Called with the number of bytes generated so far
+                and the size of the archive, after each file.
+
+        Yields:
+            Chunks of the tar archive.
+
+        Raises:
+            ImageBuildError: If a file changed since the build context was
+                created. The archive and its fingerprint would not match
+                otherwise.
+        """
+        sent = 0
+        if progress_callback:
+            progress_callback(sent, self.size)
+        for header, content_path, content_size, content_hash in self._members:
+            yield header
+            sent += len(header)
+            if content_path:
+                file_hash = hashlib.sha256()
+                remaining = content_size
+                with open(content_path, 'rb') as f:
+                    while remaining:
+                        chunk = f.read(min(remaining, self._CHUNK_SIZE))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        file_hash.update(chunk)
+                        yield chunk
+                    grew = bool(f.read(1))
+                if (remaining or grew or
+                        file_hash.hexdigest() != content_hash):
+                    raise ImageBuildError(
+                        'File "{}" changed while building the image. Please '
+                        'try again.'.format(content_path))
+                yield b'\0' * (self._padded_size(content_size) - content_size)
+                sent += self._padded_size(content_size)
+            if progress_callback:
+                progress_callback(sent, self.size)
+        yield b'\0' * (2 * self._BLOCK_SIZE)
+        if progress_callback:
+            progress_callback(self.size, self.size)
+
+
+def _matches_live_object(desired: Any, live: Any) -> bool:
+    """Returns whether a live Kubernetes object matches its definition.
+
+    The API server fills in defaults and status fields which the definition
+    does not set, so only the fields set in the definition are compared.
+
+    Args:
+        desired: The definition of the object, or a field of it.
+        live: The serialized live object, or the same field of it.
+    """
+    if desired is None:
+        # Fields set to null in YAML, e.g. "emptyDir:", are defaulted by the
+        # API server.
+        return True
+    if isinstance(desired, dict):
+        return isinstance(live, dict) and all(
+            _matches_live_object(value, live.get(key))
+            for key, value in desired.items())
+    if isinstance(desired, list):
+        return (isinstance(live, list) and len(desired) == len(live) and all(
+            _matches_live_object(desired_item, live_item)
+            for desired_item, live_item in zip(desired, live)))
+    return desired == live
+
+
+class _GoogleAuthConfiguration(kubernetes.client.Configuration):
+    """A kubernetes configuration authorizing requests with Google credentials.
+
+    The OAuth2 access token of the credentials is refreshed whenever it
+    expired, so that one configuration can be used for a whole deployment.
+    """
+
+    def set_credentials(self, creds: credentials.Credentials):
+        self._credentials = creds
+        self._refresh_lock = threading.Lock()
+        # Configuration objects share these dictionaries with the default
+        # configuration unless they are replaced.
+        self.api_key = {'authorization': creds.token}
+        self.api_key_prefix = {'authorization': 'Bearer'}
+
+    def get_api_key_with_prefix(self, identifier: str) -> Optional[str]:
+        if identifier == 'authorization':
+            with self._refresh_lock:
+                if not self._credentials.valid:
+                    self._credentials.refresh(requests.Request())
+                self.api_key['authorization'] = self._credentials.token
+        return super().get_api_key_with_prefix(identifier)
+
+
+class _ClusterSession(object):
+    """Connection state for the Kubernetes API server of a GKE cluster.
+
+    Attributes:
+        configuration: A kubernetes configuration which has access to the
+            cluster.
+        api_client: A kubernetes API client using the configuration. Its
+            connection pool keeps connections to the API server alive between
+            calls, and is safe to use from several threads.
+    """
+
+    def __init__(self, configuration: kubernetes.client.Configuration):
+        self.configuration = configuration
+        self.api_client = kubernetes.client.ApiClient(configuration)
+
+
+def _watch_until(list_func: Callable[..., Any],
+                 predicate: Callable[[Any], Any],
+                 description: str,
+                 timeout: Optional[float] = None,
+                 **kwargs) -> Any:
+    """Watch Kubernetes objects until one of them satisfies a predicate.
+
+    The objects are listed once, to check their current state and get the
+    resource version to watch from. Afterwards the API server pushes every
+    change of the objects, so there is no polling.
+
+    Args:
+        list_func: The API method listing the objects, e.g.
+            CoreV1Api.list_namespaced_service.
+        predicate: Called with every version of the objects. Returns a truthy
+            value once an object is in the expected state, and may raise an
+            exception once it can not get there anymore.
+        description: A human readable description used in error messages.
+        timeout: Number of seconds to wait. Waits forever if None.
+        **kwargs: Arguments of list_func selecting the objects, e.g.
+            namespace and label_selector.
+
+    Returns:
+        The first truthy value returned by predicate.
+
+    Raises:
+        WatchTimeoutError: If no object satisfies the predicate before the
+            timeout.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    resource_version = None
+    while True:
+        if resource_version is None:
+            object_list = list_func(**kwargs)
+            for obj in object_list.items:
+                result = predicate(obj)
+                if result:
+                    return result
+            resource_version = object_list.metadata.resource_version
+
+        request_timeout = _WATCH_REQUEST_TIMEOUT
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WatchTimeoutError(
+                    '{} did not finish in {} seconds'.format(
+                        description, timeout))
+            request_timeout = min(request_timeout, remaining)
+        request_timeout = max(1, int(math.ceil(request_timeout)))
+
+        watcher = kubernetes.watch.Watch()
+        # The server ends the watch after timeout_seconds. The client side
+        # timeout only guards against connections dropped silently.
+        events = watcher.stream(
+            list_func,
+            resource_version=resource_version,
+            timeout_seconds=request_timeout,
+            _request_timeout=request_timeout + 10,
+            **kwargs)
+        try:
+            for event in events:
+                if event['type'] == 'ERROR':
+                    status = event['raw_object']
+                    # The resource version is too old to watch from, list the
+                    # objects again.
+                    if status.get('code') == 410:
+                        resource_version = None
+                        break
+                    raise kubernetes.client.rest.ApiException(
+                        status=status.get('code'),
+                        reason=status.get('message'))
+                resource_version = watcher.resource_version
+                if event['type'] in ('ADDED', 'MODIFIED'):
+                    result = predicate(event['object'])
+                    if result:
+                        return result
+        except kubernetes.client.rest.ApiException as e:
+            if e.status != 410:
+                raise
+            resource_version = None
+        finally:
+            events.close()
+
+
 class ContainerClient(object):
     """The class for deployment of a Django app to gke.
 
@@ -68,6 +521,17 @@ class ContainerClient(object):
     # remove them after the program exists.
     _temp_ca_files = []
 
+    # Maximum number of Kubernetes objects applied concurrently.
+    APPLY_WORKERS = 4
+
+    # Sessions of the clusters accessed so far, keyed by credentials, project
+    # id, zone and cluster name, and by their kubernetes configuration.
+    _cluster_sessions = {
+    }  # type: Dict[Tuple[Any, str, str, str], _ClusterSession]
+    _sessions_by_configuration = {
+    }  # type: Dict[kubernetes.client.Configuration, _ClusterSession]
+    _cluster_sessions_lock = threading.Lock()
+
     def __init__(self, container_service: discovery.Resource,
                  credentials: credentials.Credentials):
         self._container_service = container_service
@@ -90,11 +554,7 @@ class ContainerClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build(
-                'container',
-                'v1',
-                credentials=credentials,
-                cache_discovery=False), credentials)
+            discovery_client.build('container', 'v1', credentials), credentials)
 
     @staticmethod
     def _load_cluster_definition_template():
@@ -124,7 +584,8 @@ class ContainerClient(object):
                             project_id: str,
                             cluster_name: str,
                             region: str = 'us-west1',
-                            zone: str = 'us-west1-a'):
+                            zone: str = 'us-west1-a',
+                            cancel_event: Optional[threading.Event] = None):
         """Create a cluster with your GCP account.
 
         Available region and zones can be found on
@@ -136,6 +597,8 @@ class ContainerClient(object):
             region: Where do you want to host the cluster.
             zone: Name of the Google Compute Engine zone in which the cluster
                 resides.
+            cancel_event: When this event is set, waiting for the cluster
+                stops.
 
         Raises:
             ContainerCreationError: If unable to create a cluster.
@@ -158,7 +621,9 @@ class ContainerClient(object):
         request = self._container_service.projects().zones().clusters().create(
             projectId=project_id, zone=zone, body=body)
         try:
-            request.execute()
+            response = request.execute()
+            cluster_operation = operation.container_operation(
+                self._container_service, project_id, zone, response)
         except errors.HttpError as e:
             if e.resp.status == 403:
                 raise ContainerCreationError(
@@ -166,29 +631,43 @@ class ContainerClient(object):
                      'project: "{}"').format(project_id))
             elif e.resp.status == 409:
                 # Cluster with the same name already exist. It is fine to reuse
-                # the same cluster for deployment.
-                pass
+                # the same cluster for deployment. There is no creation
+                # operation to wait for, so wait for the cluster itself.
+                cluster_operation = self._cluster_running_operation(
+                    project_id, cluster_name, zone)
             else:
                 raise ContainerCreationError(
                     ('Unexpected error when creating cluster "{}" in '
                      'project "{}"').format(cluster_name, project_id)) from e
 
-        while True:
-            request = self._container_service.projects().zones().clusters().get(
-                projectId=project_id, zone=zone, clusterId=cluster_name)
-            response = request.execute()
+        try:
+            operation.wait(cluster_operation, _CLUSTER_CREATION_TIMEOUT,
+                           cancel_event)
+        except operation.OperationError as e:
+            raise ContainerCreationError(
+                'Unable to create cluster "{}" in project "{}": {}'.format(
+                    cluster_name, project_id, e)) from e
+
+    def _cluster_running_operation(self, project_id: str, cluster_name: str,
+                                   zone: str) -> operation.Operation:
+        """Returns an operation which is done when the cluster is running."""
 
+        def get_error(cluster):
             # Possible status:
             # https://cloud.google.com/kubernetes-engine/docs/reference/rest/v1/projects.zones.clusters#Status
-            if response['status'] == 'RUNNING':
-                return
-            elif response['status'] == 'PROVISIONING':
-                time.sleep(2)
-                continue
-            else:
-                raise ContainerCreationError(
-                    'Unexpected cluster status after creation: {!r}'.format(
-                        response['status']))
+            if cluster['status'] not in ('RUNNING', 'PROVISIONING',
+                                         'RECONCILING'):
+                return 'Unexpected cluster status: {!r}'.format(
+                    cluster['status'])
+            return None
+
+        return operation.Operation(
+            'Cluster "{}" provisioning'.format(cluster_name),
+            lambda: self._container_service.projects().zones().clusters().get(
+                projectId=project_id, zone=zone, clusterId=cluster_name
+            ).execute(),
+            lambda cluster: cluster['status'] == 'RUNNING',
+            get_error)
 
     def create_kubernetes_configuration(
             self,
@@ -198,6 +677,10 @@ class ContainerClient(object):
             zone: str = 'us-west1-a') -> kubernetes.client.Configuration:
         """Create a kubernetes config which has access to the given cluster.
 
+        The configuration is created once per cluster and credentials, and
+        reused by later calls. It refreshes the access token of the
+        credentials when needed.
+
         Args:
             credentials: The credentials object used to generate tokens to
                 access kubernetes clusters.
@@ -212,6 +695,25 @@ class ContainerClient(object):
         Returns:
             A kubernetes configuration which has access to the provided cluster.
         """
+        key = (credentials, project_id, zone, cluster_name)
+        with self._cluster_sessions_lock:
+            session = self._cluster_sessions.get(key)
+            if session is None:
+                session = _ClusterSession(
+                    self._create_kubernetes_configuration(
+                        credentials, project_id, cluster_name, zone))
+                self._cluster_sessions[key] = session
+                self._sessions_by_configuration[session.configuration] = (
+                    session)
+            return session.configuration
+
+    def _create_kubernetes_configuration(
+            self, credentials: credentials.Credentials, project_id: str,
+            cluster_name: str, zone: str) -> kubernetes.client.Configuration:
+        """Create a new kubernetes config which has access to the cluster.
+
+        See create_kubernetes_configuration.
+        """
 
         # This function will create a temporary file for cluster ca certificate.
         # Those temporary files should be removed after the program exists.
@@ -241,32 +743,272 @@ class ContainerClient(object):
         self._temp_ca_files.append(ca_file_path)
         with open(ca_file_path, 'wb') as ca_file:
             ca_file.write(base64.standard_b64decode(ca))
-        configuration = kubernetes.client.Configuration()
-        configuration.api_key['authorization'] = credentials.token
-        configuration.api_key_prefix['authorization'] = 'Bearer'
+        configuration = _GoogleAuthConfiguration()
+        configuration.set_credentials(credentials)
         configuration.host = 'https://' + response['endpoint']
         configuration.ssl_ca_cert = ca_file_path
         return configuration
 
-    def build_docker_image(self, tag: str, directory: str):
+    def _get_api_client(
+            self, configuration: Optional[kubernetes.client.Configuration]
+    ) -> kubernetes.client.ApiClient:
+        """Returns a kubernetes API client using the given configuration.
+
+        Configurations created by create_kubernetes_configuration share one API
+        client, and thus its connections to the API server.
+
+        Args:
+            configuration: A kubernetes configuration. If not set, the API
+                client uses the default kubernetes configuration.
+        """
+        with self._cluster_sessions_lock:
+            session = self._sessions_by_configuration.get(configuration)
+        if session is not None:
+            return session.api_client
+        return kubernetes.client.ApiClient(configuration)
+
+    def build_docker_image(
+            self,
+            tag: str,
+            directory: str,
+            cache_from: Optional[List[str]] = None,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+            context: Optional[BuildContext] = None):
         """Build docker image.
 
         Args:
             tag: Docker image tag. Should looks similar to
                 "gcr.io/<project_id>/<image_name>"
             directory: Absolute path of the directory containing a Dockerfile.
+            cache_from: Tags of images whose layers can be reused by the build,
+                usually the previously pushed image of the app. They are pulled
+                first, so that machines without a local build cache (e.g. CI
+                machines) reuse layers from the registry. Images which cannot
+                be pulled are ignored.
+            progress_callback: Called with the number of bytes transferred so
+                far and the total number of bytes known to be transferred,
+                while pulling images and sending the build context to the
+                docker daemon.
+            context: The build context of the directory, if already created
+                by get_build_context.
+
+        Raises:
+            ImageBuildError: If the image failed to build.
         """
+        context = context or self.get_build_context(directory)
+        transfer_progress = TransferProgress(progress_callback)
+        layer_progress = _LayerProgress(transfer_progress.transfer('pull'))
+        pulled_images = [
+            image for image in cache_from or []
+            if self._pull_docker_image(image, layer_progress)
+        ]
+        messages = self._docker_client.api.build(
+            fileobj=context.stream(transfer_progress.transfer('context')),
+            custom_context=True,
+            tag=tag,
+            cache_from=pulled_images or None,
+            rm=True,
+            decode=True)
+        for message in messages:
+            if 'error' in message:
+                raise ImageBuildError('Failed to build image "{}": {}'.format(
+                    tag, message['error']))
+            # Base images pulled by the build report their progress too.
+            layer_progress.update(message)
 
-        self._docker_client.images.build(tag=tag, path=directory)
+    def _pull_docker_image(self, tag: str,
+                           layer_progress: '_LayerProgress') -> bool:
+        """Pull a docker image, returning whether it succeeded."""
+        repository, image_tag = docker.utils.parse_repository_tag(tag)
+        try:
+            for message in self._docker_client.api.pull(
+                    repository, tag=image_tag or 'latest', stream=True,
+                    decode=True):
+                if 'error' in message:
+                    return False
+                layer_progress.update(message)
+        except docker.errors.APIError:
+            return False
+        return True
 
-    def push_docker_image(self, tag: str):
+    def push_docker_image(
+            self,
+            tag: str,
+            progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[str]:
         """Push docker image.
 
         Args:
             tag: Docker image tag. Should looks similar to
                 "gcr.io/<project_id>/<image_name>"
+            progress_callback: Called with the number of bytes uploaded so far
+                and the total number of bytes to upload.
+
+        Returns:
+            The digest of the pushed image, e.g. "sha256:0123...", or None if
+            the registry did not report it.
+
+        Raises:
+            ImagePushError: If the registry rejected the image.
+        """
+        layer_progress = _LayerProgress(progress_callback)
+        digest = None
+        # See https://docs.docker.com/engine/api/v1.37/#operation/ImagePush
+        for message in self._docker_client.api.push(
+                tag, stream=True, decode=True):
+            if 'error' in message:
+                raise ImagePushError('Failed to push image "{}": {}'.format(
+                    tag, message['error']))
+            layer_progress.update(message)
+            digest = message.get('aux', {}).get('Digest', digest)
+        return digest
+
+    def get_remote_image_digest(self, tag: str) -> Optional[str]:
+        """Returns the digest of an image in its registry.
+
+        Args:
+            tag: Docker image tag. Should looks similar to
+                "gcr.io/<project_id>/<image_name>"
+
+        Returns:
+            The digest of the image the tag points to in the registry, e.g.
+            "sha256:0123...", or None if the registry does not have the tag.
+        """
+        try:
+            return self._docker_client.images.get_registry_data(tag).id
+        except docker.errors.APIError:
+            return None
+
+    @staticmethod
+    def get_build_context(
+            directory: str,
+            ignore_patterns: Optional[List[str]] = None) -> BuildContext:
+        """Returns the files docker uses to build an image of a directory.
+
+        Args:
+            directory: Absolute path of the directory containing a Dockerfile.
+            ignore_patterns: Additional patterns, in ".dockerignore" syntax, of
+                files to leave out of the build context.
+        """
+        return BuildContext(directory, ignore_patterns)
+
+    @classmethod
+    def get_build_context_fingerprint(
+            cls, directory: str,
+            ignore_patterns: Optional[List[str]] = None) -> str:
+        """Returns a hash of the files docker uses to build an image.
+
+        Files excluded by the ".dockerignore" file of the directory do not
+        change the fingerprint, because they are not sent to the docker
+        daemon.
+
+        Args:
+            directory: Absolute path of the directory containing a Dockerfile.
+            ignore_patterns: Additional patterns, in ".dockerignore" syntax, of
+                files which should not change the fingerprint.
+
+        Returns:
+            A hex string which changes when any file in the build context is
+            added, removed or changed.
         """
-        self._docker_client.images.push(tag)
+        return cls.get_build_context(directory, ignore_patterns).fingerprint
+
+    def apply_manifests(
+            self,
+            manifests: List[Dict[str, Any]],
+            configuration: (
+                kubernetes.client.configuration.Configuration) = None,
+            namespace: str = 'default') -> Dict[str, str]:
+        """Create or update Kubernetes objects to match their definitions.
+
+        Like "kubectl apply", objects which do not exist are created, and
+        objects whose live state differs from their definition are patched.
+        Objects already matching their definition are left alone, so applying
+        the same manifests again only reads the objects.
+
+        Secrets and config maps are applied first, because pods refer to them.
+        The other objects do not depend on each other and are applied
+        concurrently.
+
+        Args:
+            manifests: Definitions of the objects, as parsed from YAML files.
+            configuration: A Kubernetes configuration which has access to the
+                cluster for the objects. If not set, it will use the default
+                kubernetes configuration.
+            namespace: Namespace of the objects.
+
+        Returns:
+            A dictionary mapping "<kind>/<name>" of each object to "created",
+            "configured" or "unchanged".
+
+        Raises:
+            ManifestApplyError: If an object has an unsupported kind or the API
+                server rejects it.
+        """
+        for manifest in manifests:
+            key = (manifest.get('apiVersion'), manifest.get('kind'))
+            if key not in _APPLY_METHODS:
+                raise ManifestApplyError(
+                    'Unsupported kind of Kubernetes object "{}" in "{}"'.format(
+                        manifest.get('kind'), manifest.get('apiVersion')))
+
+        first_manifests = [
+            manifest for manifest in manifests
+            if manifest['kind'] in _APPLY_FIRST_KINDS
+        ]
+        other_manifests = [
+            manifest for manifest in manifests
+            if manifest['kind'] not in _APPLY_FIRST_KINDS
+        ]
+        results = {}
+        with futures.ThreadPoolExecutor(
+                max_workers=self.APPLY_WORKERS) as executor:
+            for group in (first_manifests, other_manifests):
+                actions = executor.map(
+                    lambda manifest: self._apply_manifest(
+                        manifest, configuration, namespace), group)
+                for manifest, action in zip(group, actions):
+                    results['{}/{}'.format(
+                        manifest['kind'],
+                        manifest['metadata']['name'])] = action
+        return results
+
+    def _apply_manifest(self, manifest: Dict[str, Any],
+                        configuration: kubernetes.client.Configuration,
+                        namespace: str) -> str:
+        """Create or update a single Kubernetes object.
+
+        See apply_manifests.
+
+        Returns:
+            "created", "configured" or "unchanged".
+        """
+        api_class_name, resource = _APPLY_METHODS[(manifest['apiVersion'],
+                                                   manifest['kind'])]
+        api_client = self._get_api_client(configuration)
+        api_instance = getattr(kubernetes.client, api_class_name)(api_client)
+        name = manifest['metadata']['name']
+        try:
+            try:
+                live = getattr(api_instance, 'read_' + resource)(
+                    name=name, namespace=namespace)
+            except kubernetes.client.rest.ApiException as e:
+                if e.status != 404:
+                    raise
+                getattr(api_instance, 'create_' + resource)(
+                    namespace=namespace, body=manifest)
+                return 'created'
+            if _matches_live_object(
+                    manifest, api_client.sanitize_for_serialization(live)):
+                return 'unchanged'
+            # Dictionaries are sent as strategic merge patches, which keep the
+            # fields set by the API server.
+            getattr(api_instance, 'patch_' + resource)(
+                name=name, namespace=namespace, body=manifest)
+            return 'configured'
+        except kubernetes.client.rest.ApiException as e:
+            raise ManifestApplyError('Unable to apply {} "{}": {}'.format(
+                manifest['kind'], name, e.reason or e.status)) from e
 
     def create_deployment(
             self,
@@ -287,7 +1029,7 @@ class ContainerClient(object):
                 kubernetes configuration.
             namespace: Namespace of the deployment.
         """
-        api_client = kubernetes.client.ApiClient(configuration)
+        api_client = self._get_api_client(configuration)
         api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
         api_instance.create_namespaced_deployment(
             namespace=namespace, body=deployment_data)
@@ -297,12 +1039,14 @@ class ContainerClient(object):
             deployment_data: kubernetes.client.V1Deployment,
             configuration: (
                 kubernetes.client.configuration.Configuration) = None,
-            namespace: str = 'default'):
-        """Update a Kubernetes Deployment.
+            namespace: str = 'default',
+            restart: bool = False) -> int:
+        """Update a Kubernetes Deployment with a rolling update.
 
-        A Kubernetes Deployment describes a desired state of your application.
-        For example, it manages creation of Pods by means of ReplicaSets, and
-        defines what images to use for the containers.
+        When the pod template of the deployment changes, e.g. because a
+        container refers to a new image digest, Kubernetes replaces the pods
+        gradually, following the update strategy of the deployment. The app
+        keeps serving traffic during the update.
 
         Args:
             deployment_data: Definition of the deployment.
@@ -310,23 +1054,170 @@ class ContainerClient(object):
                 cluster for the deployment. If not set, it will use the default
                 kubernetes configuration.
             namespace: Namespace of the deployment.
+            restart: Whether to replace all pods even if the pod template did
+                not change otherwise, e.g. to pull an image pushed again under
+                the same tag.
+
+        Returns:
+            The generation of the updated deployment, to pass to
+            wait_for_deployment_rollout.
         """
 
-        api_client = kubernetes.client.ApiClient(configuration)
+        api_client = self._get_api_client(configuration)
         api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
 
         deployment_name = deployment_data['metadata']['name']
-
-        # TODO: Find a better way to do update.
-        # Right now we scale the replicas to 0 and then scale it back. This
-        # will trigger an image update.
-        replicas = deployment_data['spec']['replicas']
-        deployment_data['spec']['replicas'] = 0
-        api_instance.patch_namespaced_deployment(
-            name=deployment_name, namespace=namespace, body=deployment_data)
-        deployment_data['spec']['replicas'] = replicas
-        api_instance.patch_namespaced_deployment(
+        if restart:
+            # This is what "kubectl rollout restart" does.
+            template_metadata = deployment_data['spec']['template'].setdefault(
+                'metadata', {})
+            annotations = template_metadata.get('annotations') or {}
+            annotations[_RESTARTED_AT_ANNOTATION] = time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            template_metadata['annotations'] = annotations
+        response = api_instance.patch_namespaced_deployment(
             name=deployment_name, namespace=namespace, body=deployment_data)
+        return response.metadata.generation
+
+    def wait_for_deployment_rollout(
+            self,
+            deployment_name: str,
+            generation: int,
+            configuration: (
+                kubernetes.client.configuration.Configuration) = None,
+            namespace: str = 'default',
+            timeout: Optional[float] = _ROLLOUT_TIMEOUT):
+        """Wait for all pods of a Kubernetes Deployment to be updated.
+
+        This follows the same rules as "kubectl rollout status": the rollout is
+        complete when the deployment controller observed the given generation,
+        all replicas run the new pod template and are available, and no pod of
+        the previous template is left.
+
+        Args:
+            deployment_name: Name of the deployment.
+            generation: Generation of the deployment to wait for, as returned
+                by update_deployment.
+            configuration: A Kubernetes configuration which has access to the
+                cluster for the deployment. If not set, it will use the default
+                kubernetes configuration.
+            namespace: Namespace of the deployment.
+            timeout: Number of seconds to wait for the rollout. Waits forever if
+                None.
+
+        Raises:
+            DeploymentRolloutError: If the rollout does not progress within the
+                progress deadline of the deployment, or does not complete
+                within the timeout.
+        """
+        api_client = self._get_api_client(configuration)
+        api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
+
+        def is_rolled_out(deployment):
+            status = deployment.status
+            if (status.observed_generation or 0) < generation:
+                return False
+            for condition in status.conditions or []:
+                if (condition.type == 'Progressing' and
+                        condition.reason == 'ProgressDeadlineExceeded'):
+                    raise DeploymentRolloutError(
+                        'Unable to update deployment "{}": {}'.format(
+                            deployment_name, condition.message or
+                            condition.reason))
+            updated_replicas = status.updated_replicas or 0
+            return (updated_replicas >= (deployment.spec.replicas or 0) and
+                    (status.replicas or 0) <= updated_replicas and
+                    (status.available_replicas or 0) >= updated_replicas)
+
+        try:
+            _watch_until(
+                api_instance.list_namespaced_deployment,
+                is_rolled_out,
+                'Rollout of deployment "{}"'.format(deployment_name),
+                timeout,
+                namespace=namespace,
+                field_selector='metadata.name={}'.format(deployment_name))
+        except WatchTimeoutError as e:
+            raise DeploymentRolloutError(
+                'Unable to update deployment "{}": {}'.format(
+                    deployment_name, e)) from e
+
+    def wait_for_deployment_ready(
+            self,
+            label_selector: str,
+            configuration: (
+                kubernetes.client.configuration.Configuration) = None,
+            namespace: str = 'default',
+            timeout: Optional[float] = _READY_TIMEOUT) -> int:
+        """Wait for a Kubernetes Deployment to have ready pods.
+
+        Args:
+            label_selector: Selects the deployment by its labels, e.g.
+                "app=mysite".
+            configuration: A Kubernetes configuration which has access to the
+                cluster for the deployment. If not set, it will use the default
+                kubernetes configuration.
+            namespace: Namespace of the deployment.
+            timeout: Number of seconds to wait. Waits forever if None.
+
+        Returns:
+            The number of ready pods of the deployment.
+
+        Raises:
+            WatchTimeoutError: If no pod is ready before the timeout.
+        """
+        api_client = self._get_api_client(configuration)
+        api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
+        return _watch_until(
+            api_instance.list_namespaced_deployment,
+            lambda deployment: deployment.status.ready_replicas,
+            'Deployment "{}"'.format(label_selector),
+            timeout,
+            namespace=namespace,
+            label_selector=label_selector)
+
+    def wait_for_service_ingress(
+            self,
+            label_selector: str,
+            configuration: (
+                kubernetes.client.configuration.Configuration) = None,
+            namespace: str = 'default',
+            timeout: Optional[float] = _READY_TIMEOUT) -> str:
+        """Wait for a LoadBalancer Kubernetes Service to be exposed.
+
+        Args:
+            label_selector: Selects the service by its labels, e.g.
+                "app=mysite".
+            configuration: A Kubernetes configuration which has access to the
+                cluster for the service. If not set, it will use the default
+                kubernetes configuration.
+            namespace: Namespace of the service.
+            timeout: Number of seconds to wait. Waits forever if None.
+
+        Returns:
+            The external hostname or IP address of the service.
+
+        Raises:
+            WatchTimeoutError: If the service is not exposed before the
+                timeout.
+        """
+
+        def get_ingress(service):
+            load_balancer = service.status and service.status.load_balancer
+            ingress = load_balancer and load_balancer.ingress
+            if ingress:
+                return ingress[0].hostname or ingress[0].ip
+            return None
+
+        api_client = self._get_api_client(configuration)
+        api_instance = kubernetes.client.CoreV1Api(api_client)
+        return _watch_until(
+            api_instance.list_namespaced_service,
+            get_ingress,
+            'Service "{}"'.format(label_selector),
+            timeout,
+            namespace=namespace,
+            label_selector=label_selector)
 
     def create_service(
             self,
@@ -346,7 +1237,7 @@ class ContainerClient(object):
                 kubernetes configuration.
             namespace: Namespace of the service.
         """
-        api_client = kubernetes.client.ApiClient(configuration)
+        api_client = self._get_api_client(configuration)
         api_instance = kubernetes.client.CoreV1Api(api_client)
         api_instance.create_namespaced_service(
             namespace=namespace, body=service_data)
@@ -368,7 +1259,7 @@ class ContainerClient(object):
                 kubernetes configuration.
             namespace: Namespace of the service.
         """
-        api_client = kubernetes.client.ApiClient(configuration)
+        api_client = self._get_api_client(configuration)
         api_instance = kubernetes.client.CoreV1Api(api_client)
         api_instance.create_namespaced_secret(
             namespace=namespace, body=secret_data)
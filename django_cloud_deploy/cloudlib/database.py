@@ -16,15 +16,18 @@
 See https://cloud.google.com/sql/docs/
 """
 
+import atexit
 import contextlib
 import signal
 import shutil
-import time
-from typing import Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
 
 from django import db
-from django.core import management
 from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import django_commands
+from django_cloud_deploy.cloudlib import operation
 
 import pexpect
 from pexpect import popen_spawn
@@ -34,10 +37,150 @@ from googleapiclient import errors
 from google.auth import credentials
 
 
+# Seconds to wait for a new Cloud SQL instance to be ready. Creating an
+# instance usually takes a few minutes.
+_INSTANCE_CREATION_TIMEOUT = 30 * 60
+
+# Seconds to wait for other Cloud SQL operations, e.g. creating a database.
+_OPERATION_TIMEOUT = 10 * 60
+
+
 class DatabaseError(Exception):
     pass
 
 
+# Project id, instance name and port of a cloud_sql_proxy process.
+_ProxyKey = Tuple[str, str, int]
+
+
+class _CloudSqlProxy(object):
+    """A running cloud_sql_proxy process and the number of its users."""
+
+    def __init__(self, process: popen_spawn.PopenSpawn):
+        self.process = process
+        self.ref_count = 0
+
+
+class _CloudSqlProxyManager(object):
+    """Shares cloud_sql_proxy processes between database operations.
+
+    Starting cloud_sql_proxy and waiting for it to accept connections takes
+    several seconds. Instead of starting a proxy for every operation, one proxy
+    is started per (project, instance, port) and reference counted. It is
+    killed when its last session ends, or when the program exits.
+
+    Proxies for different keys start concurrently. Sessions for the same key
+    wait for the proxy being started instead of starting another one.
+    """
+
+    # Seconds to wait for cloud_sql_proxy to accept connections.
+    _READY_TIMEOUT = 5
+
+    def __init__(self):
+        # Guards _proxies, _start_locks and the reference counts. It is never
+        # held while a proxy starts.
+        self._lock = threading.Lock()
+        self._proxies = {}  # type: Dict[_ProxyKey, _CloudSqlProxy]
+        # Held while the proxy of a key is looked up or started.
+        self._start_locks = {}  # type: Dict[_ProxyKey, threading.Lock]
+
+    def _start(self, project_id: str, instance_name: str,
+               cloud_sql_proxy_path: Optional[str], region: str,
+               port: int) -> popen_spawn.PopenSpawn:
+        """Start cloud_sql_proxy and wait until it accepts connections.
+
+        Raises:
+            DatabaseError: If cloud sql proxy failed to start.
+        """
+        instance_connection_string = '{0}:{1}:{2}'.format(
+            project_id, region, instance_name)
+        instance_flag = '-instances={}=tcp:{}'.format(
+            instance_connection_string, port)
+        if cloud_sql_proxy_path is None:
+            cloud_sql_proxy_path = shutil.which('cloud_sql_proxy')
+            assert cloud_sql_proxy_path, 'could not find cloud_sql_proxy_path'
+        process = popen_spawn.PopenSpawn([cloud_sql_proxy_path, instance_flag])
+        try:
+            # Make sure cloud sql proxy is started before doing the real work
+            process.expect(
+                'Ready for new connections', timeout=self._READY_TIMEOUT)
+        except pexpect.exceptions.TIMEOUT:
+            process.kill(signal.SIGTERM)
+            raise DatabaseError(
+                ('Cloud SQL Proxy was unable to start after {} seconds. Output '
+                 'of cloud_sql_proxy: \n{}').format(self._READY_TIMEOUT,
+                                                    process.before))
+        except pexpect.exceptions.EOF:
+            process.kill(signal.SIGTERM)
+            raise DatabaseError(
+                ('Cloud SQL Proxy exited unexpectedly. Output of '
+                 'cloud_sql_proxy: \n{}').format(process.before))
+        return process
+
+    @contextlib.contextmanager
+    def session(self,
+                project_id: str,
+                instance_name: str,
+                cloud_sql_proxy_path: Optional[str] = None,
+                region: str = 'us-west1',
+                port: int = 5432):
+        """A context manager keeping a cloud_sql_proxy process running.
+
+        The proxy is started by the first session for the given project,
+        instance and port, and reused by all sessions that start before the
+        last one ends.
+
+        Args:
+            project_id: GCP project id.
+            instance_name: Name of the Cloud SQL instance cloud sql proxy
+                targets at.
+            cloud_sql_proxy_path: The command to run your cloud sql proxy.
+            region: Where the Cloud SQL instance is in.
+            port: The port your Postgres database is using.
+
+        Yields:
+            None
+
+        Raises:
+            DatabaseError: If cloud sql proxy failed to start.
+        """
+        key = (project_id, instance_name, port)
+        with self._lock:
+            start_lock = self._start_locks.setdefault(key, threading.Lock())
+        with start_lock:
+            with self._lock:
+                proxy = self._proxies.get(key)
+                if proxy is not None:
+                    proxy.ref_count += 1
+            if proxy is None:
+                process = self._start(project_id, instance_name,
+                                      cloud_sql_proxy_path, region, port)
+                with self._lock:
+                    proxy = _CloudSqlProxy(process)
+                    proxy.ref_count = 1
+                    self._proxies[key] = proxy
+        try:
+            yield
+        finally:
+            with self._lock:
+                proxy.ref_count -= 1
+                # The proxy is already gone if close_all was called.
+                if proxy.ref_count == 0 and self._proxies.get(key) is proxy:
+                    del self._proxies[key]
+                    proxy.process.kill(signal.SIGTERM)
+
+    def close_all(self):
+        """Kill all running cloud_sql_proxy processes."""
+        with self._lock:
+            for proxy in self._proxies.values():
+                proxy.process.kill(signal.SIGTERM)
+            self._proxies.clear()
+
+
+_proxy_manager = _CloudSqlProxyManager()
+atexit.register(_proxy_manager.close_all)
+
+
 class DatabaseClient(object):
     """A class for managing Google Cloud SQL objects."""
 
@@ -47,11 +190,7 @@ class DatabaseClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build(
-                'sqladmin',
-                'v1beta4',
-                credentials=credentials,
-                cache_discovery=False))
+            discovery_client.build('sqladmin', 'v1beta4', credentials))
 
     def create_instance_sync(self,
                              project_id: str,
@@ -59,7 +198,8 @@ class DatabaseClient(object):
                              number_cpus: int = 1,
                              memory_size: str = 3840,
                              database_version: str = 'POSTGRES_9_6',
-                             region: str = 'us-west1'):
+                             region: str = 'us-west1',
+                             cancel_event: Optional[threading.Event] = None):
         """Creates a new Google Cloud SQL instance and wait for provisioning.
 
         See https://cloud.google.com/sql/docs/postgres/create-instance for valid
@@ -74,6 +214,8 @@ class DatabaseClient(object):
                 instance.
             database_version: The type of database to provision.
             region: The geographic region to provision the SQL instance in.
+            cancel_event: When this event is set, waiting for the instance
+                stops.
 
         Raises:
             ValueError: for invalid argument combinations.
@@ -105,28 +247,47 @@ class DatabaseClient(object):
         # See
         # https://cloud.google.com/sql/docs/mysql/admin-api/v1beta4/instances/insert
         try:
-            request.execute()
+            response = request.execute()
         except errors.HttpError as e:
             if e.resp.status == 409:
                 # A cloud SQL instance with the same name already exist. This is
                 # fine because we can reuse this instance.
                 return
+            raise DatabaseError(
+                'unexpected error creating instance "{}": {}'.format(
+                    instance, e)) from e
 
-        while True:
-            request = self._sqladmin_service.instances().get(
-                project=project_id, instance=instance)
-            response = request.execute()
-            # Response format:
-            # https://cloud.google.com/sql/docs/mysql/admin-api/v1beta4/instances#resource
-            if response['state'] == 'RUNNABLE':
-                return
-            elif response['state'] == 'PENDING_CREATE':
-                time.sleep(2)
-                continue
-            else:
-                raise DatabaseError(
-                    'unexpected instance status after creation: {!r} [{!r}]'.
-                    format(response['state'], response))
+        self._wait_for_operation(project_id, response,
+                                 _INSTANCE_CREATION_TIMEOUT, cancel_event)
+
+    def _wait_for_operation(self,
+                            project_id: str,
+                            response: Dict[str, Any],
+                            timeout: Optional[float] = None,
+                            cancel_event: Optional[threading.Event] = None):
+        """Wait for a Cloud SQL operation to finish.
+
+        Args:
+            project_id: The id of the project owning the operation.
+            response: The Operation resource returned by the request which
+                started the operation.
+            timeout: The maximum number of seconds to wait. Defaults to
+                _OPERATION_TIMEOUT.
+            cancel_event: When this event is set, waiting stops.
+
+        Raises:
+            DatabaseError: if the operation failed, did not finish in time or
+                waiting was cancelled.
+        """
+        if timeout is None:
+            timeout = _OPERATION_TIMEOUT
+        try:
+            operation.wait(
+                operation.sqladmin_operation(self._sqladmin_service,
+                                             project_id, response), timeout,
+                cancel_event)
+        except operation.OperationError as e:
+            raise DatabaseError(str(e)) from e
 
     def create_database_sync(self, project_id: str, instance: str,
                              database: str):
@@ -151,16 +312,7 @@ class DatabaseClient(object):
                 'name': database
             })
         response = request.execute()
-        while response['status'] in ['PENDING']:
-            request = self._sqladmin_service.databases().get(
-                project=project_id, instance=instance, database=database)
-            response = request.execute()
-            time.sleep(2)
-
-        if response['status'] not in ['DONE', 'RUNNING']:
-            raise DatabaseError(
-                'unexpected database status after creation: {!r} [{!r}]'.format(
-                    response['status'], response))
+        self._wait_for_operation(project_id, response)
 
     def set_database_password(self, project_id: str, instance: str, user: str,
                               password: str):
@@ -185,10 +337,7 @@ class DatabaseClient(object):
             name=user,
             body={'password': password})
         response = request.execute()
-        if response['status'] not in ['DONE', 'RUNNING']:
-            raise DatabaseError(
-                'unexpected database status after creation: {!r} [{!r}]'.format(
-                    response['status'], response))
+        self._wait_for_operation(project_id, response)
 
     @contextlib.contextmanager
     def with_cloud_sql_proxy(self,
@@ -204,6 +353,9 @@ class DatabaseClient(object):
         For more information:
         https://cloud.google.com/sql/docs/postgres/sql-proxy
 
+        Nested uses for the same instance and port share one cloud sql proxy
+        process, which is killed when the outermost context exits.
+
         Args:
             project_id: GCP project id.
             instance_name: Name of the Cloud SQL instance cloud sql proxy
@@ -217,31 +369,12 @@ class DatabaseClient(object):
             None
 
         Raises:
-            DatabaseError: If cloud sql proxy failed to start after 5 seconds.
+            DatabaseError: If cloud sql proxy failed to start.
         """
         db.close_old_connections()
-        instance_connection_string = '{0}:{1}:{2}'.format(
-            project_id, region, instance_name)
-        instance_flag = '-instances={}=tcp:{}'.format(
-            instance_connection_string, port)
-        if cloud_sql_proxy_path is None:
-            cloud_sql_proxy_path = shutil.which('cloud_sql_proxy')
-            assert cloud_sql_proxy_path, 'could not find cloud_sql_proxy_path'
-        process = popen_spawn.PopenSpawn([cloud_sql_proxy_path, instance_flag])
-        try:
-            # Make sure cloud sql proxy is started before doing the real work
-            process.expect('Ready for new connections', timeout=5)
+        with _proxy_manager.session(project_id, instance_name,
+                                    cloud_sql_proxy_path, region, port):
             yield
-        except pexpect.exceptions.TIMEOUT:
-            raise DatabaseError(
-                ('Cloud SQL Proxy was unable to start after 5 seconds. Output '
-                 'of cloud_sql_proxy: \n{}').format(process.before))
-        except pexpect.exceptions.EOF:
-            raise DatabaseError(
-                ('Cloud SQL Proxy exited unexpectedly. Output of '
-                 'cloud_sql_proxy: \n{}').format(process.before))
-        finally:
-            process.kill(signal.SIGTERM)
 
     def migrate_database(self,
                          project_id: str,
@@ -270,11 +403,11 @@ class DatabaseClient(object):
             try:
                 # "makemigrations" will generate migration files based on
                 # definitions in models.py.
-                management.call_command(
+                django_commands.call_command(
                     'makemigrations', verbosity=0, interactive=False)
 
                 # "migrate" will modify cloud sql database.
-                management.call_command(
+                django_commands.call_command(
                     'migrate', verbosity=0, interactive=False)
             except Exception as e:
                 raise crash_handling.UserError(
@@ -317,17 +450,20 @@ class DatabaseClient(object):
             try:
                 from django.contrib.auth.models import User
 
-                # Check whether the super user we want to create exist or not
-                # If a superuser with the same name already exist, we will skip
-                # creation
-                users = User.objects.filter(username=superuser_name)
-                for user in users:
-                    if user.is_superuser:
-                        return
-                User.objects.create_superuser(
-                    username=superuser_name,
-                    email=superuser_email,
-                    password=superuser_password)
+                # The Django ORM uses the same process-wide settings as
+                # management commands.
+                with django_commands.lock:
+                    # Check whether the super user we want to create exist or
+                    # not. If a superuser with the same name already exist, we
+                    # will skip creation
+                    users = User.objects.filter(username=superuser_name)
+                    for user in users:
+                        if user.is_superuser:
+                            return
+                    User.objects.create_superuser(
+                        username=superuser_name,
+                        email=superuser_email,
+                        password=superuser_password)
             except Exception as e:
                 raise crash_handling.UserError(
                     'Not able to create super user.') from e
@@ -0,0 +1,185 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Builds Google API service objects with cached discovery documents.
+
+Building a service object with discovery.build fetches the discovery document
+of the API unless the installed google-api-python-client bundles it, and
+creates a single HTTP transport, which is not thread-safe. The functions here
+cache discovery documents in memory and on disk, and send the requests of a
+service object with one keep-alive transport per thread.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import google_auth_httplib2
+import googleapiclient
+from googleapiclient import discovery
+from googleapiclient.discovery_cache import base as discovery_cache_base
+from googleapiclient import http as googleapiclient_http
+from google.auth import credentials
+
+# Discovery documents change rarely, but they do change when APIs get new
+# features.
+_DISCOVERY_CACHE_TTL = 24 * 60 * 60
+
+
+def _client_library_version() -> str:
+    try:
+        # google-api-python-client >= 1.8
+        from googleapiclient import version
+        return version.__version__
+    except ImportError:
+        return googleapiclient.__version__
+
+
+def _default_cache_dir() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'django-cloud-deploy', 'discovery')
+
+
+class DiscoveryCache(discovery_cache_base.Cache):
+    """Caches discovery documents in memory and in a directory.
+
+    Cached documents are keyed by their url and the version of
+    google-api-python-client, and expire after a TTL. Failures to read or write
+    the cache directory are ignored, so the documents are fetched again.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 ttl: float = _DISCOVERY_CACHE_TTL):
+        """Constructor of the class.
+
+        Args:
+            cache_dir: Absolute path of the directory to store documents in.
+                Defaults to "django-cloud-deploy/discovery" in the user cache
+                directory.
+            ttl: Number of seconds after which a cached document is fetched
+                again.
+        """
+        self._cache_dir = cache_dir or _default_cache_dir()
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = {}  # type: Dict[str, str]
+
+    def _path(self, url: str) -> str:
+        key = '{}:{}'.format(_client_library_version(), url)
+        return os.path.join(
+            self._cache_dir,
+            hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            if url in self._memory:
+                return self._memory[url]
+        path = self._path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self._ttl:
+                return None
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._memory[url] = content
+        return content
+
+    def set(self, url: str, content: str):
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        with self._lock:
+            self._memory[url] = content
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            # Write to a temporary file first so that concurrent deploys never
+            # read a partially written document.
+            fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir)
+            with open(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(url))
+        except OSError:
+            pass
+
+
+class _ThreadLocalTransport(object):
+    """Creates one authorized transport per thread.
+
+    httplib2.Http is not thread-safe, but keeping its connections alive saves a
+    TLS handshake per request. Each thread gets its own transport, which is
+    reused by all requests the thread sends.
+    """
+
+    def __init__(self, creds: credentials.Credentials):
+        self._creds = creds
+        self._local = threading.local()
+
+    def get(self) -> google_auth_httplib2.AuthorizedHttp:
+        """Returns the transport of the calling thread."""
+        transport = getattr(self._local, 'transport', None)
+        if transport is None:
+            http = googleapiclient_http.set_user_agent(
+                googleapiclient_http.build_http(), 'django-cloud-deploy')
+            transport = google_auth_httplib2.AuthorizedHttp(
+                self._creds, http=http)
+            self._local.transport = transport
+        return transport
+
+    def request_builder(self, http: Any, *args,
+                        **kwargs) -> googleapiclient_http.HttpRequest:
+        """Builds requests sent with the transport of the calling thread.
+
+        Used as the requestBuilder of service objects, instead of sending all
+        requests with the transport the service object was built with.
+        """
+        del http  # The transport of the thread building the request is used.
+        return googleapiclient_http.HttpRequest(self.get(), *args, **kwargs)
+
+
+_discovery_cache = DiscoveryCache()
+
+
+def build(service_name: str, version: str,
+          creds: credentials.Credentials) -> discovery.Resource:
+    """Build a service object for a Google API.
+
+    This is a replacement of discovery.build(service_name, version,
+    credentials=creds). Versions of google-api-python-client bundling
+    discovery documents use them; older ones fetch each document once and
+    cache it.
+
+    The service object can be used from several threads. Requests are sent
+    with a keep-alive transport of the thread building them, so they should be
+    executed in the same thread.
+
+    Args:
+        service_name: Name of the API, e.g. "sqladmin".
+        version: Version of the API, e.g. "v1beta4".
+        creds: The credentials used to authorize requests.
+
+    Returns:
+        The service object of the API.
+    """
+    transport = _ThreadLocalTransport(creds)
+    return discovery.build(
+        service_name,
+        version,
+        http=transport.get(),
+        requestBuilder=transport.request_builder,
+        cache=_discovery_cache)
@@ -0,0 +1,44 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs Django management commands of the generated project.
+
+Django settings, database connections and the working directory are shared by
+the whole process, so management commands must not run concurrently, even when
+deployment steps do.
+"""
+
+import threading
+from typing import Any
+
+from django.core import management
+
+# Held while a management command runs. It is reentrant so that callers can
+# hold it around other process-wide changes, such as changing the working
+# directory, and still call call_command.
+lock = threading.RLock()
+
+
+def call_command(name: str, *args: Any, **options: Any) -> Any:
+    """Run a Django management command, one at a time.
+
+    Args:
+        name: Name of the management command, e.g. "migrate".
+        *args: Positional arguments of the command.
+        **options: Options of the command.
+
+    Returns:
+        The output of the command.
+    """
+    with lock:
+        return management.call_command(name, *args, **options)
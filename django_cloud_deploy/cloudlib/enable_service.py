@@ -12,12 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
+from typing import List, Set
 
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import operation
 from googleapiclient import discovery
 from google.auth import credentials
 
 
+# Seconds to wait for services to be enabled. It usually takes less than a
+# minute.
+_ENABLE_SERVICE_TIMEOUT = 10 * 60
+
+
 class EnableServiceError(Exception):
     pass
 
@@ -25,17 +32,17 @@ class EnableServiceError(Exception):
 class EnableServiceClient(object):
     """A class for enabling GCP apis."""
 
+    # services.batchEnable accepts at most 20 services per request. See
+    # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/batchEnable
+    _BATCH_ENABLE_MAX_SERVICES = 20
+
     def __init__(self, service_usage_service: discovery.Resource):
         self._service_usage_service = service_usage_service
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build(
-                'serviceusage',
-                'v1',
-                credentials=credentials,
-                cache_discovery=False))
+            discovery_client.build('serviceusage', 'v1', credentials))
 
     def enable_service_sync(self, project_id: str, service: str):
         """Enable a service for the given project.
@@ -54,27 +61,91 @@ class EnableServiceClient(object):
             name=service_name)
         response = request.execute()
 
-        # When the api call succeed, the response is a Service object.
+        # When the api call succeed, the response is an Operation object.
         # See
-        # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/get
+        # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/enable
         if 'name' not in response:
             raise EnableServiceError(
                 'unexpected response enabling service "{}": {}'.format(
                     service_name, response))
 
+        try:
+            operation.wait(
+                operation.service_usage_operation(self._service_usage_service,
+                                                  response),
+                _ENABLE_SERVICE_TIMEOUT)
+        except operation.OperationError as e:
+            raise EnableServiceError(
+                'unable to enable service "{}": {}'.format(service_name,
+                                                           e)) from e
+
+    def list_enabled_services(self, project_id: str) -> Set[str]:
+        """List the services enabled for the given project.
+
+        Args:
+            project_id: GCP project id.
+
+        Returns:
+            Names of the enabled services, e.g. "drive.googleapis.com".
+        """
+        parent = '/'.join(['projects', project_id])
+        enabled_services = set()
+        page_token = None
         while True:
-            request = self._service_usage_service.services().get(
-                name=service_name)
+            request = self._service_usage_service.services().list(
+                parent=parent,
+                filter='state:ENABLED',
+                pageSize=200,
+                pageToken=page_token)
             response = request.execute()
             # Response format:
-            # https://cloud.google.com/service-usage/docs/reference/rest/v1/Service
-            if response['state'] == 'ENABLED':
-                return
-            elif response['state'] == 'DISABLED':
-                time.sleep(2)
-                continue
-            else:
-                # In 'STATE_UNSPECIFIED' state.
+            # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/list
+            for service in response.get('services', []):
+                enabled_services.add(service['config']['name'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return enabled_services
+
+    def enable_services_sync(self, project_id: str, services: List[str]):
+        """Enable several services for the given project.
+
+        Services which are already enabled are skipped. The remaining ones are
+        enabled with as few services.batchEnable calls as possible, and the
+        resulting operations are waited on together.
+
+        Args:
+            project_id: GCP project id.
+            services: Names of the services to be enabled. For example,
+                ["drive.googleapis.com", "sqladmin.googleapis.com"]
+
+        Raises:
+            EnableServiceError: When it fails to enable a service.
+        """
+        enabled_services = self.list_enabled_services(project_id)
+        services = [
+            service for service in services if service not in enabled_services
+        ]
+        if not services:
+            return
+
+        parent = '/'.join(['projects', project_id])
+        operations = []
+        for i in range(0, len(services), self._BATCH_ENABLE_MAX_SERVICES):
+            batch = services[i:i + self._BATCH_ENABLE_MAX_SERVICES]
+            request = self._service_usage_service.services().batchEnable(
+                parent=parent, body={'serviceIds': batch})
+            response = request.execute()
+            if 'name' not in response:
                 raise EnableServiceError(
-                    'unexpected service status after enabling: {!r}: [{!r}]'.
-                    format(response['status'], response))
+                    'unexpected response enabling services {}: {}'.format(
+                        batch, response))
+            operations.append(
+                operation.service_usage_operation(self._service_usage_service,
+                                                  response))
+
+        try:
+            operation.OperationWaiter().wait_all(operations,
+                                                 _ENABLE_SERVICE_TIMEOUT)
+        except operation.OperationError as e:
+            raise EnableServiceError(
+                'unable to enable services {}: {}'.format(services, e)) from e
@@ -0,0 +1,188 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Manages Cloud Memorystore for Redis instances.
+
+See https://cloud.google.com/memorystore/docs/redis/
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import operation
+
+from googleapiclient import discovery
+from googleapiclient import errors
+from google.auth import credentials
+
+# See
+# https://cloud.google.com/memorystore/docs/redis/reference/rest/v1/projects.locations.instances#Tier
+_TIERS = ('BASIC', 'STANDARD_HA')
+
+# States of an instance which will never become ready.
+_FAILED_STATES = ('DELETING',)
+
+# Seconds to wait for a new instance to be ready. Creating an instance usually
+# takes a few minutes.
+_INSTANCE_CREATION_TIMEOUT = 30 * 60
+
+
+class MemorystoreError(Exception):
+    pass
+
+
+class MemorystoreClient(object):
+    """A class for managing Cloud Memorystore for Redis instances."""
+
+    def __init__(self, redis_service: discovery.Resource):
+        self._redis_service = redis_service
+
+    @classmethod
+    def from_credentials(cls, credentials: credentials.Credentials):
+        return cls(discovery_client.build('redis', 'v1', credentials))
+
+    def create_instance_sync(self,
+                             project_id: str,
+                             instance: str,
+                             region: str = 'us-west1',
+                             memory_size_gb: int = 1,
+                             tier: str = 'BASIC',
+                             redis_version: str = 'REDIS_4_0',
+                             cancel_event: Optional[threading.Event] = None
+                            ) -> Dict[str, str]:
+        """Creates a new Redis instance and wait for provisioning.
+
+        An existing instance with the same name is reused.
+
+        Args:
+            project_id: The id of the project to provision the instance in.
+            instance: The name of the new instance being provisioned.
+            region: The geographic region to provision the instance in.
+            memory_size_gb: The amount of memory, in GiB, of the instance.
+            tier: "BASIC" for a standalone instance, or "STANDARD_HA" for a
+                replicated instance with automatic failover.
+            redis_version: The version of Redis to provision.
+            cancel_event: When this event is set, waiting for the instance
+                stops.
+
+        Returns:
+            The endpoint of the instance, as a dictionary with its IP address
+            under "host" and its port under "port".
+
+        Raises:
+            ValueError: for invalid argument combinations.
+            MemorystoreError: if unable to provision the instance.
+        """
+        if not (1 <= memory_size_gb <= 300):
+            raise ValueError(
+                'unexpected memory size {!r}'.format(memory_size_gb))
+
+        if tier not in _TIERS:
+            raise ValueError('unexpected tier {!r}'.format(tier))
+
+        # See
+        # https://cloud.google.com/memorystore/docs/redis/reference/rest/v1/projects.locations.instances/create
+        request = self._redis_service.projects().locations().instances(
+        ).create(
+            parent=self._location(project_id, region),
+            instanceId=instance,
+            body={
+                'tier': tier,
+                'memorySizeGb': memory_size_gb,
+                'redisVersion': redis_version,
+            })
+        try:
+            response = request.execute()
+        except errors.HttpError as e:
+            if e.resp.status != 409:
+                raise MemorystoreError(
+                    'unexpected error creating instance "{}": {}'.format(
+                        instance, e)) from e
+            # An instance with the same name already exists. This is fine
+            # because we can reuse this instance, once it is ready.
+            pending = self._instance_ready_operation(project_id, instance,
+                                                     region)
+        else:
+            pending = operation.redis_operation(self._redis_service, response)
+
+        try:
+            operation.wait(pending, _INSTANCE_CREATION_TIMEOUT, cancel_event)
+        except operation.OperationError as e:
+            raise MemorystoreError(str(e)) from e
+        return self.get_instance_endpoint(project_id, instance, region)
+
+    def _instance_ready_operation(self, project_id: str, instance: str,
+                                  region: str) -> operation.Operation:
+        """Returns an Operation done when an existing instance is ready."""
+        name = self._name(project_id, instance, region)
+
+        def get_error(response):
+            if response.get('state') in _FAILED_STATES:
+                return response.get('statusMessage') or response['state']
+            return None
+
+        return operation.Operation(
+            'Creation of Redis instance "{}"'.format(name),
+            lambda: self._redis_service.projects().locations().instances().get(
+                name=name).execute(),
+            lambda response: response.get('state') == 'READY',
+            get_error)
+
+    def get_instance_endpoint(self,
+                              project_id: str,
+                              instance: str,
+                              region: str = 'us-west1') -> Dict[str, str]:
+        """Returns the endpoint of a ready Redis instance.
+
+        Args:
+            project_id: The id of the project owning the instance.
+            instance: The name of the instance.
+            region: The geographic region of the instance.
+
+        Returns:
+            A dictionary with the IP address of the instance under "host" and
+            its port under "port".
+
+        Raises:
+            MemorystoreError: if the instance does not exist or is not ready.
+        """
+        name = self._name(project_id, instance, region)
+        request = self._redis_service.projects().locations().instances().get(
+            name=name)
+        try:
+            response = request.execute()
+        except errors.HttpError as e:
+            raise MemorystoreError(
+                'unexpected error getting instance "{}": {}'.format(
+                    instance, e)) from e
+        return self._endpoint(name, response)
+
+    @staticmethod
+    def _location(project_id: str, region: str) -> str:
+        return '/'.join(['projects', project_id, 'locations', region])
+
+    @classmethod
+    def _name(cls, project_id: str, instance: str, region: str) -> str:
+        return '/'.join(
+            [cls._location(project_id, region), 'instances', instance])
+
+    @staticmethod
+    def _endpoint(name: str, instance: Dict[str, Any]) -> Dict[str, str]:
+        # See
+        # https://cloud.google.com/memorystore/docs/redis/reference/rest/v1/projects.locations.instances#Instance
+        if instance.get('state') != 'READY' or 'host' not in instance:
+            raise MemorystoreError(
+                'Redis instance "{}" is not ready: {}'.format(
+                    name, instance.get('state')))
+        return {'host': instance['host'], 'port': str(instance['port'])}
@@ -0,0 +1,345 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Waits for long-running operations of Google Cloud APIs.
+
+Most GCP APIs return an Operation resource for requests that take a while to
+complete, e.g. creating a Cloud SQL instance or a GKE cluster. This module
+polls those resources with jittered exponential backoff until they are done.
+"""
+
+import heapq
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from googleapiclient import discovery
+
+
+class OperationError(Exception):
+    """An operation finished with an error."""
+
+
+class OperationTimeoutError(OperationError):
+    """An operation did not finish before its deadline."""
+
+
+class OperationCancelledError(OperationError):
+    """Waiting for an operation was cancelled."""
+
+
+class Operation(object):
+    """A long-running operation that can be polled.
+
+    Attributes:
+        description: A human readable description used in error messages.
+    """
+
+    def __init__(self,
+                 description: str,
+                 poll: Callable[[], Dict[str, Any]],
+                 is_done: Callable[[Dict[str, Any]], bool],
+                 get_error: Callable[[Dict[str, Any]], Optional[Any]],
+                 response: Optional[Dict[str, Any]] = None):
+        """Constructor of the class.
+
+        Args:
+            description: A human readable description of the operation.
+            poll: A function returning the current state of the operation.
+            is_done: A function returning whether the given operation state
+                means the operation is finished.
+            get_error: A function returning the error of the given operation
+                state, or None if there is no error.
+            response: The initial state of the operation, usually the response
+                of the request which started it. If it is already done, the
+                operation is never polled.
+        """
+        self.description = description
+        self._poll = poll
+        self._is_done = is_done
+        self._get_error = get_error
+        self.response = response
+
+    def poll(self) -> bool:
+        """Refresh the state of the operation.
+
+        Returns:
+            Whether the operation is done.
+
+        Raises:
+            OperationError: If the operation finished with an error.
+        """
+        self.response = self._poll()
+        return self.check()
+
+    def check(self) -> bool:
+        """Returns whether the last known state of the operation is done.
+
+        Raises:
+            OperationError: If the operation finished with an error.
+        """
+        if self.response is None:
+            return False
+        error = self._get_error(self.response)
+        if error:
+            raise OperationError('{} failed: {!r}'.format(
+                self.description, error))
+        return self._is_done(self.response)
+
+
+def sqladmin_operation(sqladmin_service: discovery.Resource, project_id: str,
+                       response: Dict[str, Any]) -> Operation:
+    """Returns an Operation for a Cloud SQL Admin API operation.
+
+    See
+    https://cloud.google.com/sql/docs/postgres/admin-api/v1beta4/operations
+
+    Args:
+        sqladmin_service: The sqladmin service object.
+        project_id: Id of the GCP project owning the operation.
+        response: A Cloud SQL Operation resource.
+    """
+    name = response['name']
+    return Operation(
+        'Cloud SQL operation "{}"'.format(name),
+        lambda: sqladmin_service.operations().get(
+            project=project_id, operation=name).execute(),
+        lambda op: op.get('status') == 'DONE',
+        lambda op: op.get('error'),
+        response)
+
+
+def container_operation(container_service: discovery.Resource,
+                        project_id: str, zone: str,
+                        response: Dict[str, Any]) -> Operation:
+    """Returns an Operation for a Kubernetes Engine API operation.
+
+    See
+    https://cloud.google.com/kubernetes-engine/docs/reference/rest/v1/projects.zones.operations
+
+    Args:
+        container_service: The container service object.
+        project_id: Id of the GCP project owning the operation.
+        zone: The zone the operation runs in.
+        response: A Kubernetes Engine Operation resource.
+    """
+    name = response['name']
+
+    def get_error(op):
+        if op.get('status') == 'ABORTING':
+            return op.get('statusMessage') or op['status']
+        return op.get('error') or (op.get('status') == 'DONE' and
+                                   op.get('statusMessage'))
+
+    return Operation(
+        'Kubernetes Engine operation "{}"'.format(name),
+        lambda: container_service.projects().zones().operations().get(
+            projectId=project_id, zone=zone, operationId=name).execute(),
+        lambda op: op.get('status') == 'DONE',
+        get_error,
+        response)
+
+
+def service_usage_operation(service_usage_service: discovery.Resource,
+                            response: Dict[str, Any]) -> Operation:
+    """Returns an Operation for a Service Usage API operation.
+
+    See
+    https://cloud.google.com/service-usage/docs/reference/rest/v1/operations
+
+    Args:
+        service_usage_service: The serviceusage service object.
+        response: A google.longrunning.Operation resource.
+    """
+    name = response['name']
+    return Operation(
+        'Service Usage operation "{}"'.format(name),
+        lambda: service_usage_service.operations().get(name=name).execute(),
+        lambda op: bool(op.get('done')),
+        lambda op: op.get('error'),
+        response)
+
+
+def appengine_operation(appengine_service: discovery.Resource, app_id: str,
+                        response: Dict[str, Any]) -> Operation:
+    """Returns an Operation for an App Engine Admin API operation.
+
+    See
+    https://cloud.google.com/appengine/docs/admin-api/reference/rest/v1/apps.operations
+
+    Args:
+        appengine_service: The appengine service object.
+        app_id: Id of the App Engine application, the same as the project id.
+        response: A google.longrunning.Operation resource.
+    """
+    name = response['name']
+    operation_id = name.split('/')[-1]
+    return Operation(
+        'App Engine operation "{}"'.format(name),
+        lambda: appengine_service.apps().operations().get(
+            appsId=app_id, operationsId=operation_id).execute(),
+        lambda op: bool(op.get('done')),
+        lambda op: op.get('error'),
+        response)
+
+
+def redis_operation(redis_service: discovery.Resource,
+                    response: Dict[str, Any]) -> Operation:
+    """Returns an Operation for a Cloud Memorystore for Redis API operation.
+
+    See
+    https://cloud.google.com/memorystore/docs/redis/reference/rest/v1/projects.locations.operations
+
+    Args:
+        redis_service: The redis service object.
+        response: A google.longrunning.Operation resource.
+    """
+    name = response['name']
+    return Operation(
+        'Memorystore operation "{}"'.format(name),
+        lambda: redis_service.projects().locations().operations().get(
+            name=name).execute(),
+        lambda op: bool(op.get('done')),
+        lambda op: op.get('error'),
+        response)
+
+
+class OperationWaiter(object):
+    """Polls operations with jittered exponential backoff.
+
+    Any number of operations can be waited on together from a single thread.
+    Each operation keeps its own backoff schedule and the waiter sleeps until
+    the next operation is due, so waiting on many operations costs no more API
+    quota than waiting on each of them alone.
+    """
+
+    def __init__(self,
+                 initial_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 multiplier: float = 1.5,
+                 jitter: float = 0.25):
+        """Constructor of the class.
+
+        Args:
+            initial_delay: Seconds to wait before polling an operation the
+                first time.
+            max_delay: The maximum number of seconds between two polls of the
+                same operation.
+            multiplier: How much the delay grows after each poll.
+            jitter: The delay is randomly changed by up to this fraction so
+                that concurrent deploys do not poll in lockstep.
+        """
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._multiplier = multiplier
+        self._jitter = jitter
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self._jitter, 1 + self._jitter)
+
+    def wait(self,
+             operation: Operation,
+             timeout: Optional[float] = None,
+             cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Wait for a single operation to finish.
+
+        Args:
+            operation: The operation to wait for.
+            timeout: The maximum number of seconds to wait. None means waiting
+                forever.
+            cancel_event: When this event is set, waiting stops.
+
+        Returns:
+            The final state of the operation.
+
+        Raises:
+            OperationError: If the operation finished with an error.
+            OperationTimeoutError: If the operation did not finish in time.
+            OperationCancelledError: If cancel_event was set.
+        """
+        return self.wait_all([operation], timeout, cancel_event)[0]
+
+    def wait_all(self,
+                 operations: List[Operation],
+                 timeout: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None
+                ) -> List[Dict[str, Any]]:
+        """Wait for all the given operations to finish.
+
+        Args:
+            operations: The operations to wait for.
+            timeout: The maximum number of seconds to wait for all operations.
+                None means waiting forever.
+            cancel_event: When this event is set, waiting stops.
+
+        Returns:
+            The final states of the operations, in the same order as the
+            given operations.
+
+        Raises:
+            OperationError: If any operation finished with an error.
+            OperationTimeoutError: If the operations did not finish in time.
+            OperationCancelledError: If cancel_event was set.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        def next_poll_time(now, delay):
+            # The last poll happens right at the deadline, so that operations
+            # finishing just before it are not reported as timed out.
+            poll_time = now + self._jittered(delay)
+            if deadline is not None:
+                poll_time = min(poll_time, deadline)
+            return poll_time
+
+        # Heap of (next poll time, index, current delay).
+        schedule = []
+        for index, operation in enumerate(operations):
+            if not operation.check():
+                heapq.heappush(schedule,
+                               (next_poll_time(start, self._initial_delay),
+                                index, self._initial_delay))
+
+        while schedule:
+            poll_time, index, delay = heapq.heappop(schedule)
+            wait_time = max(0, poll_time - time.monotonic())
+            if cancel_event is not None:
+                if cancel_event.wait(wait_time):
+                    raise OperationCancelledError(
+                        'Cancelled waiting for {}'.format(
+                            operations[index].description))
+            elif wait_time:
+                time.sleep(wait_time)
+
+            if not operations[index].poll():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise OperationTimeoutError(
+                        '{} did not finish in {} seconds'.format(
+                            operations[index].description, timeout))
+                delay = min(delay * self._multiplier, self._max_delay)
+                heapq.heappush(schedule,
+                               (next_poll_time(now, delay), index, delay))
+
+        return [operation.response for operation in operations]
+
+
+def wait(operation: Operation,
+         timeout: Optional[float] = None,
+         cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """Wait for an operation to finish with the default backoff settings.
+
+    See OperationWaiter.wait.
+    """
+    return OperationWaiter().wait(operation, timeout, cancel_event)
@@ -21,6 +21,7 @@ https://cloud.google.com/resource-manager/reference/rest/
 import base64
 from typing import List
 
+from django_cloud_deploy.cloudlib import discovery_client
 from googleapiclient import discovery
 from googleapiclient import errors
 
@@ -46,13 +47,8 @@ class ServiceAccountClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build(
-                'iam', 'v1', credentials=credentials, cache_discovery=False),
-            discovery.build(
-                'cloudresourcemanager',
-                'v1',
-                credentials=credentials,
-                cache_discovery=False))
+            discovery_client.build('iam', 'v1', credentials),
+            discovery_client.build('cloudresourcemanager', 'v1', credentials))
 
     def _get_iam_policy(self, project_id):
         request = self._cloudresourcemanager_service.projects().getIamPolicy(
@@ -13,25 +13,107 @@
 # limitations under the License.
 """Manages resources about static content serving of Django projects."""
 
+import base64
+from concurrent import futures
+import gzip
+import hashlib
+import io
+import mimetypes
 import os
 import pathlib
-from typing import Any, Dict
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import backoff
 from django.conf import settings
-from django.core import management
 from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import django_commands
 
 from googleapiclient import discovery
 from googleapiclient import errors
 from googleapiclient import http
 from google.auth import credentials
 
+# HTTP status codes of errors which are worth retrying when uploading files.
+_RETRIABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Text-like web assets which are worth compressing before upload. GCS serves
+# them with "Content-Encoding: gzip", or decompresses them for clients which
+# do not accept gzip. See
+# https://cloud.google.com/storage/docs/transcoding
+_COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.html', '.txt',
+                            '.xml', '.map')
+
+# Matches file names containing a content hash, as generated by Django's
+# ManifestStaticFilesStorage, e.g. "base.5af66c1b1797.css". The content of
+# such a file never changes, so it can be cached forever.
+_HASHED_FILENAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+_DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+# Name of the custom metadata holding the MD5 hash of the uncompressed file.
+# The md5Hash of a compressed object is the hash of the compressed bytes.
+_SOURCE_MD5_METADATA_KEY = 'sourceMd5'
+
+# Name of the custom metadata holding the version of the headers and encoding
+# web assets were uploaded with. Objects uploaded with another version are
+# uploaded again, even if their content did not change, so that they get the
+# current headers. Increase the version when changing _prepare_web_asset.
+_UPLOAD_FORMAT_METADATA_KEY = 'uploadFormat'
+_WEB_ASSET_UPLOAD_FORMAT = '1'
+
 
 class StaticContentServeError(Exception):
     """An exception occured while managing resources about static content."""
     pass
 
 
+class _ExistingObject(object):
+    """An object listed in a GCS bucket."""
+
+    def __init__(self, md5: Optional[str], upload_format: Optional[str]):
+        """Constructor of the class.
+
+        Args:
+            md5: The base64 encoded MD5 hash of the uncompressed content of
+                the object. Composite objects do not have a MD5 hash.
+            upload_format: The upload format of web assets the object was
+                uploaded with, if any.
+        """
+        self.md5 = md5
+        self.upload_format = upload_format
+
+
+class UploadStats(object):
+    """Summary of an upload of a directory to a GCS bucket."""
+
+    def __init__(self,
+                 files: int,
+                 total_bytes: int,
+                 seconds: float,
+                 skipped_files: int = 0,
+                 deleted_files: int = 0):
+        self.files = files
+        self.total_bytes = total_bytes
+        self.seconds = seconds
+        self.skipped_files = skipped_files
+        self.deleted_files = deleted_files
+
+    @property
+    def bytes_per_second(self) -> float:
+        if not self.seconds:
+            return 0.0
+        return self.total_bytes / self.seconds
+
+
+def _is_not_retriable(e: errors.HttpError) -> bool:
+    return e.resp.status not in _RETRIABLE_STATUS_CODES
+
+
 class StaticContentServeClient(object):
     """A class for serving static contents for Django projects."""
 
@@ -39,15 +121,23 @@ class StaticContentServeClient(object):
     # <bucket>/<GCS_ROOT>/<relative_path_with_local_static_content_directory>
     GCS_ROOT = 'static'
 
+    # The number of files uploaded at the same time.
+    UPLOAD_WORKERS = 16
+
     def __init__(self, storage_service: discovery.Resource):
+        """Constructor of the class.
+
+        Args:
+            storage_service: The storage service object. Files are uploaded
+                from several threads, so it must be safe to execute its
+                requests concurrently, as with the service objects built by
+                discovery_client.build.
+        """
         self._storage_service = storage_service
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
-        return cls(
-            discovery.build(
-                'storage', 'v1', credentials=credentials,
-                cache_discovery=False))
+        return cls(discovery_client.build('storage', 'v1', credentials))
 
     def _bucket_exist(self, project_id: str, bucket_name: str) -> bool:
         """Returns whether the given bucket exists under the given project.
@@ -211,15 +301,82 @@ class StaticContentServeClient(object):
                     'Unexpected error setting iam policy of bucket "{}"'.format(
                         bucket_name)) from e
 
-    def _upload_file_to_object(self, local_file_path: str, bucket_name: str,
-                               object_name: str):
-        """Upload the contents of a local file to an object in a GCS bucket."""
-        media_body = http.MediaFileUpload(local_file_path)
-        body = {'name': object_name}
+    @backoff.on_exception(
+        backoff.expo,
+        errors.HttpError,
+        max_tries=5,
+        giveup=_is_not_retriable,
+        logger=None)
+    def _insert_object(self, bucket_name: str, body: Dict[str, Any],
+                       media_body: http.MediaUpload) -> Dict[str, Any]:
+        """Insert an object, retrying on rate limiting and server errors."""
         request = self._storage_service.objects().insert(
             bucket=bucket_name, body=body, media_body=media_body)
+        return request.execute()
+
+    def _prepare_web_asset(
+            self, local_file_path: str,
+            object_name: str) -> Tuple[http.MediaUpload, Dict[str, Any]]:
+        """Prepare the upload of a file served to browsers.
+
+        Text-like files are gzip compressed when that makes them smaller, and
+        all files get a Cache-Control header. Files with a content hash in
+        their names are cached for a year.
+
+        Args:
+            local_file_path: Absolute path of the file to upload.
+            object_name: Name of the object to upload the file to.
+
+        Returns:
+            The media and the object resource to upload.
+        """
+        content_type = (mimetypes.guess_type(local_file_path)[0] or
+                        'application/octet-stream')
+        if _HASHED_FILENAME_RE.search(object_name):
+            cache_control = _IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = _DEFAULT_CACHE_CONTROL
+        body = {
+            'name': object_name,
+            'contentType': content_type,
+            'cacheControl': cache_control,
+            'metadata': {
+                _SOURCE_MD5_METADATA_KEY: self._md5_hash(local_file_path),
+                _UPLOAD_FORMAT_METADATA_KEY: _WEB_ASSET_UPLOAD_FORMAT,
+            },
+        }
+
+        if object_name.lower().endswith(_COMPRESSIBLE_EXTENSIONS):
+            with open(local_file_path, 'rb') as f:
+                content = f.read()
+            compressed_file = io.BytesIO()
+            # A fixed mtime makes the output only depend on the content.
+            with gzip.GzipFile(
+                    fileobj=compressed_file, mode='wb', mtime=0) as gzip_file:
+                gzip_file.write(content)
+            compressed = compressed_file.getvalue()
+            if len(compressed) < len(content):
+                body['contentEncoding'] = 'gzip'
+                media_body = http.MediaIoBaseUpload(
+                    io.BytesIO(compressed), mimetype=content_type)
+                return media_body, body
+        return http.MediaFileUpload(
+            local_file_path, mimetype=content_type), body
+
+    def _upload_file_to_object(self,
+                               local_file_path: str,
+                               bucket_name: str,
+                               object_name: str,
+                               web_assets: bool = False):
+        """Upload the contents of a local file to an object in a GCS bucket."""
+        if web_assets:
+            media_body, body = self._prepare_web_asset(local_file_path,
+                                                       object_name)
+        else:
+            media_body = http.MediaFileUpload(local_file_path)
+            body = {'name': object_name}
         try:
-            response = request.execute()
+            response = self._insert_object(bucket_name, body, media_body)
             if 'name' not in response:
                 raise StaticContentServeError(
                     'Unexpected responses when uploading file "{}" to '
@@ -236,41 +393,32 @@ class StaticContentServeClient(object):
                 raise StaticContentServeError(
                     'Unexpected error when uploading file "{}" to '
                     'bucket "{}"'.format(local_file_path, bucket_name)) from e
-
-        # http.MediaFileUpload opens a file but never closes it. So we
-        # need to manually close the file to avoid "ResourceWarning:
-        # unclosed file".
-        # TODO: Remove this line when
-        # https://github.com/googleapis/google-api-python-client/issues/575
-        # is resolved.
-        media_body.stream().close()
-
-    def upload_content(self,
-                       bucket_name: str,
-                       static_content_dir: str,
-                       gcs_folder_root: str = None):
-        """Upload content in the given directory to a GCS bucket.
+        finally:
+            # http.MediaFileUpload opens a file but never closes it. So we
+            # need to manually close the file to avoid "ResourceWarning:
+            # unclosed file".
+            # TODO: Remove this line when
+            # https://github.com/googleapis/google-api-python-client/issues/575
+            # is resolved.
+            media_body.stream().close()
+
+    @staticmethod
+    def _list_files_to_upload(static_content_dir: str,
+                              gcs_folder_root: str) -> List[Tuple[str, str]]:
+        """List files under the given directory with their GCS object names.
 
         Args:
-            bucket_name: Name of the bucket you want to upload static content
-                to.
-            static_content_dir: Absolute path of the directory containing
-                static files of the Django app.
+            static_content_dir: Absolute path of the directory to upload.
             gcs_folder_root: Name of root folder for files in GCS bucket.
 
-        Raises:
-            StaticContentServeError: When failed to upload files.
+        Returns:
+            A list of (local absolute path, GCS object name) tuples.
         """
-
-        prefix_length = len(static_content_dir)
-
-        # The api only supports uploading a single file. So we need to iterate
-        # all files in the given directory.
+        files_to_upload = []
         for directory_absolute_path, _, files in os.walk(static_content_dir):
             directory_relative_path = os.path.relpath(directory_absolute_path,
                                                       static_content_dir)
             for filename in files:
-                gcs_folder_root = gcs_folder_root or self.GCS_ROOT
                 # Path of the file in the GCS bucket. Always use POSIX paths
                 # to avoid backslashes in names when running on Windows.
                 gcs_relative_path = pathlib.PurePosixPath(
@@ -282,8 +430,280 @@ class StaticContentServeClient(object):
                 # Local absolute path of the file
                 local_file_path = os.path.join(directory_absolute_path,
                                                filename)
-                self._upload_file_to_object(local_file_path, bucket_name,
-                                            str(gcs_object_path))
+                files_to_upload.append((local_file_path, str(gcs_object_path)))
+        return files_to_upload
+
+    def _upload_files(
+            self,
+            bucket_name: str,
+            files_to_upload: List[Tuple[str, str]],
+            progress_callback: Optional[Callable[[int, int, int, int], None]],
+            web_assets: bool = False,
+            objects_to_delete: Optional[List[str]] = None) -> UploadStats:
+        """Upload files to a GCS bucket with a pool of worker threads.
+
+        Args:
+            bucket_name: Name of the bucket to upload files to.
+            files_to_upload: A list of (local absolute path, GCS object name)
+                tuples.
+            web_assets: Whether the files are served to browsers. See
+                upload_content.
+            progress_callback: Called after each uploaded file with the number
+                of uploaded files, the total number of files, the number of
+                uploaded bytes and the total number of bytes.
+            objects_to_delete: Names of objects deleted by the same worker
+                threads.
+
+        Returns:
+            Summary of the upload.
+
+        Raises:
+            StaticContentServeError: When failed to upload or delete files.
+        """
+        objects_to_delete = objects_to_delete or []
+        total_files = len(files_to_upload)
+        total_bytes = sum(
+            os.path.getsize(local_file_path)
+            for local_file_path, _ in files_to_upload)
+        progress_lock = threading.Lock()
+        progress = {'files': 0, 'bytes': 0}
+
+        def upload(local_file_path, object_name):
+            self._upload_file_to_object(local_file_path, bucket_name,
+                                        object_name, web_assets)
+            with progress_lock:
+                progress['files'] += 1
+                progress['bytes'] += os.path.getsize(local_file_path)
+                if progress_callback:
+                    progress_callback(progress['files'], total_files,
+                                      progress['bytes'], total_bytes)
+
+        def delete(object_name):
+            try:
+                self._delete_object(bucket_name, object_name)
+            except errors.HttpError as e:
+                raise StaticContentServeError(
+                    'Unexpected error deleting object "{}" of bucket '
+                    '"{}"'.format(object_name, bucket_name)) from e
+
+        start = time.monotonic()
+        with futures.ThreadPoolExecutor(
+                max_workers=self.UPLOAD_WORKERS) as executor:
+            upload_futures = [
+                executor.submit(upload, local_file_path, object_name)
+                for local_file_path, object_name in files_to_upload
+            ]
+            upload_futures.extend(
+                executor.submit(delete, object_name)
+                for object_name in objects_to_delete)
+            try:
+                for future in futures.as_completed(upload_futures):
+                    future.result()
+            except Exception:
+                # Do not start uploads which have not started yet.
+                for future in upload_futures:
+                    future.cancel()
+                raise
+        return UploadStats(
+            total_files,
+            total_bytes,
+            time.monotonic() - start,
+            deleted_files=len(objects_to_delete))
+
+    def upload_content(
+            self,
+            bucket_name: str,
+            static_content_dir: str,
+            gcs_folder_root: str = None,
+            progress_callback: Optional[Callable[[int, int, int, int],
+                                                 None]] = None,
+            web_assets: bool = False) -> UploadStats:
+        """Upload content in the given directory to a GCS bucket.
+
+        Files are uploaded concurrently.
+
+        Args:
+            bucket_name: Name of the bucket you want to upload static content
+                to.
+            static_content_dir: Absolute path of the directory containing
+                static files of the Django app.
+            gcs_folder_root: Name of root folder for files in GCS bucket.
+            progress_callback: Called after each uploaded file with the number
+                of uploaded files, the total number of files, the number of
+                uploaded bytes and the total number of bytes.
+            web_assets: Whether the files are served to browsers. If True,
+                text-like files are uploaded gzip compressed and all files get
+                Content-Type and Cache-Control headers.
+
+        Returns:
+            Summary of the upload.
+
+        Raises:
+            StaticContentServeError: When failed to upload files.
+        """
+        gcs_folder_root = gcs_folder_root or self.GCS_ROOT
+        files_to_upload = self._list_files_to_upload(static_content_dir,
+                                                     gcs_folder_root)
+        return self._upload_files(bucket_name, files_to_upload,
+                                  progress_callback, web_assets)
+
+    def _list_objects(self, bucket_name: str,
+                      prefix: str) -> Dict[str, _ExistingObject]:
+        """List objects under the given prefix of a GCS bucket.
+
+        Args:
+            bucket_name: Name of the bucket.
+            prefix: Only objects whose names start with this prefix are
+                listed.
+
+        Returns:
+            A dictionary mapping object names to the objects.
+
+        Raises:
+            StaticContentServeError: When it fails to list objects.
+        """
+        objects = {}
+        page_token = None
+        while True:
+            request = self._storage_service.objects().list(
+                bucket=bucket_name,
+                prefix=prefix,
+                fields='items(name,md5Hash,metadata),nextPageToken',
+                pageToken=page_token)
+            try:
+                response = request.execute()
+            except errors.HttpError as e:
+                if e.resp.status == 404:
+                    raise StaticContentServeError(
+                        'Bucket "{}" not found.'.format(bucket_name))
+                raise StaticContentServeError(
+                    'Unexpected error listing objects of bucket "{}"'.format(
+                        bucket_name)) from e
+            # Response format:
+            # https://cloud.google.com/storage/docs/json_api/v1/objects/list
+            for item in response.get('items', []):
+                metadata = item.get('metadata', {})
+                objects[item['name']] = _ExistingObject(
+                    metadata.get(_SOURCE_MD5_METADATA_KEY, item.get('md5Hash')),
+                    metadata.get(_UPLOAD_FORMAT_METADATA_KEY))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return objects
+
+    @staticmethod
+    def _md5_hash(local_file_path: str) -> str:
+        """Returns the base64 encoded MD5 hash of a file, as GCS reports it."""
+        md5 = hashlib.md5()
+        with open(local_file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                md5.update(chunk)
+        return base64.b64encode(md5.digest()).decode('utf-8')
+
+    def _is_unchanged(self,
+                      local_file_path: str,
+                      object_name: str,
+                      existing_objects: Dict[str, _ExistingObject],
+                      web_assets: bool = False) -> bool:
+        """Returns whether an object is already uploaded as a local file.
+
+        Args:
+            local_file_path: Absolute path of the local file.
+            object_name: Name of the object the file is uploaded to.
+            existing_objects: A dictionary mapping names of existing objects to
+                the objects, as returned by _list_objects.
+            web_assets: Whether the file is uploaded as a web asset. Web
+                assets uploaded with other headers are not unchanged.
+        """
+        existing_object = existing_objects.get(object_name)
+        if existing_object is None:
+            return False
+        if (web_assets and
+                existing_object.upload_format != _WEB_ASSET_UPLOAD_FORMAT):
+            return False
+        # The name of a content-hashed file changes with its content, so the
+        # file does not need to be read.
+        if _HASHED_FILENAME_RE.search(object_name):
+            return True
+        return existing_object.md5 == self._md5_hash(local_file_path)
+
+    @backoff.on_exception(
+        backoff.expo,
+        errors.HttpError,
+        max_tries=5,
+        giveup=_is_not_retriable,
+        logger=None)
+    def _delete_object(self, bucket_name: str, object_name: str):
+        """Delete an object, retrying on rate limiting and server errors."""
+        request = self._storage_service.objects().delete(
+            bucket=bucket_name, object=object_name)
+        try:
+            request.execute()
+        except errors.HttpError as e:
+            # The object is already gone.
+            if e.resp.status != 404:
+                raise
+
+    def sync_content(
+            self,
+            bucket_name: str,
+            static_content_dir: str,
+            gcs_folder_root: str = None,
+            delete_stale: bool = False,
+            progress_callback: Optional[Callable[[int, int, int, int],
+                                                 None]] = None,
+            web_assets: bool = False) -> UploadStats:
+        """Make a GCS bucket folder match the given directory.
+
+        Unlike upload_content, only files which are new or whose content
+        differs from the existing object are uploaded. Changes are detected by
+        comparing the MD5 hash of local files with the MD5 hash of the objects,
+        which are all fetched with a single listing. Web assets uploaded with
+        an older upload format are uploaded again.
+
+        Args:
+            bucket_name: Name of the bucket you want to upload static content
+                to.
+            static_content_dir: Absolute path of the directory containing
+                static files of the Django app.
+            gcs_folder_root: Name of root folder for files in GCS bucket.
+            delete_stale: Whether to delete objects under gcs_folder_root
+                which do not exist in the given directory anymore.
+            progress_callback: Called after each uploaded file with the number
+                of uploaded files, the total number of files, the number of
+                uploaded bytes and the total number of bytes.
+            web_assets: Whether the files are served to browsers. See
+                upload_content.
+
+        Returns:
+            Summary of the sync.
+
+        Raises:
+            StaticContentServeError: When failed to upload or delete files.
+        """
+        gcs_folder_root = gcs_folder_root or self.GCS_ROOT
+        files_to_upload = self._list_files_to_upload(static_content_dir,
+                                                     gcs_folder_root)
+        existing_objects = self._list_objects(bucket_name,
+                                              gcs_folder_root + '/')
+        changed_files = [
+            (local_file_path, object_name)
+            for local_file_path, object_name in files_to_upload
+            if not self._is_unchanged(local_file_path, object_name,
+                                      existing_objects, web_assets)
+        ]
+        stale_objects = []
+        if delete_stale:
+            local_objects = set(
+                object_name for _, object_name in files_to_upload)
+            stale_objects = [
+                object_name for object_name in existing_objects
+                if object_name not in local_objects
+            ]
+        stats = self._upload_files(bucket_name, changed_files,
+                                   progress_callback, web_assets,
+                                   stale_objects)
+        stats.skipped_files = len(files_to_upload) - len(changed_files)
+        return stats
 
     def collect_static_content(self):
         """Collect static content of the provided Django project.
@@ -299,16 +719,19 @@ class StaticContentServeClient(object):
             raise StaticContentServeError(
                 'Django environment is not setup correctly or the settings '
                 'module is invalid. We cannot collect static files.')
-        cwd = os.getcwd()
-        # Change directory to the Django project directory. If we do not do
-        # this, static content will be collected in your current directory.
-        # This is not expected.
-        os.chdir(settings.BASE_DIR)
-        try:
-            management.call_command(
-                'collectstatic', verbosity=0, interactive=False)
-        except Exception as e:
-            raise crash_handling.UserError(
-                'Not able to collect static files.') from e
-        finally:
-            os.chdir(cwd)
+        # The working directory is process-wide, so other management commands
+        # must not run while it is changed.
+        with django_commands.lock:
+            cwd = os.getcwd()
+            # Change directory to the Django project directory. If we do not do
+            # this, static content will be collected in your current directory.
+            # This is not expected.
+            os.chdir(settings.BASE_DIR)
+            try:
+                django_commands.call_command(
+                    'collectstatic', verbosity=0, interactive=False)
+            except Exception as e:
+                raise crash_handling.UserError(
+                    'Not able to collect static files.') from e
+            finally:
+                os.chdir(cwd)
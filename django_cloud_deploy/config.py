@@ -26,6 +26,9 @@ class Configuration(object):
 
     _HEADER = '# Generated file, do not edit'
 
+    # Name of the configuration file in the Django project directory.
+    FILE_NAME = '.config.yaml'
+
     def __init__(self, django_directory_path: str):
         """Initialize a configuration object from a Django project directory.
 
@@ -45,10 +48,10 @@ class Configuration(object):
             raise ValueError('[{}] is not a valid directory path.'.format(
                 django_directory_path))
         self._config_path = os.path.join(django_directory_path,
-                                         '.config.yaml')
+                                         self.FILE_NAME)
         if os.path.exists(self._config_path):
             with open(self._config_path) as config_file:
-                self._data = yaml.load(config_file)
+                self._data = yaml.safe_load(config_file)
         else:
             self._data = {}
 
@@ -23,8 +23,6 @@ import traceback
 import urllib.parse
 import webbrowser
 
-import jinja2
-
 import django_cloud_deploy
 from django_cloud_deploy.cli import io
 from django_cloud_deploy import __version__
@@ -129,6 +127,8 @@ def _create_issue_body(command: str) -> str:
     Returns:
         Github issue body in string.
     """
+    # Crashes are rare, so jinja2 is not imported on startup.
+    import jinja2
     template_env = jinja2.Environment()
 
     gcloud_path = shutil.which('gcloud')
@@ -18,6 +18,7 @@ import abc
 import os
 import shutil
 import sys
+import threading
 from typing import Any, Dict, List, Optional
 
 import django
@@ -27,12 +28,216 @@ from django_cloud_deploy import crash_handling
 import jinja2
 
 
+_TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# CPU limit of the app containers on GKE, as a Kubernetes quantity.
+_DEFAULT_CPU_LIMIT = '1'
+
+# Packages needed to cache data in Redis.
+_REDIS_REQUIREMENTS = ['django-redis==4.10.0']
+
+# Path answering health checks in the URL configuration of generated Django
+# projects.
+_HEALTH_CHECK_PATH = '/healthz/'
+
+# Port PgBouncer listens on, when it runs next to the app on GKE.
+_PGBOUNCER_PORT = 6432
+
+# Seconds for which the app keeps database connections open. Opening a
+# connection through the Cloud SQL proxy takes longer than most queries.
+_DEFAULT_CONN_MAX_AGE = 60
+
+# Number of gunicorn workers recommended for App Engine instance classes. See
+# https://cloud.google.com/appengine/docs/standard/python3/runtime#entrypoint_best_practices
+_GAE_INSTANCE_CLASS_WORKERS = {
+    'F1': 2,
+    'F2': 4,
+    'F4': 8,
+    'F4_1G': 8,
+    'B1': 2,
+    'B2': 4,
+    'B4': 8,
+    'B4_1G': 8,
+    'B8': 8,
+}
+
+# Packages needed by gunicorn worker classes besides gunicorn itself.
+_WORKER_CLASS_REQUIREMENTS = {
+    'sync': [],
+    'gthread': [],
+    'gevent': ['gevent==1.4.0'],
+}
+
+
+class GunicornOptions(object):
+    """Settings of the gunicorn server running the Django app.
+
+    See https://docs.gunicorn.org/en/stable/settings.html
+    """
+
+    def __init__(self,
+                 workers: int = 2,
+                 worker_class: str = 'gthread',
+                 threads: int = 4,
+                 preload: bool = True,
+                 keep_alive: int = 5,
+                 max_requests: int = 1000,
+                 max_requests_jitter: int = 100,
+                 timeout: int = 30):
+        """Constructor of the class.
+
+        Args:
+            workers: Number of worker processes.
+            worker_class: Type of the workers, one of "sync", "gthread" or
+                "gevent". Threaded and gevent workers keep serving other
+                requests while one waits for the database.
+            threads: Number of threads per worker, for "gthread" workers.
+            preload: Whether to import the app before forking the workers.
+                The workers then share its memory and start faster.
+            keep_alive: Seconds to keep idle client connections open. Load
+                balancers reuse connections to the app.
+            max_requests: Number of requests after which a worker is
+                restarted, which bounds the impact of memory leaks. 0 disables
+                restarts.
+            max_requests_jitter: Maximum random number of requests added to
+                max_requests, so that workers do not restart all at once.
+            timeout: Seconds after which a silent worker is restarted.
+
+        Raises:
+            ValueError: If worker_class is not supported.
+        """
+        if worker_class not in _WORKER_CLASS_REQUIREMENTS:
+            raise ValueError(
+                'Unsupported gunicorn worker class "{}", expected one of: {}'.
+                format(worker_class, ', '.join(
+                    sorted(_WORKER_CLASS_REQUIREMENTS))))
+        self.workers = workers
+        self.worker_class = worker_class
+        self.threads = threads
+        self.preload = preload
+        self.keep_alive = keep_alive
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.timeout = timeout
+
+    @classmethod
+    def for_cpu_quantity(cls, cpu: str, **kwargs) -> 'GunicornOptions':
+        """Returns options using the given CPU, e.g. of a Kubernetes container.
+
+        This follows the gunicorn recommendation of two workers per core, plus
+        one.
+
+        Args:
+            cpu: Number of cores as a Kubernetes quantity, e.g. "2" or "500m".
+            **kwargs: Other arguments of the constructor.
+        """
+        if cpu.endswith('m'):
+            cores = int(cpu[:-1]) / 1000
+        else:
+            cores = float(cpu)
+        kwargs.setdefault('workers', max(2, int(2 * cores) + 1))
+        return cls(**kwargs)
+
+    @classmethod
+    def for_gae_instance_class(cls, instance_class: str,
+                               **kwargs) -> 'GunicornOptions':
+        """Returns options suited to an App Engine instance class.
+
+        Args:
+            instance_class: Name of the instance class, e.g. "F2".
+            **kwargs: Other arguments of the constructor.
+
+        Raises:
+            ValueError: If the instance class is unknown.
+        """
+        if instance_class not in _GAE_INSTANCE_CLASS_WORKERS:
+            raise ValueError(
+                'Unknown App Engine instance class "{}"'.format(instance_class))
+        kwargs.setdefault('workers',
+                          _GAE_INSTANCE_CLASS_WORKERS[instance_class])
+        return cls(**kwargs)
+
+    @property
+    def requirements(self) -> List[str]:
+        """Packages needed by the worker class, in requirements.txt syntax."""
+        return list(_WORKER_CLASS_REQUIREMENTS[self.worker_class])
+
+    def to_command_line(self) -> str:
+        """Returns the options as gunicorn command line arguments."""
+        args = [
+            '--workers', str(self.workers), '--worker-class', self.worker_class
+        ]
+        if self.worker_class == 'gthread':
+            args.extend(['--threads', str(self.threads)])
+        if self.preload:
+            args.append('--preload')
+        args.extend([
+            '--keep-alive', str(self.keep_alive),
+            '--max-requests', str(self.max_requests),
+            '--max-requests-jitter', str(self.max_requests_jitter),
+            '--timeout', str(self.timeout)
+        ])
+        return ' '.join(args)
+
+
+def _default_bytecode_cache_dir() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'django-cloud-deploy', 'jinja2')
+
+
+_template_env_lock = threading.Lock()
+_template_env = None  # type: Optional[jinja2.Environment]
+
+
+def _create_template_environment(bytecode_cache_dir: Optional[str] = None
+                                ) -> jinja2.Environment:
+    """Create a Jinja2 environment loading the templates of the generators.
+
+    The environment compiles each template once and keeps it in memory.
+    Compiled templates are also cached on disk, so later processes only
+    compile templates which changed. If the cache directory cannot be created,
+    templates are only cached in memory.
+
+    Args:
+        bytecode_cache_dir: Absolute path of the directory to store compiled
+            templates in. Defaults to "django-cloud-deploy/jinja2" in the user
+            cache directory.
+
+    Returns:
+        The new environment.
+    """
+    cache_dir = bytecode_cache_dir or _default_bytecode_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    except OSError:
+        bytecode_cache = None
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(_TEMPLATES_DIR),
+        bytecode_cache=bytecode_cache,
+        # Never evict templates. There are only a few dozens of them.
+        cache_size=-1)
+
+
+def _get_template_environment() -> jinja2.Environment:
+    """Returns the Jinja2 environment shared by all file generators.
+
+    It is created on first use, so templates are compiled once per process.
+    """
+    global _template_env
+    with _template_env_lock:
+        if _template_env is None:
+            _template_env = _create_template_environment()
+        return _template_env
+
+
 class _FileGenerator(object):  # pytype: disable=ignored-abstractmethod
     """An abstract class to generate files using templates."""
 
     def _get_template_folder_path(self) -> str:
-        dirname, _ = os.path.split(os.path.abspath(__file__))
-        return os.path.join(dirname, 'templates')
+        return _TEMPLATES_DIR
 
     @staticmethod
     @abc.abstractmethod
@@ -76,8 +281,14 @@ class _Jinja2FileGenerator(_FileGenerator):
         ('.html-tpl', '.html'),
         ('.css-tpl', '.css'),)
 
-    def __init__(self):
-        self._template_env = jinja2.Environment()
+    def __init__(self, template_env: Optional[jinja2.Environment] = None):
+        """Constructor of the class.
+
+        Args:
+            template_env: The environment loading templates. Defaults to the
+                environment shared by all file generators.
+        """
+        self._template_env = template_env or _get_template_environment()
 
     def _render_file(self,
                      template_path: str,
@@ -86,15 +297,19 @@ class _Jinja2FileGenerator(_FileGenerator):
         """Render a single file with template.
 
         Args:
-            template_path: Absolute path of the template to render a file.
+            template_path: Absolute path of the template to render a file. It
+                must be in the templates folder.
             output_path: Absolute path of the output file.
             options: Options used to render the file.
         """
         if not options:
             options = {}
-        with open(template_path) as template_file:
-            content = template_file.read()
-        template = self._template_env.from_string(content)
+        # Templates are loaded by their path relative to the templates folder,
+        # with "/" as separator.
+        template_name = os.path.relpath(
+            template_path, self._get_template_folder_path()).replace(
+                os.sep, '/')
+        template = self._template_env.get_template(template_name)
         content = template.render(options)
         with open(output_path, 'w') as new_file:
             new_file.write(content)
@@ -331,18 +546,21 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                  project_dir: str,
                  cloud_sql_connection: str,
                  database_name: Optional[str] = None,
-                 cloud_storage_bucket_name: Optional[str] = None):
+                 cloud_storage_bucket_name: Optional[str] = None,
+                 conn_max_age: int = _DEFAULT_CONN_MAX_AGE,
+                 redis: bool = False):
         if self.generated(project_dir, project_name):
             return
 
         if self.exist(project_dir, project_name):
             self._generate_from_existing(project_id, project_name, project_dir,
                                          cloud_sql_connection, database_name,
-                                         cloud_storage_bucket_name)
+                                         cloud_storage_bucket_name,
+                                         conn_max_age, redis)
         else:
             self._generate_new(project_id, project_name, project_dir,
                                cloud_sql_connection, database_name,
-                               cloud_storage_bucket_name)
+                               cloud_storage_bucket_name, conn_max_age, redis)
 
     def _generate_new(self,
                       project_id: str,
@@ -350,7 +568,9 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                       project_dir: str,
                       cloud_sql_connection: str,
                       database_name: Optional[str] = None,
-                      cloud_storage_bucket_name: Optional[str] = None):
+                      cloud_storage_bucket_name: Optional[str] = None,
+                      conn_max_age: int = _DEFAULT_CONN_MAX_AGE,
+                      redis: bool = False):
         """Create Django settings file using our template.
 
         Args:
@@ -362,6 +582,11 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             database_name: Name of your cloud database.
             cloud_storage_bucket_name: Google Cloud Storage bucket name to
                 serve static content.
+            conn_max_age: Seconds for which the app keeps database connections
+                open to reuse them in later requests. 0 closes them after every
+                request.
+            redis: Whether the app caches data and sessions in Redis when
+                deployed.
         """
         database_name = database_name or project_name + '-db'
         destination = os.path.join(
@@ -376,7 +601,9 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             'secret_key': utils.get_random_secret_key(),
             'database_name': database_name,
             'bucket_name': cloud_storage_bucket_name,
-            'cloud_sql_connection': cloud_sql_connection
+            'cloud_sql_connection': cloud_sql_connection,
+            'conn_max_age': conn_max_age,
+            'redis': redis
         }
         self._render_directory(settings_templates_dir, destination,
                                options=options)
@@ -388,7 +615,9 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                                 cloud_sql_connection: str,
                                 database_name: Optional[str] = None,
                                 cloud_storage_bucket_name:
-                                Optional[str] = None):
+                                Optional[str] = None,
+                                conn_max_age: int = _DEFAULT_CONN_MAX_AGE,
+                                redis: bool = False):
         """Create Django settings file from an existing settings file.
 
         We made several assumptions:
@@ -411,6 +640,11 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             database_name: Name of your cloud database.
             cloud_storage_bucket_name: Google Cloud Storage bucket name to
                 serve static content.
+            conn_max_age: Seconds for which the app keeps database connections
+                open to reuse them in later requests. 0 closes them after every
+                request.
+            redis: Whether the app caches data and sessions in Redis when
+                deployed.
         """
         database_name = database_name or project_name + '-db'
         cloud_storage_bucket_name = cloud_storage_bucket_name or project_id
@@ -430,7 +664,9 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             'secret_key': utils.get_random_secret_key(),
             'database_name': database_name,
             'bucket_name': cloud_storage_bucket_name,
-            'cloud_sql_connection': cloud_sql_connection
+            'cloud_sql_connection': cloud_sql_connection,
+            'conn_max_age': conn_max_age,
+            'redis': redis
         }
         self._render_directory(settings_templates_dir, django_dir,
                                options=options)
@@ -450,19 +686,33 @@ class _DockerfileGenerator(_Jinja2FileGenerator):
                 return False
         return True
 
-    def generate(self, project_name: str, project_dir: str):
+    def generate(self,
+                 project_name: str,
+                 project_dir: str,
+                 gunicorn_options: Optional[GunicornOptions] = None):
         if not self.generated(project_dir):
-            self._generate_new(project_name, project_dir)
+            self._generate_new(project_name, project_dir, gunicorn_options)
 
-    def _generate_new(self, project_name: str, project_dir: str):
+    def _generate_new(self,
+                      project_name: str,
+                      project_dir: str,
+                      gunicorn_options: Optional[GunicornOptions] = None):
         """Generate Dockerfile and .dockerignore.
 
         Args:
             project_name: The name of your Django project.
             project_dir: The destination directory path to put Dockerfile.
+            gunicorn_options: Settings of the gunicorn server in the image.
+                Defaults to settings using the CPU limit of the app containers
+                on GKE.
         """
+        gunicorn_options = (gunicorn_options or
+                            GunicornOptions.for_cpu_quantity(_DEFAULT_CPU_LIMIT))
         file_names = ('Dockerfile', '.dockerignore')
-        options = {'project_name': project_name}
+        options = {
+            'project_name': project_name,
+            'gunicorn_options': gunicorn_options.to_command_line()
+        }
         for file_name in file_names:
             template_path = os.path.join(self._get_template_folder_path(),
                                          file_name)
@@ -483,8 +733,12 @@ class _AppEngineFileGenerator(_Jinja2FileGenerator):
                 return False
         return True
 
-    def generate(self, project_name: str, project_dir: str,
-                 service_name: Optional[str] = 'default'):
+    def generate(self,
+                 project_name: str,
+                 project_dir: str,
+                 service_name: Optional[str] = 'default',
+                 instance_class: str = 'F1',
+                 gunicorn_options: Optional[GunicornOptions] = None):
         """Generate app.yaml and .gcloudignore.
 
         Args:
@@ -492,10 +746,18 @@ class _AppEngineFileGenerator(_Jinja2FileGenerator):
             project_dir: The destination directory path to put Dockerfile.
             service_name: Name of App engine services.
                 See https://cloud.google.com/appengine/docs/standard/python/an-overview-of-app-engine#services
+            instance_class: App Engine instance class running the app, e.g.
+                "F2".
+            gunicorn_options: Settings of the gunicorn server. Defaults to
+                settings suited to the instance class.
         """
         if not self.generated(project_dir):
+            gunicorn_options = (
+                gunicorn_options or
+                GunicornOptions.for_gae_instance_class(instance_class))
             self._generate_ignore(project_dir)
-            self._generate_yaml(project_dir, project_name, service_name)
+            self._generate_yaml(project_dir, project_name, service_name,
+                                instance_class, gunicorn_options)
 
     def _generate_ignore(self, project_dir: str):
         file_name = '.gcloudignore'
@@ -505,12 +767,15 @@ class _AppEngineFileGenerator(_Jinja2FileGenerator):
         self._render_file(template_path, output_path)
 
     def _generate_yaml(self, project_dir: str, project_name: str,
-                       service_name: str):
+                       service_name: str, instance_class: str,
+                       gunicorn_options: GunicornOptions):
         """Generate a yaml file to define how to deploy a Django app to GAE."""
         file_name = 'app.yaml'
         options = {
             'project_name': project_name,
-            'service_name': service_name
+            'service_name': service_name,
+            'instance_class': instance_class,
+            'gunicorn_options': gunicorn_options.to_command_line()
         }
         template_path = os.path.join(self._get_template_folder_path(),
                                      file_name)
@@ -528,17 +793,23 @@ class _DependencyFileGenerator(_Jinja2FileGenerator):
         files_list = os.listdir(project_dir)
         return _DependencyFileGenerator._FILE in files_list
 
-    def generate(self, project_dir: str):
+    def generate(self,
+                 project_dir: str,
+                 extra_requirements: Optional[List[str]] = None):
         if not self.generated(project_dir):
-            self._generate_new(project_dir)
+            self._generate_new(project_dir, extra_requirements)
 
-    def _generate_new(self, project_dir: str):
+    def _generate_new(self,
+                      project_dir: str,
+                      extra_requirements: Optional[List[str]] = None):
         """Generate requirements.txt.
 
         Dependencies are hardcoded.
 
         Args:
             project_dir: The destination directory path to put requirements.txt.
+            extra_requirements: Additional dependencies, in requirements.txt
+                syntax.
         """
 
         # TODO: Find a way to determine the correct package version
@@ -546,7 +817,8 @@ class _DependencyFileGenerator(_Jinja2FileGenerator):
         template_path = os.path.join(self._get_template_folder_path(),
                                      self._FILE)
         output_path = os.path.join(project_dir, self._FILE)
-        self._render_file(template_path, output_path)
+        options = {'extra_requirements': extra_requirements or []}
+        self._render_file(template_path, output_path, options)
 
 
 class _YAMLFileGenerator(_Jinja2FileGenerator):
@@ -565,11 +837,26 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                  region: Optional[str] = 'us-west1',
                  image_tag: Optional[str] = None,
                  cloudsql_secrets: Optional[List[str]] = None,
-                 django_secrets: Optional[List[str]] = None):
+                 django_secrets: Optional[List[str]] = None,
+                 min_replicas: int = 1,
+                 max_replicas: int = 5,
+                 target_cpu_utilization: int = 70,
+                 cpu_request: str = '250m',
+                 memory_request: str = '256Mi',
+                 cpu_limit: str = _DEFAULT_CPU_LIMIT,
+                 memory_limit: str = '512Mi',
+                 pgbouncer: bool = False,
+                 gunicorn_options: Optional[GunicornOptions] = None,
+                 redis: bool = False,
+                 health_check_path: Optional[str] = _HEALTH_CHECK_PATH):
         if not self.generated(project_dir, project_name):
             self._generate_new(project_dir, project_name, project_id,
                                instance_name, region, image_tag,
-                               cloudsql_secrets, django_secrets)
+                               cloudsql_secrets, django_secrets, min_replicas,
+                               max_replicas, target_cpu_utilization,
+                               cpu_request, memory_request, cpu_limit,
+                               memory_limit, pgbouncer, gunicorn_options,
+                               redis, health_check_path)
 
     def _generate_new(self,
                       project_dir: str,
@@ -579,9 +866,23 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                       region: Optional[str] = 'us-west1',
                       image_tag: Optional[str] = None,
                       cloudsql_secrets: Optional[List[str]] = None,
-                      django_secrets: Optional[List[str]] = None):
+                      django_secrets: Optional[List[str]] = None,
+                      min_replicas: int = 1,
+                      max_replicas: int = 5,
+                      target_cpu_utilization: int = 70,
+                      cpu_request: str = '250m',
+                      memory_request: str = '256Mi',
+                      cpu_limit: str = _DEFAULT_CPU_LIMIT,
+                      memory_limit: str = '512Mi',
+                      pgbouncer: bool = False,
+                      gunicorn_options: Optional[GunicornOptions] = None,
+                      redis: bool = False,
+                      health_check_path: Optional[str] = _HEALTH_CHECK_PATH):
         """Generate YAML file which defines Kubernete deployment and service.
 
+        The deployment is scaled by a HorizontalPodAutoscaler, and its app
+        container is health checked on health_check_path.
+
         Args:
             project_dir: The destination directory path to put the yaml
                 file.
@@ -597,8 +898,39 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                 container.
             django_secrets: A list of secrets needed by Django app
                 container.
+            min_replicas: Minimum number of pods running the app.
+            max_replicas: Maximum number of pods running the app.
+            target_cpu_utilization: Average CPU usage of the app containers,
+                in percent of their requested CPU, above which pods are added.
+            cpu_request: CPU reserved for each app container, as a Kubernetes
+                quantity, e.g. "250m" for a quarter of a core.
+            memory_request: Memory reserved for each app container, as a
+                Kubernetes quantity, e.g. "256Mi".
+            cpu_limit: Maximum CPU used by each app container.
+            memory_limit: Maximum memory used by each app container. Containers
+                using more are restarted.
+            pgbouncer: Whether to run PgBouncer next to the app, to pool the
+                connections of its gunicorn workers to the database.
+            gunicorn_options: Settings of the gunicorn server of the app, used
+                to size the PgBouncer pools. Defaults to settings using
+                cpu_limit.
+            redis: Whether the app gets the endpoint of its Redis cache from
+                the "redis" secret.
+            health_check_path: The path of the Django project answering
+                health checks. If None, health checks only open a TCP
+                connection to the app, e.g. for existing Django projects, whose
+                URL configuration is not generated.
+
+        Raises:
+            ValueError: If min_replicas is not between 1 and max_replicas.
         """
+        if not 1 <= min_replicas <= max_replicas:
+            raise ValueError(
+                'Invalid number of replicas, expected 1 <= min_replicas ({}) '
+                '<= max_replicas ({})'.format(min_replicas, max_replicas))
         file_name = 'project_name.yaml'
+        gunicorn_options = (gunicorn_options or
+                            GunicornOptions.for_cpu_quantity(cpu_limit))
         image_tag = image_tag or '/'.join(['gcr.io', project_id, project_name])
         instance_name = instance_name or project_name + '-instance'
 
@@ -615,7 +947,24 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
             'cloud_sql_connection_string': cloud_sql_connection_string,
             'image_tag': image_tag,
             'cloudsql_secrets': cloudsql_secrets,
-            'django_secrets': django_secrets
+            'django_secrets': django_secrets,
+            'min_replicas': min_replicas,
+            'max_replicas': max_replicas,
+            'target_cpu_utilization': target_cpu_utilization,
+            'cpu_request': cpu_request,
+            'memory_request': memory_request,
+            'cpu_limit': cpu_limit,
+            'memory_limit': memory_limit,
+            'pgbouncer': pgbouncer,
+            'pgbouncer_port': _PGBOUNCER_PORT,
+            # PgBouncer accepts a connection from every gunicorn thread, with
+            # headroom for workers being restarted, but only opens one
+            # database connection per worker.
+            'pgbouncer_max_client_conn':
+                2 * gunicorn_options.workers * gunicorn_options.threads,
+            'pgbouncer_pool_size': gunicorn_options.workers,
+            'redis': redis,
+            'health_check_path': health_check_path,
         }
         template_path = os.path.join(self._get_template_folder_path(),
                                      file_name)
@@ -626,15 +975,23 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
 class DjangoSourceFileGenerator(_FileGenerator):
     """The class to create all necessary Django source files."""
 
-    def __init__(self):
-        self.django_admin_overwrite_generator = _DjangoAdminOverwriteGenerator()
-        self.django_app_generator = _DjangoAppFileGenerator()
-        self.django_project_generator = _DjangoProjectFileGenerator()
-        self.docker_file_generator = _DockerfileGenerator()
-        self.dependency_file_generator = _DependencyFileGenerator()
-        self.settings_file_generator = _SettingsFileGenerator()
-        self.yaml_file_generator = _YAMLFileGenerator()
-        self.app_engine_file_generator = _AppEngineFileGenerator()
+    def __init__(self, template_env: Optional[jinja2.Environment] = None):
+        """Constructor of the class.
+
+        Args:
+            template_env: The environment loading templates. Defaults to the
+                environment shared by all file generators.
+        """
+        self.django_admin_overwrite_generator = _DjangoAdminOverwriteGenerator(
+            template_env)
+        self.django_app_generator = _DjangoAppFileGenerator(template_env)
+        self.django_project_generator = _DjangoProjectFileGenerator(
+            template_env)
+        self.docker_file_generator = _DockerfileGenerator(template_env)
+        self.dependency_file_generator = _DependencyFileGenerator(template_env)
+        self.settings_file_generator = _SettingsFileGenerator(template_env)
+        self.yaml_file_generator = _YAMLFileGenerator(template_env)
+        self.app_engine_file_generator = _AppEngineFileGenerator(template_env)
 
     def _generate_django_source_files(self,
                                       project_id: str,
@@ -728,7 +1085,15 @@ class DjangoSourceFileGenerator(_FileGenerator):
                                   region: Optional[str] = 'us-west1',
                                   image_tag: Optional[str] = None,
                                   service_name: Optional[str] = None,
-                                  overwrite: Optional[bool] = True):
+                                  overwrite: Optional[bool] = True,
+                                  min_replicas: int = 1,
+                                  max_replicas: int = 5,
+                                  gae_instance_class: str = 'F1',
+                                  gunicorn_options:
+                                  Optional[GunicornOptions] = None,
+                                  conn_max_age: int = _DEFAULT_CONN_MAX_AGE,
+                                  pgbouncer: bool = False,
+                                  redis: bool = False):
         """Generate all source files of a Django app to be deployed to GCP.
 
         Args:
@@ -758,6 +1123,19 @@ class DjangoSourceFileGenerator(_FileGenerator):
                 test. See https://cloud.google.com/appengine/docs/standard/python/an-overview-of-app-engine#services
             overwrite: A flag indicating whether to delete existing files in the
                 provided directory.
+            min_replicas: Minimum number of pods running the app on GKE.
+            max_replicas: Maximum number of pods running the app on GKE.
+            gae_instance_class: App Engine instance class running the app,
+                e.g. "F2".
+            gunicorn_options: Settings of the gunicorn server running the app.
+                By default they are derived from the CPU of the app containers
+                on GKE, and from the instance class on App Engine.
+            conn_max_age: Seconds for which the app keeps database connections
+                open to reuse them in later requests.
+            pgbouncer: Whether to pool database connections with PgBouncer on
+                GKE.
+            redis: Whether the app caches data and sessions in a Memorystore
+                Redis instance, whose endpoint is provided when deploying.
         """
 
         project_dir = os.path.abspath(os.path.expanduser(project_dir))
@@ -768,24 +1146,53 @@ class DjangoSourceFileGenerator(_FileGenerator):
         instance_name = instance_name or project_name + '-instance'
         cloud_sql_connection_string = (
             '{}:{}:{}'.format(project_id, region, instance_name))
+        # The URL configuration of existing Django projects is kept, so it does
+        # not route the health check path.
+        if self.django_project_generator.generated(project_dir, project_name):
+            health_check_path = None
+        else:
+            health_check_path = _HEALTH_CHECK_PATH
         self._generate_django_source_files(project_id, project_name, app_name,
                                            project_dir,
                                            database_name,
                                            cloud_storage_bucket_name,
                                            cloud_sql_connection_string)
 
-        self.settings_file_generator.generate(project_id, project_name,
-                                              project_dir,
-                                              cloud_sql_connection_string,
-                                              database_name,
-                                              cloud_storage_bucket_name)
-        self.docker_file_generator.generate(project_name, project_dir)
-        self.dependency_file_generator.generate(project_dir)
-        self.yaml_file_generator.generate(project_dir, project_name, project_id,
-                                          instance_name, region, image_tag,
-                                          cloudsql_secrets, django_secrets)
-        self.app_engine_file_generator.generate(project_name, project_dir,
-                                                service_name)
+        self.settings_file_generator.generate(
+            project_id, project_name, project_dir, cloud_sql_connection_string,
+            database_name, cloud_storage_bucket_name, conn_max_age, redis)
+        gke_gunicorn_options = (
+            gunicorn_options or
+            GunicornOptions.for_cpu_quantity(_DEFAULT_CPU_LIMIT))
+        gae_gunicorn_options = (
+            gunicorn_options or
+            GunicornOptions.for_gae_instance_class(gae_instance_class))
+        self.docker_file_generator.generate(project_name, project_dir,
+                                            gke_gunicorn_options)
+        extra_requirements = set(gke_gunicorn_options.requirements +
+                                 gae_gunicorn_options.requirements)
+        if redis:
+            extra_requirements.update(_REDIS_REQUIREMENTS)
+        extra_requirements = sorted(extra_requirements)
+        self.dependency_file_generator.generate(project_dir, extra_requirements)
+        self.yaml_file_generator.generate(
+            project_dir,
+            project_name,
+            project_id,
+            instance_name,
+            region,
+            image_tag,
+            cloudsql_secrets,
+            django_secrets,
+            min_replicas=min_replicas,
+            max_replicas=max_replicas,
+            pgbouncer=pgbouncer,
+            gunicorn_options=gke_gunicorn_options,
+            redis=redis,
+            health_check_path=health_check_path)
+        self.app_engine_file_generator.generate(
+            project_name, project_dir, service_name, gae_instance_class,
+            gae_gunicorn_options)
         self.setup_django_environment(
             project_dir=project_dir,
             project_name=project_name,
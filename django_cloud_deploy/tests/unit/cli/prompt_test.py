@@ -13,6 +13,7 @@
 # limitations under the License.
 """Tests for django_cloud_deploy.cli.prompt."""
 
+import shutil
 import tempfile
 from unittest import mock
 
@@ -24,6 +25,7 @@ from django_cloud_deploy.cli import io
 from django_cloud_deploy.cli import prompt
 from django_cloud_deploy.cloudlib import project
 from django_cloud_deploy.cloudlib import billing
+from django_cloud_deploy.cloudlib import discovery_client
 
 from google.auth import credentials
 
@@ -40,6 +42,26 @@ _FAKE_PROJECT_RESPONSE = {
 }
 
 
+_discovery_cache_dir = None
+_discovery_cache_patcher = None
+
+
+def setUpModule():
+    # Keep discovery documents fetched by the tests out of the user cache
+    # directory.
+    global _discovery_cache_dir, _discovery_cache_patcher
+    _discovery_cache_dir = tempfile.mkdtemp()
+    _discovery_cache_patcher = mock.patch.object(
+        discovery_client, '_discovery_cache',
+        discovery_client.DiscoveryCache(_discovery_cache_dir))
+    _discovery_cache_patcher.start()
+
+
+def tearDownModule():
+    _discovery_cache_patcher.stop()
+    shutil.rmtree(_discovery_cache_dir)
+
+
 class GoogleCloudProjectNamePromptTest(absltest.TestCase):
     """Tests for prompt.GoogleCloudProjectNamePrompt."""
 
@@ -14,10 +14,17 @@
 """Tests for the cloudlib.container module."""
 
 import base64
+import io
 import json
+import os
+import tarfile
+import tempfile
+import threading
 from unittest import mock
 
 from absl.testing import absltest
+import docker
+import kubernetes
 
 from django_cloud_deploy.cloudlib import container
 from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
@@ -46,44 +53,67 @@ class ClustersFake(object):
 
     def __init__(self):
         self.clusters_to_get_count = {}
+        self.create_bodies = {}
 
     def create(self, projectId, zone, body):
         name = body['cluster']['name']
+        self.create_bodies[name] = body
         if 'fail' not in name:
             if 'first' in name:
                 # (current_get_count, total_get_count)
                 self.clusters_to_get_count[name] = [0, 1]
             else:
                 self.clusters_to_get_count[name] = [0, 2]
-        return http_fake.HttpRequestFake(
-            {'name': 'operations/cp.7730969938063130608'})
+        return http_fake.HttpRequestFake({
+            'name': 'operation-' + name,
+            'status': 'RUNNING'
+        })
 
     def get(self, projectId, zone, clusterId):
         ca = base64.standard_b64encode(FAKE_CA).decode('utf-8')
         if 'invalid_response' in clusterId:
             return http_fake.HttpRequestFake(
                 json.loads(CLUSTER_GET_RESPONSE_INVALID))
-        if clusterId not in self.clusters_to_get_count:
-            status = 'ERROR'
-        else:
-            self.clusters_to_get_count[clusterId][0] += 1
-            get_count, total_get_count = self.clusters_to_get_count[clusterId]
-            if get_count < total_get_count:
-                status = 'PROVISIONING'
-            else:
-                status = 'RUNNING'
-        response = CLUSTER_GET_RESPONSE_TEMPLATE.format(clusterId, ca, status)
+        response = CLUSTER_GET_RESPONSE_TEMPLATE.format(clusterId, ca,
+                                                        'RUNNING')
         return http_fake.HttpRequestFake(json.loads(response))
 
 
+class OperationsFake(object):
+
+    def __init__(self, clusters_fake):
+        self._clusters_fake = clusters_fake
+
+    def get(self, projectId, zone, operationId):
+        cluster_name = operationId[len('operation-'):]
+        clusters_to_get_count = self._clusters_fake.clusters_to_get_count
+        if cluster_name not in clusters_to_get_count:
+            return http_fake.HttpRequestFake({
+                'name': operationId,
+                'status': 'DONE',
+                'statusMessage': 'cluster creation failed'
+            })
+        clusters_to_get_count[cluster_name][0] += 1
+        get_count, total_get_count = clusters_to_get_count[cluster_name]
+        status = 'RUNNING' if get_count < total_get_count else 'DONE'
+        return http_fake.HttpRequestFake({
+            'name': operationId,
+            'status': status
+        })
+
+
 class ZonesFake(object):
 
     def __init__(self):
         self.clusters_fake = ClustersFake()
+        self.operations_fake = OperationsFake(self.clusters_fake)
 
     def clusters(self):
         return self.clusters_fake
 
+    def operations(self):
+        return self.operations_fake
+
 
 class LocationsFake(object):
 
@@ -144,6 +174,29 @@ class ContainerClientTestCase(absltest.TestCase):
         self.assertIn(cluster_name, created_clusters)
         self.assertEqual(created_clusters[cluster_name][0], 2)
 
+    def test_create_vpc_native_cluster(self):
+        # Memorystore instances are only reachable from VPC-native clusters.
+        cluster_name = 'first_vpc_native'
+        self._container_client.create_cluster_sync(PROJECT_ID, cluster_name)
+        body = (self._container_service.projects_fake.zones_fake.clusters_fake
+                .create_bodies[cluster_name])
+        self.assertTrue(body['cluster']['ipAllocationPolicy']['useIpAliases'])
+
+    @mock.patch.object(container, '_CLUSTER_CREATION_TIMEOUT', 0)
+    def test_create_cluster_timeout(self):
+        with self.assertRaisesRegex(container.ContainerCreationError,
+                                    'did not finish in 0 seconds'):
+            self._container_client.create_cluster_sync(PROJECT_ID,
+                                                       'second_timeout')
+
+    def test_create_cluster_cancelled(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaisesRegex(container.ContainerCreationError,
+                                    'Cancelled'):
+            self._container_client.create_cluster_sync(
+                PROJECT_ID, 'second_cancelled', cancel_event=cancel_event)
+
     def test_create_cluster_fail(self):
         cluster_name = 'fail'
         with self.assertRaises(container.ContainerCreationError):
@@ -171,3 +224,597 @@ class ContainerClientTestCase(absltest.TestCase):
         with self.assertRaises(container.ClusterGetInfoError):
             self._container_client.create_kubernetes_configuration(
                 mock_credentials, PROJECT_ID, cluster_name)
+
+    def test_create_kubernetes_configuration_cached(self):
+        mock_credentials = mock.Mock(token='fake_token')
+        clusters_fake = (
+            self._container_service.projects_fake.zones_fake.clusters_fake)
+        with mock.patch.object(
+                clusters_fake, 'get', wraps=clusters_fake.get) as mock_get:
+            kube_config = (
+                self._container_client.create_kubernetes_configuration(
+                    mock_credentials, PROJECT_ID, CLUSTER_NAME))
+            self.assertIs(
+                self._container_client.create_kubernetes_configuration(
+                    mock_credentials, PROJECT_ID, CLUSTER_NAME), kube_config)
+            self.assertEqual(mock_get.call_count, 1)
+            other_kube_config = (
+                self._container_client.create_kubernetes_configuration(
+                    mock_credentials, PROJECT_ID, 'other_cluster'))
+            self.assertIsNot(other_kube_config, kube_config)
+        self.assertIs(
+            self._container_client._get_api_client(kube_config),
+            self._container_client._get_api_client(kube_config))
+        self.assertIsNot(
+            self._container_client._get_api_client(kube_config),
+            self._container_client._get_api_client(other_kube_config))
+
+    def test_kubernetes_configuration_refreshes_token(self):
+        mock_credentials = mock.Mock(token='fake_token', valid=True)
+        kube_config = self._container_client.create_kubernetes_configuration(
+            mock_credentials, PROJECT_ID, CLUSTER_NAME)
+        self.assertEqual(kube_config.get_api_key_with_prefix('authorization'),
+                         'Bearer fake_token')
+
+        def refresh(request):
+            del request
+            mock_credentials.token = 'new_token'
+            mock_credentials.valid = True
+
+        mock_credentials.valid = False
+        mock_credentials.refresh.side_effect = refresh
+        self.assertEqual(kube_config.get_api_key_with_prefix('authorization'),
+                         'Bearer new_token')
+        mock_credentials.refresh.assert_called_once_with(mock.ANY)
+
+    def test_push_docker_image_returns_digest(self):
+        self._container_client._docker_client = mock.Mock()
+        self._container_client._docker_client.api.push.return_value = iter([
+            {'status': 'Pushing', 'id': 'a',
+             'progressDetail': {'current': 10, 'total': 20}},
+            {'status': 'Pushing', 'id': 'b',
+             'progressDetail': {'current': 5, 'total': 40}},
+            {'status': 'Pushed', 'id': 'a', 'progressDetail': {}},
+            {'status': 'Layer already exists', 'id': 'c',
+             'progressDetail': {}},
+            {'status': 'latest: digest: sha256:1234 size: 2000'},
+            {'aux': {'Tag': 'latest', 'Digest': 'sha256:1234'}},
+        ])
+        progress = []
+        digest = self._container_client.push_docker_image(
+            'gcr.io/p/image',
+            progress_callback=lambda done, total: progress.append(
+                (done, total)))
+        self.assertEqual(digest, 'sha256:1234')
+        self.assertEqual(progress, [(10, 20), (15, 60), (25, 60)])
+
+    def test_push_docker_image_error(self):
+        self._container_client._docker_client = mock.Mock()
+        self._container_client._docker_client.api.push.return_value = iter([
+            {'status': 'Pushing'},
+            {'error': 'denied: Permission denied'},
+        ])
+        with self.assertRaises(container.ImagePushError):
+            self._container_client.push_docker_image('gcr.io/p/image')
+
+    def test_build_docker_image_cache_from(self):
+        self._container_client._docker_client = mock.Mock()
+        api = self._container_client._docker_client.api
+        api.pull.return_value = iter([
+            {'status': 'Downloading', 'id': 'a',
+             'progressDetail': {'current': 10, 'total': 10}},
+        ])
+        api.build.return_value = iter([{'stream': 'Step 1/1 : FROM python'}])
+        progress = []
+        self._container_client.build_docker_image(
+            'gcr.io/p/image',
+            tempfile.mkdtemp(),
+            cache_from=['gcr.io/p/image'],
+            progress_callback=lambda done, total: progress.append(
+                (done, total)))
+        api.pull.assert_called_once_with(
+            'gcr.io/p/image', tag='latest', stream=True, decode=True)
+        self.assertEqual(api.build.call_args[1]['cache_from'],
+                         ['gcr.io/p/image'])
+        self.assertEqual(progress, [(10, 10)])
+
+    def test_build_docker_image_missing_cache_image(self):
+        self._container_client._docker_client = mock.Mock()
+        api = self._container_client._docker_client.api
+        api.pull.side_effect = docker.errors.NotFound('')
+        api.build.return_value = iter([])
+        self._container_client.build_docker_image(
+            'gcr.io/p/image',
+            tempfile.mkdtemp(),
+            cache_from=['gcr.io/p/image'])
+        self.assertIsNone(api.build.call_args[1]['cache_from'])
+
+    def test_build_docker_image_error(self):
+        self._container_client._docker_client = mock.Mock()
+        api = self._container_client._docker_client.api
+        api.build.return_value = iter([{'error': 'COPY failed'}])
+        with self.assertRaises(container.ImageBuildError):
+            self._container_client.build_docker_image(
+                'gcr.io/p/image', tempfile.mkdtemp())
+
+    def test_get_remote_image_digest_missing(self):
+        self._container_client._docker_client = mock.Mock()
+        images = self._container_client._docker_client.images
+        images.get_registry_data.side_effect = docker.errors.NotFound('')
+        self.assertIsNone(
+            self._container_client.get_remote_image_digest('gcr.io/p/image'))
+
+
+def _deployment(generation=2, observed_generation=2, replicas=2,
+                updated_replicas=2, available_replicas=2, ready_replicas=None,
+                conditions=None, resource_version='2'):
+    return kubernetes.client.ExtensionsV1beta1Deployment(
+        metadata=kubernetes.client.V1ObjectMeta(
+            generation=generation, resource_version=resource_version),
+        spec=kubernetes.client.ExtensionsV1beta1DeploymentSpec(
+            replicas=replicas,
+            template=kubernetes.client.V1PodTemplateSpec()),
+        status=kubernetes.client.ExtensionsV1beta1DeploymentStatus(
+            observed_generation=observed_generation,
+            replicas=replicas,
+            updated_replicas=updated_replicas,
+            available_replicas=available_replicas,
+            ready_replicas=ready_replicas,
+            conditions=conditions))
+
+
+def _object_list(items, resource_version='1'):
+    return mock.Mock(
+        items=items,
+        metadata=kubernetes.client.V1ListMeta(
+            resource_version=resource_version))
+
+
+def _event(event_type, obj):
+    return {'type': event_type, 'object': obj, 'raw_object': {}}
+
+
+class WatchFake(object):
+    """Fake of kubernetes.watch.Watch.
+
+    Each call to stream yields the next list of events.
+    """
+
+    def __init__(self, streams):
+        self._streams = list(streams)
+        self.resource_version = None
+        self.stream_kwargs = []
+
+    def stream(self, func, **kwargs):
+        self.stream_kwargs.append(kwargs)
+        for event in self._streams.pop(0):
+            if event['type'] != 'ERROR':
+                self.resource_version = (
+                    event['object'].metadata.resource_version)
+            yield event
+
+
+@mock.patch('kubernetes.client.ExtensionsV1beta1Api')
+class DeploymentTest(absltest.TestCase):
+    """Test case for updating deployments with container.ContainerClient."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient._create_docker_client')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self._container_client = container.ContainerClient(
+            ContainerServiceFake(), mock.Mock())
+        self._deployment_data = {
+            'metadata': {'name': 'app'},
+            'spec': {
+                'replicas': 2,
+                'template': {'spec': {'containers': []}}
+            },
+        }
+
+    def _watch(self, *streams):
+        watch = WatchFake(streams)
+        patcher = mock.patch('kubernetes.watch.Watch', return_value=watch)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        return watch
+
+    def test_update_deployment_patches_once(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.patch_namespaced_deployment.return_value = _deployment(
+            generation=3)
+        generation = self._container_client.update_deployment(
+            self._deployment_data)
+        self.assertEqual(generation, 3)
+        api.patch_namespaced_deployment.assert_called_once_with(
+            name='app', namespace='default', body=self._deployment_data)
+        self.assertEqual(self._deployment_data['spec']['replicas'], 2)
+        self.assertNotIn('metadata', self._deployment_data['spec']['template'])
+
+    def test_update_deployment_restart(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.patch_namespaced_deployment.return_value = _deployment()
+        self._container_client.update_deployment(
+            self._deployment_data, restart=True)
+        body = api.patch_namespaced_deployment.call_args[1]['body']
+        self.assertIn(
+            'kubectl.kubernetes.io/restartedAt',
+            body['spec']['template']['metadata']['annotations'])
+
+    def test_wait_for_deployment_rollout(self, mock_api_class):
+        api = mock_api_class.return_value
+        # The deployment controller did not see the update yet.
+        api.list_namespaced_deployment.return_value = _object_list(
+            [_deployment(generation=3, observed_generation=2)])
+        watch = self._watch([
+            # A new pod was created next to the old ones.
+            _event('MODIFIED',
+                   _deployment(generation=3, observed_generation=3,
+                               updated_replicas=1, available_replicas=2)),
+            # All pods were replaced but the last one is not available yet.
+            _event('MODIFIED',
+                   _deployment(generation=3, observed_generation=3,
+                               available_replicas=1)),
+            _event('MODIFIED',
+                   _deployment(generation=3, observed_generation=3)),
+        ])
+        self._container_client.wait_for_deployment_rollout('app', 3)
+        api.list_namespaced_deployment.assert_called_once_with(
+            namespace='default', field_selector='metadata.name=app')
+        self.assertEqual(len(watch.stream_kwargs), 1)
+        self.assertEqual(watch.stream_kwargs[0]['resource_version'], '1')
+        self.assertEqual(watch.stream_kwargs[0]['field_selector'],
+                         'metadata.name=app')
+
+    def test_wait_for_deployment_rollout_old_pods_left(self, mock_api_class):
+        api = mock_api_class.return_value
+        old_pods_left = _deployment()
+        old_pods_left.status.replicas = 3
+        api.list_namespaced_deployment.return_value = _object_list(
+            [old_pods_left])
+        watch = self._watch([_event('MODIFIED', _deployment())])
+        self._container_client.wait_for_deployment_rollout('app', 2)
+        self.assertEqual(len(watch.stream_kwargs), 1)
+
+    def test_wait_for_deployment_rollout_already_done(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.list_namespaced_deployment.return_value = _object_list(
+            [_deployment()])
+        watch = self._watch()
+        self._container_client.wait_for_deployment_rollout('app', 2)
+        self.assertEqual(watch.stream_kwargs, [])
+
+    def test_wait_for_deployment_rollout_deadline_exceeded(
+            self, mock_api_class):
+        api = mock_api_class.return_value
+        condition = kubernetes.client.ExtensionsV1beta1DeploymentCondition(
+            type='Progressing',
+            status='False',
+            reason='ProgressDeadlineExceeded',
+            message='ReplicaSet "app-1234" has timed out progressing.')
+        api.list_namespaced_deployment.return_value = _object_list(
+            [_deployment(updated_replicas=1, conditions=[condition])])
+        with self.assertRaisesRegex(container.DeploymentRolloutError,
+                                    'timed out progressing'):
+            self._container_client.wait_for_deployment_rollout('app', 2)
+
+    def test_wait_for_deployment_rollout_timeout(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.list_namespaced_deployment.return_value = _object_list(
+            [_deployment(updated_replicas=1)])
+        with self.assertRaises(container.DeploymentRolloutError):
+            self._container_client.wait_for_deployment_rollout(
+                'app', 2, timeout=0)
+
+    def test_watch_expired_lists_again(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.list_namespaced_deployment.side_effect = [
+            _object_list([_deployment(updated_replicas=1)]),
+            _object_list([_deployment()], resource_version='5'),
+        ]
+        watch = self._watch([{
+            'type': 'ERROR',
+            'object': None,
+            'raw_object': {'code': 410, 'message': 'too old'},
+        }])
+        self._container_client.wait_for_deployment_rollout('app', 2)
+        self.assertEqual(api.list_namespaced_deployment.call_count, 2)
+        self.assertEqual(len(watch.stream_kwargs), 1)
+
+    def test_watch_resumes_from_last_version(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.list_namespaced_deployment.return_value = _object_list(
+            [_deployment(updated_replicas=1)])
+        watch = self._watch(
+            [_event('MODIFIED',
+                    _deployment(updated_replicas=1, resource_version='7'))],
+            [_event('MODIFIED', _deployment())])
+        self._container_client.wait_for_deployment_rollout('app', 2)
+        self.assertEqual(
+            [kwargs['resource_version'] for kwargs in watch.stream_kwargs],
+            ['1', '7'])
+
+    def test_wait_for_deployment_ready(self, mock_api_class):
+        api = mock_api_class.return_value
+        api.list_namespaced_deployment.return_value = _object_list([])
+        watch = self._watch([
+            _event('ADDED', _deployment()),
+            _event('MODIFIED', _deployment(ready_replicas=1)),
+        ])
+        self.assertEqual(
+            self._container_client.wait_for_deployment_ready(
+                'app=mysite', namespace='mysite'), 1)
+        self.assertEqual(watch.stream_kwargs[0]['label_selector'],
+                         'app=mysite')
+        self.assertEqual(watch.stream_kwargs[0]['namespace'], 'mysite')
+
+    @mock.patch('kubernetes.client.CoreV1Api')
+    def test_wait_for_service_ingress(self, mock_core_api_class, _):
+        api = mock_core_api_class.return_value
+        service = kubernetes.client.V1Service(
+            metadata=kubernetes.client.V1ObjectMeta(resource_version='2'),
+            status=kubernetes.client.V1ServiceStatus(
+                load_balancer=kubernetes.client.V1LoadBalancerStatus(
+                    ingress=[
+                        kubernetes.client.V1LoadBalancerIngress(
+                            ip='1.2.3.4')
+                    ])))
+        api.list_namespaced_service.return_value = _object_list([])
+        self._watch([_event('MODIFIED', service)])
+        self.assertEqual(
+            self._container_client.wait_for_service_ingress('app=mysite'),
+            '1.2.3.4')
+
+
+SERVICE_MANIFEST = {
+    'apiVersion': 'v1',
+    'kind': 'Service',
+    'metadata': {'name': 'app'},
+    'spec': {
+        'type': 'LoadBalancer',
+        'ports': [{'port': 80, 'targetPort': 8080}],
+        'selector': {'app': 'app'},
+    },
+}
+
+LIVE_SERVICE = kubernetes.client.V1Service(
+    api_version='v1',
+    kind='Service',
+    metadata=kubernetes.client.V1ObjectMeta(
+        name='app', resource_version='5', uid='1234'),
+    spec=kubernetes.client.V1ServiceSpec(
+        type='LoadBalancer',
+        cluster_ip='10.0.0.1',
+        ports=[
+            kubernetes.client.V1ServicePort(
+                port=80, target_port=8080, protocol='TCP', node_port=31000)
+        ],
+        selector={'app': 'app'}))
+
+SECRET_MANIFEST = {
+    'apiVersion': 'v1',
+    'kind': 'Secret',
+    'metadata': {'name': 'cloudsql'},
+    'data': {'password': 'cGFzc3dvcmQ='},
+}
+
+DEPLOYMENT_MANIFEST = {
+    'apiVersion': 'extensions/v1beta1',
+    'kind': 'Deployment',
+    'metadata': {'name': 'app'},
+    'spec': {
+        'replicas': 1,
+        'template': {
+            'spec': {
+                'containers': [{'name': 'app', 'image': 'gcr.io/p/app'}],
+                'volumes': [{'name': 'cloudsql', 'emptyDir': None}],
+            }
+        }
+    },
+}
+
+
+def _not_found(*args, **kwargs):
+    raise kubernetes.client.rest.ApiException(status=404, reason='Not Found')
+
+
+@mock.patch('kubernetes.client.ExtensionsV1beta1Api')
+@mock.patch('kubernetes.client.CoreV1Api')
+class ApplyManifestsTest(absltest.TestCase):
+    """Test case for container.ContainerClient.apply_manifests."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient._create_docker_client')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self._container_client = container.ContainerClient(
+            ContainerServiceFake(), mock.Mock())
+
+    def test_create_missing_objects(self, mock_core_api_class,
+                                    mock_extensions_api_class):
+        core_api = mock_core_api_class.return_value
+        extensions_api = mock_extensions_api_class.return_value
+        core_api.read_namespaced_service.side_effect = _not_found
+        core_api.read_namespaced_secret.side_effect = _not_found
+        extensions_api.read_namespaced_deployment.side_effect = _not_found
+        results = self._container_client.apply_manifests(
+            [SERVICE_MANIFEST, DEPLOYMENT_MANIFEST, SECRET_MANIFEST])
+        self.assertEqual(
+            results, {
+                'Service/app': 'created',
+                'Deployment/app': 'created',
+                'Secret/cloudsql': 'created',
+            })
+        core_api.create_namespaced_service.assert_called_once_with(
+            namespace='default', body=SERVICE_MANIFEST)
+        core_api.create_namespaced_secret.assert_called_once_with(
+            namespace='default', body=SECRET_MANIFEST)
+        extensions_api.create_namespaced_deployment.assert_called_once_with(
+            namespace='default', body=DEPLOYMENT_MANIFEST)
+
+    def test_secrets_applied_first(self, mock_core_api_class,
+                                   mock_extensions_api_class):
+        calls = []
+        core_api = mock_core_api_class.return_value
+        extensions_api = mock_extensions_api_class.return_value
+        core_api.read_namespaced_secret.side_effect = _not_found
+        core_api.create_namespaced_secret.side_effect = (
+            lambda **kwargs: calls.append('secret'))
+        extensions_api.read_namespaced_deployment.side_effect = _not_found
+        extensions_api.create_namespaced_deployment.side_effect = (
+            lambda **kwargs: calls.append('deployment'))
+        self._container_client.apply_manifests(
+            [DEPLOYMENT_MANIFEST, SECRET_MANIFEST])
+        self.assertEqual(calls, ['secret', 'deployment'])
+
+    def test_unchanged_object(self, mock_core_api_class, _):
+        core_api = mock_core_api_class.return_value
+        core_api.read_namespaced_service.return_value = LIVE_SERVICE
+        results = self._container_client.apply_manifests([SERVICE_MANIFEST])
+        self.assertEqual(results, {'Service/app': 'unchanged'})
+        core_api.create_namespaced_service.assert_not_called()
+        core_api.patch_namespaced_service.assert_not_called()
+
+    def test_null_fields_match_defaults(self, _, mock_extensions_api_class):
+        extensions_api = mock_extensions_api_class.return_value
+        live = json.loads(json.dumps(DEPLOYMENT_MANIFEST))
+        live['spec']['template']['spec']['volumes'][0]['emptyDir'] = {}
+        live['status'] = {'replicas': 1}
+        extensions_api.read_namespaced_deployment.return_value = live
+        results = self._container_client.apply_manifests(
+            [DEPLOYMENT_MANIFEST])
+        self.assertEqual(results, {'Deployment/app': 'unchanged'})
+
+    def test_changed_object(self, mock_core_api_class, _):
+        core_api = mock_core_api_class.return_value
+        core_api.read_namespaced_service.return_value = LIVE_SERVICE
+        manifest = json.loads(json.dumps(SERVICE_MANIFEST))
+        manifest['spec']['ports'][0]['targetPort'] = 8000
+        results = self._container_client.apply_manifests([manifest])
+        self.assertEqual(results, {'Service/app': 'configured'})
+        core_api.patch_namespaced_service.assert_called_once_with(
+            name='app', namespace='default', body=manifest)
+
+    def test_unsupported_kind(self, mock_core_api_class, _):
+        with self.assertRaises(container.ManifestApplyError):
+            self._container_client.apply_manifests([{
+                'apiVersion': 'v1',
+                'kind': 'Pod',
+                'metadata': {'name': 'app'}
+            }])
+        mock_core_api_class.assert_not_called()
+
+    def test_api_error(self, mock_core_api_class, _):
+        core_api = mock_core_api_class.return_value
+        core_api.read_namespaced_service.side_effect = _not_found
+        core_api.create_namespaced_service.side_effect = (
+            kubernetes.client.rest.ApiException(
+                status=422, reason='Unprocessable Entity'))
+        with self.assertRaisesRegex(container.ManifestApplyError,
+                                    'Unprocessable Entity'):
+            self._container_client.apply_manifests([SERVICE_MANIFEST])
+
+
+class BuildContextTest(absltest.TestCase):
+    """Test case for container.BuildContext."""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._write('Dockerfile', 'FROM python')
+        self._write('.dockerignore', '# Comment\n*.pyc\nstatic\n')
+        self._write('manage.py', 'print()')
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self._directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _fingerprint(self, ignore_patterns=None):
+        return container.ContainerClient.get_build_context_fingerprint(
+            self._directory, ignore_patterns)
+
+    def test_stable(self):
+        self.assertEqual(self._fingerprint(), self._fingerprint())
+
+    def test_content_change(self):
+        fingerprint = self._fingerprint()
+        self._write('manage.py', 'print(1)')
+        self.assertNotEqual(fingerprint, self._fingerprint())
+
+    def test_new_file(self):
+        fingerprint = self._fingerprint()
+        self._write('app/models.py', '')
+        self.assertNotEqual(fingerprint, self._fingerprint())
+
+    def test_ignored_files(self):
+        fingerprint = self._fingerprint()
+        self._write('manage.pyc', 'bytecode')
+        self._write('static/style.css', 'body {}')
+        self._write('.config.yaml', 'image_digest: sha256:1234')
+        self.assertEqual(fingerprint, self._fingerprint(['.config.yaml']))
+
+    def _read_archive(self, context):
+        progress = []
+        data = b''.join(
+            context.stream(lambda done, total: progress.append((done, total))))
+        self.assertEqual(len(data), context.size)
+        self.assertEqual(progress[0], (0, context.size))
+        self.assertEqual(progress[-1], (context.size, context.size))
+        archive = tarfile.open(fileobj=io.BytesIO(data))
+        return {member.name: member for member in archive.getmembers()
+               }, archive
+
+    def test_stream(self):
+        self._write('app/views.py', 'def index(): pass')
+        self._write('static/style.css', 'body {}')
+        context = container.BuildContext(self._directory)
+        members, archive = self._read_archive(context)
+        self.assertCountEqual(
+            members,
+            ['.dockerignore', 'Dockerfile', 'manage.py', 'app', 'app/views.py'])
+        self.assertEqual(
+            archive.extractfile(members['app/views.py']).read(),
+            b'def index(): pass')
+        self.assertEqual(context.file_count, 4)
+
+    def test_default_ignore_patterns(self):
+        self._write('.git/HEAD', 'ref: refs/heads/master')
+        self._write('app/__pycache__/views.cpython-36.pyc', 'bytecode')
+        self._write('venv/pyvenv.cfg', 'home = /usr/bin')
+        self._write('venv/lib/site.py', '')
+        members, _ = self._read_archive(container.BuildContext(self._directory))
+        self.assertCountEqual(members,
+                              ['.dockerignore', 'Dockerfile', 'manage.py',
+                               'app'])
+
+    def test_identical_files_keep_their_mode(self):
+        self._write('app/__init__.py', 'same content')
+        self._write('bin/run.sh', 'same content')
+        os.chmod(os.path.join(self._directory, 'bin/run.sh'), 0o755)
+        members, archive = self._read_archive(
+            container.BuildContext(self._directory))
+        self.assertTrue(members['app/__init__.py'].isfile())
+        self.assertTrue(members['bin/run.sh'].isfile())
+        self.assertEqual(members['app/__init__.py'].mode & 0o111, 0)
+        self.assertEqual(members['bin/run.sh'].mode & 0o777, 0o755)
+        self.assertEqual(
+            archive.extractfile(members['bin/run.sh']).read(), b'same content')
+
+    def _assert_stream_fails_after_change(self, new_content):
+        context = container.BuildContext(self._directory)
+        self._write('manage.py', new_content)
+        with self.assertRaisesRegex(container.ImageBuildError, 'manage.py'):
+            b''.join(context.stream())
+
+    def test_file_grew_while_streaming(self):
+        self._assert_stream_fails_after_change('print("more")')
+
+    def test_file_shrunk_while_streaming(self):
+        self._assert_stream_fails_after_change('')
+
+    def test_file_changed_while_streaming(self):
+        # Same size, different content.
+        self._assert_stream_fails_after_change('input()')
@@ -0,0 +1,192 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.database module."""
+
+import signal
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+import pexpect
+
+from django_cloud_deploy.cloudlib import database
+from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
+
+PROJECT_ID = 'fake-project-id'
+INSTANCE_NAME = 'fake-instance'
+
+
+class CloudSqlProxyManagerTest(absltest.TestCase):
+    """Test case for database._CloudSqlProxyManager."""
+
+    def setUp(self):
+        self._manager = database._CloudSqlProxyManager()
+        patcher = mock.patch(
+            'django_cloud_deploy.cloudlib.database.popen_spawn.PopenSpawn')
+        self._popen_spawn = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nested_sessions_share_proxy(self):
+        with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+            with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+                pass
+            process = self._popen_spawn.return_value
+            process.kill.assert_not_called()
+        self.assertEqual(self._popen_spawn.call_count, 1)
+        process.kill.assert_called_once_with(signal.SIGTERM)
+
+    def test_sequential_sessions_restart_proxy(self):
+        with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+            pass
+        with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+            pass
+        self.assertEqual(self._popen_spawn.call_count, 2)
+
+    def test_different_ports_use_different_proxies(self):
+        with self._manager.session(
+                PROJECT_ID, INSTANCE_NAME, 'proxy', port=5432):
+            with self._manager.session(
+                    PROJECT_ID, INSTANCE_NAME, 'proxy', port=5433):
+                pass
+        self.assertEqual(self._popen_spawn.call_count, 2)
+
+    def test_session_ends_on_exception(self):
+        with self.assertRaises(ValueError):
+            with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+                raise ValueError()
+        self._popen_spawn.return_value.kill.assert_called_once_with(
+            signal.SIGTERM)
+
+    def test_proxy_fails_to_start(self):
+        process = self._popen_spawn.return_value
+        process.expect.side_effect = pexpect.exceptions.TIMEOUT('timeout')
+        with self.assertRaises(database.DatabaseError):
+            with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+                pass
+        process.kill.assert_called_once_with(signal.SIGTERM)
+
+        # A failed start does not leave a broken proxy behind.
+        process.expect.side_effect = None
+        with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+            pass
+        self.assertEqual(self._popen_spawn.call_count, 2)
+
+    def _block_start(self, blocked_port):
+        """Make starting the proxy of a port wait until the event is set."""
+        starting = threading.Event()
+        release = threading.Event()
+        start = self._manager._start
+
+        def blocking_start(project_id, instance_name, cloud_sql_proxy_path,
+                           region, port):
+            if port == blocked_port:
+                starting.set()
+                release.wait(5)
+            return start(project_id, instance_name, cloud_sql_proxy_path,
+                         region, port)
+
+        patcher = mock.patch.object(
+            self._manager, '_start', side_effect=blocking_start)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(release.set)
+        return starting, release
+
+    def _session_in_thread(self, port, end=None):
+        """Run a session in a new thread, until the end event is set."""
+
+        def session():
+            with self._manager.session(
+                    PROJECT_ID, INSTANCE_NAME, 'proxy', port=port):
+                if end:
+                    end.wait(5)
+
+        thread = threading.Thread(target=session)
+        thread.start()
+        return thread
+
+    def test_other_proxies_start_while_one_is_starting(self):
+        starting, release = self._block_start(5432)
+        slow_session = self._session_in_thread(5432)
+        self.assertTrue(starting.wait(5))
+
+        other_session = self._session_in_thread(5433)
+        other_session.join(5)
+        self.assertFalse(other_session.is_alive())
+        self.assertTrue(slow_session.is_alive())
+
+        release.set()
+        slow_session.join(5)
+        self.assertFalse(slow_session.is_alive())
+
+    def test_sessions_wait_for_proxy_being_started(self):
+        starting, release = self._block_start(5432)
+        end = threading.Event()
+        self.addCleanup(end.set)
+        first_session = self._session_in_thread(5432, end)
+        self.assertTrue(starting.wait(5))
+        second_session = self._session_in_thread(5432)
+        # The second session waits for the proxy being started.
+        second_session.join(0.1)
+        self.assertTrue(second_session.is_alive())
+
+        release.set()
+        second_session.join(5)
+        self.assertFalse(second_session.is_alive())
+        self.assertEqual(self._popen_spawn.call_count, 1)
+        end.set()
+        first_session.join(5)
+
+    def test_close_all(self):
+        with self._manager.session(PROJECT_ID, INSTANCE_NAME, 'proxy'):
+            self._manager.close_all()
+            self._popen_spawn.return_value.kill.assert_called_once_with(
+                signal.SIGTERM)
+
+
+class SqlAdminFake(object):
+    """A fake of the Cloud SQL Admin API whose operations never finish."""
+
+    def instances(self):
+        return self
+
+    def operations(self):
+        return self
+
+    def insert(self, project, body):
+        return http_fake.HttpRequestFake({
+            'name': 'operation-1234',
+            'status': 'PENDING'
+        })
+
+    def get(self, project, operation):
+        return http_fake.HttpRequestFake({
+            'name': operation,
+            'status': 'RUNNING'
+        })
+
+
+class DatabaseClientTest(absltest.TestCase):
+    """Test case for database.DatabaseClient."""
+
+    @mock.patch.object(database, '_INSTANCE_CREATION_TIMEOUT', 0)
+    def test_create_instance_timeout(self):
+        client = database.DatabaseClient(SqlAdminFake())
+        with self.assertRaisesRegex(database.DatabaseError,
+                                    'did not finish in 0 seconds'):
+            client.create_instance_sync(PROJECT_ID, INSTANCE_NAME)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,128 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.discovery_client module."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from absl.testing import absltest
+import google.auth.credentials
+
+from django_cloud_deploy.cloudlib import discovery_client
+
+URL = 'https://www.googleapis.com/discovery/v1/apis/storage/v1/rest'
+DOCUMENT = '{"name": "storage"}'
+
+
+_discovery_cache_dir = None
+_discovery_cache_patcher = None
+
+
+def setUpModule():
+    # Keep discovery documents fetched by the tests out of the user cache
+    # directory.
+    global _discovery_cache_dir, _discovery_cache_patcher
+    _discovery_cache_dir = tempfile.mkdtemp()
+    _discovery_cache_patcher = mock.patch.object(
+        discovery_client, '_discovery_cache',
+        discovery_client.DiscoveryCache(_discovery_cache_dir))
+    _discovery_cache_patcher.start()
+
+
+def tearDownModule():
+    _discovery_cache_patcher.stop()
+    shutil.rmtree(_discovery_cache_dir)
+
+
+class DiscoveryCacheTest(absltest.TestCase):
+    """Test case for discovery_client.DiscoveryCache."""
+
+    def setUp(self):
+        self._cache_dir = tempfile.mkdtemp()
+        self._cache = discovery_client.DiscoveryCache(self._cache_dir, ttl=60)
+
+    def test_get_missing(self):
+        self.assertIsNone(self._cache.get(URL))
+
+    def test_set_and_get(self):
+        self._cache.set(URL, DOCUMENT)
+        self.assertEqual(self._cache.get(URL), DOCUMENT)
+
+    def test_shared_on_disk(self):
+        self._cache.set(URL, DOCUMENT.encode('utf-8'))
+        other_cache = discovery_client.DiscoveryCache(self._cache_dir, ttl=60)
+        self.assertEqual(other_cache.get(URL), DOCUMENT)
+
+    def test_expired(self):
+        self._cache.set(URL, DOCUMENT)
+        for name in os.listdir(self._cache_dir):
+            path = os.path.join(self._cache_dir, name)
+            old = time.time() - 120
+            os.utime(path, (old, old))
+        other_cache = discovery_client.DiscoveryCache(self._cache_dir, ttl=60)
+        self.assertIsNone(other_cache.get(URL))
+
+    def test_keyed_by_library_version(self):
+        self._cache.set(URL, DOCUMENT)
+        with mock.patch.object(
+                discovery_client, '_client_library_version',
+                return_value='0.0.0'):
+            other_cache = discovery_client.DiscoveryCache(
+                self._cache_dir, ttl=60)
+            self.assertIsNone(other_cache.get(URL))
+
+    def test_unwritable_directory(self):
+        cache_file = os.path.join(self._cache_dir, 'file')
+        open(cache_file, 'w').close()
+        cache = discovery_client.DiscoveryCache(cache_file, ttl=60)
+        cache.set(URL, DOCUMENT)
+        self.assertEqual(cache.get(URL), DOCUMENT)
+
+
+class BuildTest(absltest.TestCase):
+    """Test case for discovery_client.build."""
+
+    def test_transport_per_thread(self):
+        creds = mock.Mock(spec=google.auth.credentials.Credentials)
+        transport = discovery_client._ThreadLocalTransport(creds)
+        transports = []
+        thread = threading.Thread(
+            target=lambda: transports.append(transport.get()))
+        thread.start()
+        thread.join()
+        self.assertIs(transport.get(), transport.get())
+        self.assertIsNot(transport.get(), transports[0])
+        self.assertIs(transport.get().credentials, creds)
+
+    def test_requests_use_transport_of_thread(self):
+        creds = mock.Mock(spec=google.auth.credentials.Credentials,
+                          universe_domain='googleapis.com')
+        service = discovery_client.build('storage', 'v1', creds)
+        requests = []
+        thread = threading.Thread(target=lambda: requests.append(
+            service.buckets().get(bucket='fake-bucket')))
+        thread.start()
+        thread.join()
+        request = service.buckets().get(bucket='fake-bucket')
+        self.assertIs(request.http,
+                      service.buckets().get(bucket='fake-bucket').http)
+        self.assertIsNot(request.http, requests[0].http)
+        self.assertIs(request.http.credentials, creds)
+
+if __name__ == '__main__':
+    absltest.main()
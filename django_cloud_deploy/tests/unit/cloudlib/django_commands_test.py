@@ -0,0 +1,73 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.django_commands module."""
+
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import django_commands
+
+
+class CallCommandTest(absltest.TestCase):
+    """Test case for django_commands.call_command."""
+
+    @mock.patch('django.core.management.call_command')
+    def test_call_command(self, mock_call_command):
+        mock_call_command.return_value = 'output'
+        self.assertEqual(
+            django_commands.call_command('migrate', verbosity=0), 'output')
+        mock_call_command.assert_called_once_with('migrate', verbosity=0)
+
+    @mock.patch('django.core.management.call_command')
+    def test_commands_run_one_at_a_time(self, mock_call_command):
+        started = threading.Event()
+        release = threading.Event()
+        running = []
+        overlaps = []
+
+        def call_command(name, **options):
+            if running:
+                overlaps.append(name)
+            running.append(name)
+            started.set()
+            release.wait(5)
+            running.remove(name)
+
+        mock_call_command.side_effect = call_command
+        migrate = threading.Thread(
+            target=django_commands.call_command, args=('migrate',))
+        migrate.start()
+        started.wait(5)
+        collectstatic = threading.Thread(
+            target=django_commands.call_command, args=('collectstatic',))
+        collectstatic.start()
+        # collectstatic waits for migrate instead of running alongside it.
+        collectstatic.join(0.1)
+        self.assertTrue(collectstatic.is_alive())
+        release.set()
+        migrate.join(5)
+        collectstatic.join(5)
+        self.assertEqual(overlaps, [])
+        self.assertEqual(mock_call_command.call_count, 2)
+
+    def test_lock_is_reentrant(self):
+        with django_commands.lock:
+            with mock.patch('django.core.management.call_command'):
+                django_commands.call_command('collectstatic')
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -13,6 +13,8 @@
 # limitations under the License.
 """Tests for the cloudlib.enable_service module."""
 
+from unittest import mock
+
 from absl.testing import absltest
 
 from django_cloud_deploy.cloudlib import enable_service
@@ -21,47 +23,74 @@ from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
 PROJECT_ID = 'fake_project_id'
 SERVICE = 'fake_service'
 
-ENABLED_SERVICE_RESPONSE = {
-    'name': 'projects/{}/services/{}'.format(PROJECT_ID, SERVICE),
-    'state': 'ENABLED'
-}
-
-DISABLED_SERVICE_RESPONSE = {
-    'name': 'projects/{}/services/{}'.format(PROJECT_ID, SERVICE),
-    'state': 'DISABLED'
-}
+OPERATION_NAME = 'operations/cp.7730969938063130608'
 
 
 class ServicesFake(object):
 
-    def __init__(self, query_times=1):
-        self.service_to_get_count = {}
-        self._query_times = query_times
-        self._get_times = 0
+    def __init__(self, already_enabled=None):
+        self.enabled_services = []
+        self.batch_enable_calls = []
+        self._already_enabled = already_enabled or []
 
     def enable(self, name):
-        self.service_to_get_count.setdefault(name, 0)
-        return http_fake.HttpRequestFake(
-            {'name': 'operations/cp.7730969938063130608'})
+        self.enabled_services.append(name)
+        return http_fake.HttpRequestFake({'name': OPERATION_NAME})
+
+    def list(self, parent, filter, pageSize, pageToken=None):
+        del parent, filter, pageSize
+        # Return one service per page to exercise pagination.
+        index = int(pageToken or 0)
+        if index >= len(self._already_enabled):
+            return http_fake.HttpRequestFake({})
+        response = {
+            'services': [{
+                'config': {
+                    'name': self._already_enabled[index]
+                },
+                'state': 'ENABLED'
+            }]
+        }
+        if index + 1 < len(self._already_enabled):
+            response['nextPageToken'] = str(index + 1)
+        return http_fake.HttpRequestFake(response)
+
+    def batchEnable(self, parent, body):
+        del parent
+        self.batch_enable_calls.append(body['serviceIds'])
+        return http_fake.HttpRequestFake({'name': OPERATION_NAME})
+
+
+class OperationsFake(object):
+
+    def __init__(self, query_times=1, error=None):
+        self.operation_to_get_count = {}
+        self._query_times = query_times
+        self._error = error
 
     def get(self, name):
-        self.service_to_get_count[name] = (
-            self.service_to_get_count.get(name, 0) + 1)
-        self._get_times += 1
-        if self._get_times >= self._query_times:
-            return http_fake.HttpRequestFake(ENABLED_SERVICE_RESPONSE)
-        else:
-            return http_fake.HttpRequestFake(DISABLED_SERVICE_RESPONSE)
+        self.operation_to_get_count[name] = (
+            self.operation_to_get_count.get(name, 0) + 1)
+        response = {'name': name}
+        if self._error:
+            response.update({'done': True, 'error': self._error})
+        elif self.operation_to_get_count[name] >= self._query_times:
+            response['done'] = True
+        return http_fake.HttpRequestFake(response)
 
 
 class ServiceUsageFake(object):
 
-    def __init__(self, query_times=1):
-        self.services_fake = ServicesFake(query_times)
+    def __init__(self, query_times=1, error=None, already_enabled=None):
+        self.services_fake = ServicesFake(already_enabled)
+        self.operations_fake = OperationsFake(query_times, error)
 
     def services(self):
         return self.services_fake
 
+    def operations(self):
+        return self.operations_fake
+
 
 class EnableServiceClientTestCase(absltest.TestCase):
     """Test case for project.ProjectClient."""
@@ -72,10 +101,10 @@ class EnableServiceClientTestCase(absltest.TestCase):
         enable_service_client = enable_service.EnableServiceClient(mock_service)
 
         enable_service_client.enable_service_sync(PROJECT_ID, SERVICE)
-        self.assertIn(service_name,
-                      mock_service.services_fake.service_to_get_count)
+        self.assertIn(service_name, mock_service.services_fake.enabled_services)
         self.assertEqual(
-            1, mock_service.services_fake.service_to_get_count[service_name])
+            1,
+            mock_service.operations_fake.operation_to_get_count[OPERATION_NAME])
 
     def test_enable_service_success_at_second_time(self):
         service_name = '/'.join(['projects', PROJECT_ID, 'services', SERVICE])
@@ -83,7 +112,71 @@ class EnableServiceClientTestCase(absltest.TestCase):
         enable_service_client = enable_service.EnableServiceClient(mock_service)
 
         enable_service_client.enable_service_sync(PROJECT_ID, SERVICE)
-        self.assertIn(service_name,
-                      mock_service.services_fake.service_to_get_count)
+        self.assertIn(service_name, mock_service.services_fake.enabled_services)
         self.assertEqual(
-            2, mock_service.services_fake.service_to_get_count[service_name])
+            2,
+            mock_service.operations_fake.operation_to_get_count[OPERATION_NAME])
+
+    def test_enable_service_operation_error(self):
+        mock_service = ServiceUsageFake(error={'message': 'failed'})
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        with self.assertRaises(enable_service.EnableServiceError):
+            enable_service_client.enable_service_sync(PROJECT_ID, SERVICE)
+
+    def test_enable_services_skips_enabled_services(self):
+        mock_service = ServiceUsageFake(
+            already_enabled=['a.googleapis.com', 'b.googleapis.com'])
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        enable_service_client.enable_services_sync(
+            PROJECT_ID,
+            ['a.googleapis.com', 'b.googleapis.com', 'c.googleapis.com'])
+        self.assertEqual(mock_service.services_fake.batch_enable_calls,
+                         [['c.googleapis.com']])
+
+    def test_enable_services_all_enabled(self):
+        mock_service = ServiceUsageFake(already_enabled=['a.googleapis.com'])
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        enable_service_client.enable_services_sync(PROJECT_ID,
+                                                   ['a.googleapis.com'])
+        self.assertEqual(mock_service.services_fake.batch_enable_calls, [])
+        self.assertEqual(mock_service.operations_fake.operation_to_get_count,
+                         {})
+
+    def test_enable_services_in_batches(self):
+        mock_service = ServiceUsageFake()
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+        services = ['{}.googleapis.com'.format(i) for i in range(25)]
+
+        enable_service_client.enable_services_sync(PROJECT_ID, services)
+        self.assertEqual(mock_service.services_fake.batch_enable_calls,
+                         [services[:20], services[20:]])
+
+    def test_enable_services_operation_error(self):
+        mock_service = ServiceUsageFake(error={'message': 'failed'})
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        with self.assertRaises(enable_service.EnableServiceError):
+            enable_service_client.enable_services_sync(PROJECT_ID,
+                                                       ['a.googleapis.com'])
+
+    @mock.patch.object(enable_service, '_ENABLE_SERVICE_TIMEOUT', 0)
+    def test_enable_service_timeout(self):
+        mock_service = ServiceUsageFake(query_times=100)
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        with self.assertRaisesRegex(enable_service.EnableServiceError,
+                                    'did not finish in 0 seconds'):
+            enable_service_client.enable_service_sync(PROJECT_ID, SERVICE)
+
+    @mock.patch.object(enable_service, '_ENABLE_SERVICE_TIMEOUT', 0)
+    def test_enable_services_timeout(self):
+        mock_service = ServiceUsageFake(query_times=100)
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        with self.assertRaisesRegex(enable_service.EnableServiceError,
+                                    'did not finish in 0 seconds'):
+            enable_service_client.enable_services_sync(PROJECT_ID,
+                                                       ['a.googleapis.com'])
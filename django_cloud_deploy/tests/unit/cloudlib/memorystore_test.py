@@ -0,0 +1,185 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.memorystore module."""
+
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+from googleapiclient import errors
+
+from django_cloud_deploy.cloudlib import memorystore
+from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
+
+PROJECT_ID = 'fake-project-id'
+INSTANCE_NAME = 'fake-instance'
+INSTANCE_PATH = ('projects/fake-project-id/locations/us-west1/instances/'
+                 'fake-instance')
+OPERATION_NAME = ('projects/fake-project-id/locations/us-west1/operations/'
+                  'operation-1234')
+READY_STATE = {'state': 'READY', 'host': '10.0.0.3', 'port': 6379}
+
+
+class InstancesFake(object):
+    """A stand-in for the Redis instances of a project.
+
+    Instances become ready after being polled a number of times.
+    """
+
+    def __init__(self, ready_after=1, exists=False):
+        self.create_calls = []
+        self.instances = {}
+        self._ready_after = ready_after
+        self._get_count = 0
+        if exists:
+            self.instances[INSTANCE_PATH] = {'state': 'CREATING'}
+
+    def create(self, parent, instanceId, body):
+        name = '/'.join([parent, 'instances', instanceId])
+        self.create_calls.append((name, body))
+        if name in self.instances:
+            return http_fake.HttpRequestFake(
+                errors.HttpError(http_fake.HttpResponseFake(409),
+                                 b'instance exists'))
+        self.instances[name] = dict(body, state='CREATING')
+        return http_fake.HttpRequestFake({'name': OPERATION_NAME})
+
+    def get(self, name):
+        if name not in self.instances:
+            return http_fake.HttpRequestFake(
+                errors.HttpError(http_fake.HttpResponseFake(404),
+                                 b'not found'))
+        self._get_count += 1
+        if self._get_count >= self._ready_after:
+            self.instances[name].update(READY_STATE)
+        return http_fake.HttpRequestFake(dict(self.instances[name]))
+
+    def mark_ready(self):
+        for instance in self.instances.values():
+            instance.update(READY_STATE)
+
+
+class OperationsFake(object):
+
+    def __init__(self, instances_fake, error=None):
+        self.get_count = 0
+        self._instances_fake = instances_fake
+        self._error = error
+
+    def get(self, name):
+        self.get_count += 1
+        response = {'name': name, 'done': True}
+        if self._error:
+            response['error'] = self._error
+        else:
+            self._instances_fake.mark_ready()
+        return http_fake.HttpRequestFake(response)
+
+
+class RedisFake(object):
+    """A fake of the Cloud Memorystore for Redis API service object."""
+
+    def __init__(self, ready_after=1, exists=False, error=None):
+        self.instances_fake = InstancesFake(ready_after, exists)
+        self.operations_fake = OperationsFake(self.instances_fake, error)
+
+    def projects(self):
+        return self
+
+    def locations(self):
+        return self
+
+    def instances(self):
+        return self.instances_fake
+
+    def operations(self):
+        return self.operations_fake
+
+
+class MemorystoreClientTest(absltest.TestCase):
+    """Test case for memorystore.MemorystoreClient."""
+
+    def setUp(self):
+        patcher = mock.patch('time.sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_instance(self):
+        redis_service = RedisFake(ready_after=10)
+        client = memorystore.MemorystoreClient(redis_service)
+
+        endpoint = client.create_instance_sync(
+            PROJECT_ID, INSTANCE_NAME, memory_size_gb=2)
+        self.assertEqual(endpoint, {'host': '10.0.0.3', 'port': '6379'})
+        self.assertEqual(redis_service.instances_fake.create_calls,
+                         [(INSTANCE_PATH, {
+                             'tier': 'BASIC',
+                             'memorySizeGb': 2,
+                             'redisVersion': 'REDIS_4_0'
+                         })])
+        self.assertEqual(redis_service.operations_fake.get_count, 1)
+
+    def test_reuse_existing_instance(self):
+        redis_service = RedisFake(ready_after=3, exists=True)
+        client = memorystore.MemorystoreClient(redis_service)
+
+        endpoint = client.create_instance_sync(PROJECT_ID, INSTANCE_NAME)
+        self.assertEqual(endpoint, {'host': '10.0.0.3', 'port': '6379'})
+        self.assertEqual(redis_service.operations_fake.get_count, 0)
+
+    @mock.patch.object(memorystore, '_INSTANCE_CREATION_TIMEOUT', 0)
+    def test_create_instance_timeout(self):
+        # Polled once at the deadline, when the instance is not ready yet.
+        client = memorystore.MemorystoreClient(
+            RedisFake(ready_after=3, exists=True))
+
+        with self.assertRaisesRegex(memorystore.MemorystoreError,
+                                    'did not finish in 0 seconds'):
+            client.create_instance_sync(PROJECT_ID, INSTANCE_NAME)
+
+    def test_create_instance_cancelled(self):
+        client = memorystore.MemorystoreClient(RedisFake())
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with self.assertRaisesRegex(memorystore.MemorystoreError, 'Cancelled'):
+            client.create_instance_sync(
+                PROJECT_ID, INSTANCE_NAME, cancel_event=cancel_event)
+
+    def test_operation_error(self):
+        redis_service = RedisFake(error={'message': 'failed'})
+        client = memorystore.MemorystoreClient(redis_service)
+
+        with self.assertRaises(memorystore.MemorystoreError):
+            client.create_instance_sync(PROJECT_ID, INSTANCE_NAME)
+
+    def test_invalid_arguments(self):
+        client = memorystore.MemorystoreClient(RedisFake())
+
+        with self.assertRaises(ValueError):
+            client.create_instance_sync(
+                PROJECT_ID, INSTANCE_NAME, memory_size_gb=0)
+        with self.assertRaises(ValueError):
+            client.create_instance_sync(
+                PROJECT_ID, INSTANCE_NAME, tier='PREMIUM')
+
+    def test_get_missing_instance_endpoint(self):
+        client = memorystore.MemorystoreClient(RedisFake())
+
+        with self.assertRaises(memorystore.MemorystoreError):
+            client.get_instance_endpoint(PROJECT_ID, INSTANCE_NAME)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,106 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.operation module."""
+
+import threading
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import operation
+
+
+class FakeOperation(operation.Operation):
+    """An operation which is done after being polled a number of times."""
+
+    def __init__(self, polls_until_done, error=None):
+        self.poll_count = 0
+
+        def poll():
+            self.poll_count += 1
+            done = self.poll_count >= polls_until_done
+            return {
+                'done': done,
+                'error': error if done else None,
+                'count': self.poll_count
+            }
+
+        super().__init__('fake operation', poll, lambda op: op['done'],
+                         lambda op: op['error'])
+
+
+class OperationWaiterTest(absltest.TestCase):
+    """Test case for operation.OperationWaiter."""
+
+    def setUp(self):
+        self._waiter = operation.OperationWaiter(
+            initial_delay=0.001, max_delay=0.01)
+
+    def test_wait_success(self):
+        op = FakeOperation(polls_until_done=3)
+        response = self._waiter.wait(op)
+        self.assertEqual(response['count'], 3)
+        self.assertEqual(op.poll_count, 3)
+
+    def test_wait_already_done(self):
+        op = FakeOperation(polls_until_done=1)
+        op.response = {'done': True, 'error': None, 'count': 0}
+        self._waiter.wait(op)
+        self.assertEqual(op.poll_count, 0)
+
+    def test_wait_error(self):
+        op = FakeOperation(polls_until_done=2, error={'message': 'failed'})
+        with self.assertRaises(operation.OperationError):
+            self._waiter.wait(op)
+
+    def test_wait_timeout(self):
+        op = FakeOperation(polls_until_done=1000)
+        with self.assertRaises(operation.OperationTimeoutError):
+            self._waiter.wait(op, timeout=0.05)
+
+    def test_wait_polls_at_deadline(self):
+        # The first scheduled poll is long after the deadline. The operation
+        # is still polled once at the deadline, when it is done.
+        waiter = operation.OperationWaiter(initial_delay=10, max_delay=30)
+        op = FakeOperation(polls_until_done=1)
+        response = waiter.wait(op, timeout=0.05)
+        self.assertEqual(response['count'], 1)
+
+    def test_wait_timeout_after_poll_at_deadline(self):
+        waiter = operation.OperationWaiter(initial_delay=10, max_delay=30)
+        op = FakeOperation(polls_until_done=2)
+        with self.assertRaises(operation.OperationTimeoutError):
+            waiter.wait(op, timeout=0.05)
+        self.assertEqual(op.poll_count, 1)
+
+    def test_wait_cancelled(self):
+        op = FakeOperation(polls_until_done=1000)
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaises(operation.OperationCancelledError):
+            self._waiter.wait(op, cancel_event=cancel_event)
+        self.assertEqual(op.poll_count, 0)
+
+    def test_wait_all(self):
+        operations = [
+            FakeOperation(polls_until_done=1),
+            FakeOperation(polls_until_done=5),
+            FakeOperation(polls_until_done=2),
+        ]
+        responses = self._waiter.wait_all(operations)
+        self.assertEqual([r['count'] for r in responses], [1, 5, 2])
+        self.assertEqual([op.poll_count for op in operations], [1, 5, 2])
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -13,8 +13,12 @@
 # limitations under the License.
 """Tests for the cloudlib.static_content_serve module."""
 
+import base64
+import gzip
+import hashlib
 import os
 import tempfile
+from unittest import mock
 
 from absl.testing import absltest
 from django_cloud_deploy.cloudlib import static_content_serve
@@ -48,14 +52,54 @@ class ObjectsFake(object):
 
     def __init__(self):
         self.bucket_files = {}
+        # Number of times inserting an object fails with the given status
+        # before succeeding.
+        self.failures = {}
+        # Objects listed by "list", as a dictionary mapping object names to
+        # base64 encoded MD5 hashes.
+        self.existing_objects = {}
+        self.existing_metadata = {}
+        self.deleted_objects = []
+        # Object resources and uploaded content, keyed by object name.
+        self.bodies = {}
+        self.contents = {}
 
     def insert(self, bucket, body, media_body):
-        del media_body
-        if bucket not in self.bucket_files:
-            self.bucket_files[bucket] = []
-        self.bucket_files[bucket].append(body['name'])
+        self.bodies[body['name']] = body
+        self.contents[body['name']] = media_body.getbytes(0, media_body.size())
+        failure = self.failures.get(body['name'])
+        if failure and failure[1] > 0:
+            failure[1] -= 1
+            return http_fake.HttpRequestFake(
+                errors.HttpError(
+                    http_fake.HttpResponseFake(failure[0]), b'error'))
+        # Objects are inserted from several threads. dict.setdefault is
+        # atomic.
+        self.bucket_files.setdefault(bucket, []).append(body['name'])
         return http_fake.HttpRequestFake(body)
 
+    def list(self, bucket, prefix, fields, pageToken=None):
+        del bucket, fields
+        # Return one object per page to exercise pagination.
+        names = sorted(
+            name for name in self.existing_objects if name.startswith(prefix))
+        index = int(pageToken or 0)
+        if index >= len(names):
+            return http_fake.HttpRequestFake({})
+        name = names[index]
+        item = {'name': name, 'md5Hash': self.existing_objects[name]}
+        if name in self.existing_metadata:
+            item['metadata'] = self.existing_metadata[name]
+        response = {'items': [item]}
+        if index + 1 < len(names):
+            response['nextPageToken'] = str(index + 1)
+        return http_fake.HttpRequestFake(response)
+
+    def delete(self, bucket, object):
+        del bucket
+        self.deleted_objects.append(object)
+        return http_fake.HttpRequestFake({})
+
 
 class BucketsFake(object):
     """A fake object returned by ...buckets()."""
@@ -196,3 +240,182 @@ class StaticContentServeClientTest(absltest.TestCase):
             self.assertIn(
                 file2_gcs_path,
                 self._storage_service_fake.objects().bucket_files[BUCKET_NAME])
+
+    def _create_files(self, directory, count):
+        for i in range(count):
+            with open(os.path.join(directory, 'file{}'.format(i)), 'w') as f:
+                f.write('x' * i)
+
+    def test_upload_static_content_progress(self):
+        progress = []
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 20)
+            stats = self._static_content_serve_client.upload_content(
+                BUCKET_NAME,
+                tmp_dir_root,
+                progress_callback=lambda *args: progress.append(args))
+        self.assertEqual(
+            len(self._storage_service_fake.objects().bucket_files[BUCKET_NAME]),
+            20)
+        self.assertEqual(stats.files, 20)
+        self.assertEqual(stats.total_bytes, sum(range(20)))
+        self.assertEqual([p[0] for p in progress], list(range(1, 21)))
+        self.assertEqual(progress[-1], (20, 20, sum(range(20)), sum(range(20))))
+
+    @mock.patch('time.sleep')
+    def test_upload_static_content_retry(self, unused_mock_sleep):
+        object_name = os.path.join(self._static_content_serve_client.GCS_ROOT,
+                                   'file0')
+        self._storage_service_fake.objects().failures[object_name] = [503, 2]
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 1)
+            self._static_content_serve_client.upload_content(
+                BUCKET_NAME, tmp_dir_root)
+        self.assertEqual(
+            self._storage_service_fake.objects().bucket_files[BUCKET_NAME],
+            [object_name])
+
+    def test_upload_static_content_no_permission(self):
+        object_name = os.path.join(self._static_content_serve_client.GCS_ROOT,
+                                   'file0')
+        self._storage_service_fake.objects().failures[object_name] = [403, 1]
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 1)
+            with self.assertRaises(
+                    static_content_serve.StaticContentServeError):
+                self._static_content_serve_client.upload_content(
+                    BUCKET_NAME, tmp_dir_root)
+
+    def test_sync_static_content(self):
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        unchanged_md5 = base64.b64encode(hashlib.md5(b'x').digest()).decode()
+        objects_fake.existing_objects = {
+            gcs_root + '/file1': unchanged_md5,
+            gcs_root + '/file2': 'outdated',
+            gcs_root + '/stale': 'stale',
+            'other/file': 'other',
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 4)
+            stats = self._static_content_serve_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, delete_stale=True)
+        self.assertCountEqual(objects_fake.bucket_files[BUCKET_NAME], [
+            gcs_root + '/file0', gcs_root + '/file2', gcs_root + '/file3'
+        ])
+        self.assertEqual(objects_fake.deleted_objects, [gcs_root + '/stale'])
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(stats.skipped_files, 1)
+        self.assertEqual(stats.deleted_files, 1)
+
+    def test_sync_static_content_keep_stale(self):
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        objects_fake.existing_objects = {gcs_root + '/stale': 'stale'}
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 1)
+            stats = self._static_content_serve_client.sync_content(
+                BUCKET_NAME, tmp_dir_root)
+        self.assertEqual(objects_fake.deleted_objects, [])
+        self.assertEqual(stats.deleted_files, 0)
+
+    def test_upload_web_assets(self):
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        css = b'body { color: red; }\n' * 100
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            for name, content in (('base.css', css),
+                                  ('base.0123456789ab.css', css),
+                                  ('logo.png', b'png' * 100)):
+                with open(os.path.join(tmp_dir_root, name), 'wb') as f:
+                    f.write(content)
+            self._static_content_serve_client.upload_content(
+                BUCKET_NAME, tmp_dir_root, web_assets=True)
+
+        body = objects_fake.bodies[gcs_root + '/base.css']
+        self.assertEqual(body['contentType'], 'text/css')
+        self.assertEqual(body['contentEncoding'], 'gzip')
+        self.assertEqual(body['cacheControl'], 'public, max-age=3600')
+        self.assertEqual(
+            body['metadata']['sourceMd5'],
+            base64.b64encode(hashlib.md5(css).digest()).decode())
+        self.assertEqual(body['metadata']['uploadFormat'],
+                         static_content_serve._WEB_ASSET_UPLOAD_FORMAT)
+        self.assertEqual(
+            gzip.decompress(objects_fake.contents[gcs_root + '/base.css']),
+            css)
+
+        body = objects_fake.bodies[gcs_root + '/base.0123456789ab.css']
+        self.assertEqual(body['cacheControl'],
+                         'public, max-age=31536000, immutable')
+
+        body = objects_fake.bodies[gcs_root + '/logo.png']
+        self.assertEqual(body['contentType'], 'image/png')
+        self.assertNotIn('contentEncoding', body)
+
+    def test_sync_compressed_web_assets(self):
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        source_md5 = base64.b64encode(hashlib.md5(b'x').digest()).decode()
+        objects_fake.existing_objects = {gcs_root + '/file1': 'gzip_md5'}
+        objects_fake.existing_metadata = {
+            gcs_root + '/file1': {
+                'sourceMd5': source_md5,
+                'uploadFormat': static_content_serve._WEB_ASSET_UPLOAD_FORMAT
+            }
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 2)
+            stats = self._static_content_serve_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, web_assets=True)
+        self.assertEqual(objects_fake.bucket_files[BUCKET_NAME],
+                         [gcs_root + '/file0'])
+        self.assertEqual(stats.skipped_files, 1)
+
+    def test_sync_skips_existing_hashed_files(self):
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        objects_fake.existing_objects = {
+            gcs_root + '/base.0123456789ab.css': 'not_checked'
+        }
+        objects_fake.existing_metadata = {
+            gcs_root + '/base.0123456789ab.css': {
+                'uploadFormat': static_content_serve._WEB_ASSET_UPLOAD_FORMAT
+            }
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            with open(os.path.join(tmp_dir_root, 'base.0123456789ab.css'),
+                      'w') as f:
+                f.write('body {}')
+            stats = self._static_content_serve_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, web_assets=True)
+        self.assertNotIn(BUCKET_NAME, objects_fake.bucket_files)
+        self.assertEqual(stats.skipped_files, 1)
+
+    def test_sync_reuploads_web_assets_of_older_format(self):
+        # Objects uploaded before web asset headers were set have the same
+        # content, but not the same headers.
+        objects_fake = self._storage_service_fake.objects()
+        gcs_root = self._static_content_serve_client.GCS_ROOT
+        unchanged_md5 = base64.b64encode(hashlib.md5(b'x').digest()).decode()
+        objects_fake.existing_objects = {
+            gcs_root + '/file1': unchanged_md5,
+            gcs_root + '/base.0123456789ab.css': 'not_checked',
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_files(tmp_dir_root, 2)
+            with open(os.path.join(tmp_dir_root, 'base.0123456789ab.css'),
+                      'w') as f:
+                f.write('body {}')
+            stats = self._static_content_serve_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, web_assets=True)
+        self.assertCountEqual(
+            objects_fake.bucket_files[BUCKET_NAME],
+            [
+                gcs_root + '/file0', gcs_root + '/file1',
+                gcs_root + '/base.0123456789ab.css'
+            ])
+        self.assertEqual(
+            objects_fake.bodies[gcs_root + '/base.0123456789ab.css']
+            ['cacheControl'], 'public, max-age=31536000, immutable')
+        self.assertEqual(stats.skipped_files, 0)
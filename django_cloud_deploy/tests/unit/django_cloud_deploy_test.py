@@ -0,0 +1,85 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Startup checks for the django-cloud-deploy entry point.
+
+Importing the entry point must not import the libraries that make startup
+slow. Each check runs in a fresh interpreter, because modules imported by other
+tests would otherwise already be loaded.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from typing import List
+
+from absl.testing import absltest
+
+import django_cloud_deploy
+
+# Libraries that take most of the startup time and are only needed once a
+# command actually runs.
+_HEAVY_MODULES = ('django', 'docker', 'googleapiclient', 'jinja2',
+                  'kubernetes', 'django_cloud_deploy.workflow')
+
+# Libraries that are only needed to deploy to GKE.
+_GKE_MODULES = ('docker', 'kubernetes')
+
+
+def _import_in_subprocess(module: str) -> List[str]:
+    """Import a module in a new interpreter.
+
+    Args:
+        module: Full name of the module to import.
+
+    Returns:
+        The names of all modules loaded after importing the module.
+    """
+    code = textwrap.dedent("""
+        import importlib
+        import json
+        import sys
+
+        importlib.import_module({!r})
+        print(json.dumps(sorted(sys.modules)))
+    """).format(module)
+    # Run from the directory containing the package, so that it is imported
+    # instead of django_cloud_deploy/django_cloud_deploy.py.
+    root_dir = os.path.dirname(os.path.dirname(django_cloud_deploy.__file__))
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=root_dir,
+                                     universal_newlines=True)
+    return json.loads(output)
+
+
+class StartupTest(absltest.TestCase):
+    """Guards the modules imported by the django-cloud-deploy entry point."""
+
+    def assert_not_imported(self, modules, loaded_modules):
+        for module in modules:
+            self.assertNotIn(module, loaded_modules)
+
+    def test_entry_point_does_not_import_heavy_modules(self):
+        loaded_modules = _import_in_subprocess(
+            'django_cloud_deploy.django_cloud_deploy')
+        self.assert_not_imported(_HEAVY_MODULES, loaded_modules)
+
+    def test_workflow_does_not_import_gke_modules(self):
+        loaded_modules = _import_in_subprocess('django_cloud_deploy.workflow')
+        self.assert_not_imported(_GKE_MODULES, loaded_modules)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -13,17 +13,40 @@
 # limitations under the License.
 
 import importlib
+import importlib.util
+import json
 import os
 import shutil
 import sys
 import tempfile
+import threading
+import time
 from unittest import mock
 
 from absl.testing import absltest
 from django.core import management
+import yaml
 
 from django_cloud_deploy.skeleton import source_generator
 
+_bytecode_cache_dir = None
+_template_env_patcher = None
+
+
+def setUpModule():
+    # Keep templates compiled by the tests out of the user cache directory.
+    global _bytecode_cache_dir, _template_env_patcher
+    _bytecode_cache_dir = tempfile.mkdtemp()
+    _template_env_patcher = mock.patch.object(
+        source_generator, '_template_env',
+        source_generator._create_template_environment(_bytecode_cache_dir))
+    _template_env_patcher.start()
+
+
+def tearDownModule():
+    _template_env_patcher.stop()
+    shutil.rmtree(_bytecode_cache_dir)
+
 
 class FileGeneratorTest(absltest.TestCase):
 
@@ -86,6 +109,16 @@ class DjangoProjectFileGeneratorTest(FileGeneratorTest):
             # Test wsgi uses remote settings.
             self.assertIn('cloud_settings', wsgi_content)
 
+    def test_health_check_url(self):
+        project_name = 'test_health_check_url'
+        app_name = 'test_app_name'
+        self._generator.generate(project_name, self._project_dir, app_name)
+
+        with open(os.path.join(self._project_dir, project_name,
+                               'urls.py')) as urls_file:
+            urls_content = urls_file.read()
+            self.assertIn("path('healthz/', healthz", urls_content)
+
 
 class DjangoAppFileGeneratorTest(FileGeneratorTest):
 
@@ -124,6 +157,85 @@ class DjangoAppFileGeneratorTest(FileGeneratorTest):
         self.assertIn('new_file', files_list)
 
 
+class CloudAdminLoggerTest(FileGeneratorTest):
+    """Unit test for the logger of the generated cloud_admin app."""
+
+    def setUp(self):
+        super().setUp()
+        source_generator._DjangoAdminOverwriteGenerator().generate(
+            'fake-project-id', 'fake_project', self._project_dir)
+        # Other tests may have imported a "cloud_admin" package from another
+        # directory, so the module is loaded under its own name.
+        spec = importlib.util.spec_from_file_location(
+            'cloud_admin_logger_' + self.id().split('.')[-1],
+            os.path.join(self._project_dir, 'cloud_admin', 'logger.py'))
+        self._logger = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self._logger)
+        self._time = 1000.0
+        patcher = mock.patch.object(
+            self._logger, 'time', mock.Mock(monotonic=lambda: self._time))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _set_settings(self, background_refresh):
+        patcher = mock.patch.object(
+            self._logger,
+            'settings',
+            mock.Mock(
+                CLOUD_ADMIN_LOGS_CACHE_TTL=30,
+                CLOUD_ADMIN_LOGS_BACKGROUND_REFRESH=background_refresh))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_logging_client_created_once(self):
+        with mock.patch.object(self._logger,
+                               'generate_logging_client') as generate:
+            generate.assert_not_called()
+            client = self._logger.get_logging_client()
+            self.assertIs(self._logger.get_logging_client(), client)
+            generate.assert_called_once_with()
+
+    def test_logs_cached(self):
+        self._set_settings(background_refresh=False)
+        with mock.patch.object(self._logger, 'get_logging_client'), \
+                mock.patch.object(self._logger, '_fetch_logs',
+                                  side_effect=[['old'], ['new']]) as fetch:
+            self.assertEqual(self._logger.get_logs(), ['old'])
+            self._time += 10
+            self.assertEqual(self._logger.get_logs(), ['old'])
+            self.assertEqual(fetch.call_count, 1)
+
+            # Expired logs are fetched again before returning.
+            self._time += 30
+            self.assertEqual(self._logger.get_logs(), ['new'])
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_logs_refreshed_in_background(self):
+        self._set_settings(background_refresh=True)
+        refreshed = threading.Event()
+
+        def fetch_logs(logging_client, num_logs):
+            del logging_client, num_logs
+            if fetch.call_count > 1:
+                refreshed.set()
+                return ['new']
+            return ['old']
+
+        with mock.patch.object(self._logger, 'get_logging_client'), \
+                mock.patch.object(self._logger, '_fetch_logs',
+                                  side_effect=fetch_logs) as fetch:
+            self.assertEqual(self._logger.get_logs(), ['old'])
+
+            # Expired logs are returned while newer ones are fetched.
+            self._time += 60
+            self.assertEqual(self._logger.get_logs(), ['old'])
+            self.assertTrue(refreshed.wait(5))
+            while self._logger._logs_refreshing:
+                time.sleep(0.01)
+            self.assertEqual(self._logger.get_logs(), ['new'])
+            self.assertEqual(fetch.call_count, 2)
+
+
 class SettingsFileGeneratorTest(FileGeneratorTest):
     """Unit test for source_generator._SettingsFileGenerator."""
 
@@ -198,9 +310,84 @@ class SettingsFileGeneratorTest(FileGeneratorTest):
         # Test remote settings use default GCS buckets to serve static files
         self.assertIn(project_id + '/static', getattr(module, 'STATIC_URL'))
 
+        # Test remote settings store static files with content hashed names
+        self.assertIn('ManifestStaticFilesStorage',
+                      getattr(module, 'STATICFILES_STORAGE'))
+
         # Test remote settings does not use DEBUG mode
         self.assertEqual(getattr(module, 'DEBUG'), False)
 
+    def test_cloud_settings_persistent_connections(self):
+        project_name = 'test_cloud_settings_persistent_connections'
+        project_id = project_name + 'project_id'
+        cloud_sql_connection_string = ('{}:{}:{}'.format(
+            project_id, 'us-west', 'instance'))
+        self._generator.generate(
+            project_id,
+            project_name,
+            self._project_dir,
+            cloud_sql_connection_string,
+            conn_max_age=120)
+
+        sys.path.append(self._project_dir)
+        with mock.patch.dict(os.environ):
+            os.environ.pop('GAE_APPLICATION', None)
+            os.environ.update({
+                'DATABASE_PORT': '6432',
+                'DATABASE_TRANSACTION_POOLING': 'true'
+            })
+            module = importlib.import_module(project_name + '.cloud_settings')
+        database = getattr(module, 'DATABASES')['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 120)
+        self.assertEqual(database['PORT'], '6432')
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_cloud_settings_redis(self):
+        project_name = 'test_cloud_settings_redis'
+        project_id = project_name + 'project_id'
+        cloud_sql_connection_string = ('{}:{}:{}'.format(
+            project_id, 'us-west', 'instance'))
+        self._generator.generate(
+            project_id,
+            project_name,
+            self._project_dir,
+            cloud_sql_connection_string,
+            redis=True)
+
+        sys.path.append(self._project_dir)
+        with mock.patch.dict(os.environ):
+            os.environ.pop('GAE_APPLICATION', None)
+            os.environ.update({'REDIS_HOST': '10.0.0.3', 'REDIS_PORT': '6379'})
+            module = importlib.import_module(project_name + '.cloud_settings')
+        cache = getattr(module, 'CACHES')['default']
+        self.assertEqual(cache['BACKEND'], 'django_redis.cache.RedisCache')
+        self.assertEqual(cache['LOCATION'], 'redis://10.0.0.3:6379/0')
+        self.assertEqual(
+            getattr(module, 'SESSION_ENGINE'),
+            'django.contrib.sessions.backends.cached_db')
+
+        # Locally, Redis is replaced by a local memory cache.
+        module = importlib.import_module(project_name + '.local_settings')
+        self.assertEqual(
+            getattr(module, 'CACHES')['default']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_cloud_settings_no_redis(self):
+        project_name = 'test_cloud_settings_no_redis'
+        project_id = project_name + 'project_id'
+        cloud_sql_connection_string = ('{}:{}:{}'.format(
+            project_id, 'us-west', 'instance'))
+        self._generator.generate(project_id, project_name, self._project_dir,
+                                 cloud_sql_connection_string)
+
+        sys.path.append(self._project_dir)
+        with mock.patch.dict(os.environ):
+            os.environ.pop('GAE_APPLICATION', None)
+            os.environ['REDIS_HOST'] = '10.0.0.3'
+            module = importlib.import_module(project_name + '.cloud_settings')
+        self.assertNotIn('CACHES', dir(module))
+        self.assertNotIn('SESSION_ENGINE', dir(module))
+
     def test_cloud_settings_gae(self):
         project_name = 'test_cloud_settings_gke'
         project_id = project_name + 'project_id'
@@ -220,6 +407,63 @@ class SettingsFileGeneratorTest(FileGeneratorTest):
                 cloud_sql_connection_string)
             self.assertIn(value, settings_content)
 
+    def _import_gae_cloud_settings(self, project_name, environ):
+        """Imports generated cloud settings as if running on App Engine."""
+        project_id = project_name + 'project_id'
+        cloud_sql_connection_string = ('{}:{}:{}'.format(
+            project_id, 'us-west', 'instance'))
+        self._generator.generate(project_id, project_name, self._project_dir,
+                                 cloud_sql_connection_string)
+        sys.path.append(self._project_dir)
+        environ = dict(environ, GAE_APPLICATION='app', DATABASE_USER='user')
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DATABASE_PASSWORD', None)
+            os.environ.update(environ)
+            return importlib.import_module(project_name + '.cloud_settings')
+
+    def test_cloud_settings_gae_password_from_environment(self):
+        with mock.patch('google.cloud.storage.Client') as mock_client:
+            module = self._import_gae_cloud_settings(
+                'test_cloud_settings_gae_environment',
+                {'DATABASE_PASSWORD': 'env_password'})
+            mock_client.assert_not_called()
+        self.assertEqual(
+            getattr(module, 'DATABASES')['default']['PASSWORD'],
+            'env_password')
+
+    def test_cloud_settings_gae_password_cached(self):
+        project_name = 'test_cloud_settings_gae_cached'
+        with mock.patch.object(tempfile, 'tempdir', self._project_dir):
+            with open(os.path.join(self._project_dir,
+                                   project_name + '-cloudsql.json'),
+                      'w') as cache_file:
+                cache_file.write('{"password": "cached_password"}')
+            with mock.patch('google.cloud.storage.Client') as mock_client:
+                module = self._import_gae_cloud_settings(project_name, {})
+                mock_client.assert_not_called()
+        self.assertEqual(
+            getattr(module, 'DATABASES')['default']['PASSWORD'],
+            'cached_password')
+
+    def test_cloud_settings_gae_password_fetched(self):
+        project_name = 'test_cloud_settings_gae_fetched'
+        with mock.patch.object(tempfile, 'tempdir', self._project_dir):
+            with mock.patch('google.cloud.storage.Client') as mock_client:
+                blob = mock_client.return_value.bucket.return_value.blob
+                blob.return_value.download_as_string.return_value = (
+                    b'{"password": "fetched_password"}')
+                module = self._import_gae_cloud_settings(project_name, {})
+        self.assertEqual(
+            getattr(module, 'DATABASES')['default']['PASSWORD'],
+            'fetched_password')
+        mock_client.return_value.bucket.assert_called_once_with(
+            'secrets-' + project_name + 'project_id')
+        # The password is cached for the other workers of the instance.
+        with open(os.path.join(self._project_dir,
+                               project_name + '-cloudsql.json')) as cache_file:
+            self.assertEqual(
+                json.load(cache_file), {'password': 'fetched_password'})
+
     def test_customize_cloud_settings(self):
         project_name = 'test_cloud_settings_customize_database_name'
         project_id = project_name + 'project_id'
@@ -326,8 +570,16 @@ class DockerfileGeneratorTest(FileGeneratorTest):
         with open(os.path.join(self._project_dir, 'Dockerfile')) as dockerfile:
             dockerfile_content = dockerfile.read()
 
-            # Test using python3 to create virtualenv
-            self.assertIn('virtualenv -p python3', dockerfile_content)
+            # Test building dependencies in a separate stage and copying only
+            # the virtualenv into the runtime image
+            self.assertIn('AS builder', dockerfile_content)
+            self.assertIn('COPY --from=builder /env /env', dockerfile_content)
+
+            # Test not installing system packages the dependencies do not need
+            self.assertNotIn('apt-get', dockerfile_content)
+
+            # Test precompiling bytecode of the app
+            self.assertIn('compileall', dockerfile_content)
 
             # Test using remote settings when deployed on GKE
             self.assertIn('cloud_settings', dockerfile_content)
@@ -338,11 +590,88 @@ class DockerfileGeneratorTest(FileGeneratorTest):
             # Test generating correct wsgi module name.
             self.assertIn('polls.wsgi', dockerfile_content)
 
+            # Test sizing gunicorn for the CPU limit of the app containers
+            self.assertIn(
+                'ENV GUNICORN_CMD_ARGS "--workers 3 --worker-class gthread',
+                dockerfile_content)
+
+    def test_dockerfile_gunicorn_options(self):
+        self._generator.generate(
+            'polls', self._project_dir,
+            source_generator.GunicornOptions(
+                workers=5, worker_class='gevent', preload=False))
+        with open(os.path.join(self._project_dir, 'Dockerfile')) as dockerfile:
+            dockerfile_content = dockerfile.read()
+            self.assertIn('--workers 5 --worker-class gevent',
+                          dockerfile_content)
+            self.assertNotIn('--preload', dockerfile_content)
+
     def test_generate_twice(self):
         self._generator.generate('polls', self._project_dir)
         self.assertTrue(self._generator.generated(self._project_dir))
 
 
+class GunicornOptionsTest(absltest.TestCase):
+
+    def test_command_line(self):
+        options = source_generator.GunicornOptions(
+            workers=3,
+            threads=8,
+            keep_alive=75,
+            max_requests=500,
+            max_requests_jitter=50,
+            timeout=60)
+        self.assertEqual(
+            options.to_command_line(),
+            '--workers 3 --worker-class gthread --threads 8 --preload '
+            '--keep-alive 75 --max-requests 500 --max-requests-jitter 50 '
+            '--timeout 60')
+
+    def test_threads_only_for_gthread_workers(self):
+        options = source_generator.GunicornOptions(worker_class='sync')
+        self.assertNotIn('--threads', options.to_command_line())
+
+    def test_invalid_worker_class(self):
+        with self.assertRaises(ValueError):
+            source_generator.GunicornOptions(worker_class='eventlet')
+
+    def test_for_cpu_quantity(self):
+        for cpu, workers in (('250m', 2), ('1', 3), ('1500m', 4), ('2', 5)):
+            self.assertEqual(
+                source_generator.GunicornOptions.for_cpu_quantity(
+                    cpu).workers, workers)
+
+    def test_for_gae_instance_class(self):
+        for instance_class, workers in (('F1', 2), ('F2', 4), ('F4_1G', 8)):
+            self.assertEqual(
+                source_generator.GunicornOptions.for_gae_instance_class(
+                    instance_class).workers, workers)
+        with self.assertRaises(ValueError):
+            source_generator.GunicornOptions.for_gae_instance_class('F3')
+
+    def test_requirements(self):
+        self.assertEqual(
+            source_generator.GunicornOptions(worker_class='gevent')
+            .requirements, ['gevent==1.4.0'])
+        self.assertEqual(source_generator.GunicornOptions().requirements, [])
+
+
+class AppEngineFileGeneratorTest(FileGeneratorTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._generator = source_generator._AppEngineFileGenerator()
+
+    def test_gunicorn_sized_for_instance_class(self):
+        self._generator.generate('polls', self._project_dir, 'default', 'F4')
+        with open(os.path.join(self._project_dir, 'app.yaml')) as app_yaml:
+            app_yaml_content = app_yaml.read()
+            self.assertIn('instance_class: F4', app_yaml_content)
+            self.assertIn('--workers 8 --worker-class gthread',
+                          app_yaml_content)
+            self.assertIn('polls.wsgi', app_yaml_content)
+
+
 class DependencyFileGeneratorTest(FileGeneratorTest):
 
     @classmethod
@@ -357,9 +686,8 @@ class DependencyFileGeneratorTest(FileGeneratorTest):
     def test_dependencies(self):
         # TODO: This is a change-detector test. It should be modified to not
         # check for exact dependencies.
-        dependencies = ('Django==2.1.5', 'mysqlclient==1.3.13', 'wheel==0.31.1',
-                        'gunicorn==19.9.0', 'psycopg2-binary==2.7.5',
-                        'google-cloud-logging==1.8.0',
+        dependencies = ('Django==2.1.5', 'wheel==0.31.1', 'gunicorn==19.9.0',
+                        'psycopg2-binary==2.7.5', 'google-cloud-logging==1.8.0',
                         'google-cloud-storage==1.13.0',
                         'google-api-python-client==1.7.4')
         self._generator.generate(self._project_dir)
@@ -370,6 +698,15 @@ class DependencyFileGeneratorTest(FileGeneratorTest):
             self.assertCountEqual(
                 dependency_file_content.split('\n'), dependencies)
 
+    def test_extra_requirements(self):
+        self._generator.generate(self._project_dir, ['gevent==1.4.0'])
+        dependency_file_path = os.path.join(self._project_dir,
+                                            'requirements.txt')
+        with open(dependency_file_path) as dependency_file:
+            dependencies = dependency_file.read().split('\n')
+            self.assertIn('gunicorn==19.9.0', dependencies)
+            self.assertIn('gevent==1.4.0', dependencies)
+
     def test_generate_twice(self):
         self._generator.generate(self._project_dir)
         self.assertTrue(self._generator.generated(self._project_dir))
@@ -441,6 +778,133 @@ class YAMLFileGeneratorTest(FileGeneratorTest):
                 # Assert django_app secret is used
                 self.assertIn('name: ' + secret, yaml_file_content)
 
+    def _load_yaml_documents(self, project_name):
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path) as yaml_file:
+            return {
+                data['kind']: data
+                for data in yaml.safe_load_all(yaml_file)
+                if data
+            }
+
+    def test_autoscaling_and_probes(self):
+        project_id = project_name = 'test_autoscaling_and_probes'
+        self._generator.generate(self._project_dir, project_name, project_id)
+        documents = self._load_yaml_documents(project_name)
+        self.assertCountEqual(
+            documents, ['Deployment', 'Service', 'HorizontalPodAutoscaler'])
+
+        # The autoscaler owns the number of replicas.
+        deployment_spec = documents['Deployment']['spec']
+        self.assertNotIn('replicas', deployment_spec)
+        app_container = deployment_spec['template']['spec']['containers'][0]
+        self.assertEqual(app_container['resources'], {
+            'requests': {'cpu': '250m', 'memory': '256Mi'},
+            'limits': {'cpu': '1', 'memory': '512Mi'},
+        })
+        for probe in ('readinessProbe', 'livenessProbe'):
+            self.assertEqual(app_container[probe]['httpGet'],
+                             {'path': '/healthz/', 'port': 8080})
+        for container in deployment_spec['template']['spec']['containers']:
+            self.assertIn('cpu', container['resources']['requests'])
+
+        autoscaler_spec = documents['HorizontalPodAutoscaler']['spec']
+        self.assertEqual(autoscaler_spec['scaleTargetRef']['name'],
+                         project_name)
+        self.assertEqual(autoscaler_spec['minReplicas'], 1)
+        self.assertEqual(autoscaler_spec['maxReplicas'], 5)
+        self.assertEqual(autoscaler_spec['targetCPUUtilizationPercentage'], 70)
+
+    def test_customized_autoscaling(self):
+        project_id = project_name = 'test_customized_autoscaling'
+        self._generator.generate(
+            self._project_dir,
+            project_name,
+            project_id,
+            min_replicas=2,
+            max_replicas=10,
+            target_cpu_utilization=50,
+            cpu_request='500m',
+            memory_limit='1Gi')
+        documents = self._load_yaml_documents(project_name)
+        autoscaler_spec = documents['HorizontalPodAutoscaler']['spec']
+        self.assertEqual(autoscaler_spec['minReplicas'], 2)
+        self.assertEqual(autoscaler_spec['maxReplicas'], 10)
+        self.assertEqual(autoscaler_spec['targetCPUUtilizationPercentage'], 50)
+        app_container = (documents['Deployment']['spec']['template']['spec']
+                         ['containers'][0])
+        self.assertEqual(app_container['resources']['requests']['cpu'], '500m')
+        self.assertEqual(app_container['resources']['limits']['memory'], '1Gi')
+
+    def test_no_pgbouncer_by_default(self):
+        project_id = project_name = 'test_no_pgbouncer_by_default'
+        self._generator.generate(self._project_dir, project_name, project_id)
+        documents = self._load_yaml_documents(project_name)
+        pod_spec = documents['Deployment']['spec']['template']['spec']
+        container_names = [
+            container['name'] for container in pod_spec['containers']
+        ]
+        self.assertNotIn('pgbouncer', container_names)
+        env_names = [env['name'] for env in pod_spec['containers'][0]['env']]
+        self.assertNotIn('DATABASE_PORT', env_names)
+
+    def test_pgbouncer(self):
+        project_id = project_name = 'test_pgbouncer'
+        self._generator.generate(
+            self._project_dir,
+            project_name,
+            project_id,
+            pgbouncer=True,
+            gunicorn_options=source_generator.GunicornOptions(
+                workers=3, threads=4))
+        documents = self._load_yaml_documents(project_name)
+        containers = {
+            container['name']: container
+            for container in (documents['Deployment']['spec']['template']
+                              ['spec']['containers'])
+        }
+        pgbouncer_env = {
+            env['name']: env.get('value')
+            for env in containers['pgbouncer']['env']
+        }
+        self.assertEqual(pgbouncer_env['LISTEN_PORT'], '6432')
+        self.assertEqual(pgbouncer_env['POOL_MODE'], 'transaction')
+        self.assertEqual(pgbouncer_env['MAX_CLIENT_CONN'], '24')
+        self.assertEqual(pgbouncer_env['DEFAULT_POOL_SIZE'], '3')
+        app_env = {
+            env['name']: env.get('value')
+            for env in containers[project_name + '-app']['env']
+        }
+        self.assertEqual(app_env['DATABASE_PORT'], '6432')
+        self.assertEqual(app_env['DATABASE_TRANSACTION_POOLING'], 'true')
+
+    def test_redis_endpoint_from_secret(self):
+        project_id = project_name = 'test_redis_endpoint_from_secret'
+        self._generator.generate(
+            self._project_dir, project_name, project_id, redis=True)
+        documents = self._load_yaml_documents(project_name)
+        app_container = (documents['Deployment']['spec']['template']['spec']
+                         ['containers'][0])
+        app_env = {env['name']: env for env in app_container['env']}
+        self.assertEqual(app_env['REDIS_HOST']['valueFrom']['secretKeyRef'], {
+            'name': 'redis',
+            'key': 'host'
+        })
+        self.assertEqual(app_env['REDIS_PORT']['valueFrom']['secretKeyRef'], {
+            'name': 'redis',
+            'key': 'port'
+        })
+
+    def test_invalid_replicas(self):
+        project_id = project_name = 'test_invalid_replicas'
+        with self.assertRaises(ValueError):
+            self._generator.generate(
+                self._project_dir,
+                project_name,
+                project_id,
+                min_replicas=3,
+                max_replicas=2)
+
     def test_generate_twice(self):
         project_id = project_name = 'test_generate_twice'
         self._generator.generate(self._project_dir, project_name, project_id)
@@ -480,6 +944,23 @@ class DjangoSourceFileGeneratorTest(FileGeneratorTest):
             'fake_db_user', 'fake_db_password')
         self._test_project_structure(project_name, app_name, self._project_dir)
 
+    def test_generate_all_source_files_with_redis(self):
+        project_id = project_name = 'test_generate_all_source_files_redis'
+        app_name = 'polls'
+        self._generator.generate_all_source_files(
+            project_id,
+            project_name,
+            app_name,
+            self._project_dir,
+            'fake_db_user',
+            'fake_db_password',
+            redis=True)
+        dependency_file_path = os.path.join(self._project_dir,
+                                            'requirements.txt')
+        with open(dependency_file_path) as dependency_file:
+            self.assertIn('django-redis==4.10.0',
+                          dependency_file.read().split('\n'))
+
     def test_delete_existing_files(self):
         project_id = project_name = 'test_delete_existing_files1'
         app_name = 'polls1'
@@ -532,3 +1013,96 @@ class DjangoSourceFileGeneratorTest(FileGeneratorTest):
             'fake_db_password',
             overwrite=False)
         self._test_project_structure(project_name, app_name, self._project_dir)
+
+    def _load_app_container(self, project_name):
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path) as yaml_file:
+            for data in yaml.safe_load_all(yaml_file):
+                if data and data['kind'] == 'Deployment':
+                    return data['spec']['template']['spec']['containers'][0]
+
+    def test_health_check_generated_project(self):
+        project_id = project_name = 'test_health_check_generated_project'
+        self._generator.generate_all_source_files(
+            project_id, project_name, 'polls', self._project_dir,
+            'fake_db_user', 'fake_db_password')
+        app_container = self._load_app_container(project_name)
+        for probe in ('readinessProbe', 'livenessProbe'):
+            self.assertEqual(app_container[probe]['httpGet'],
+                             {'path': '/healthz/', 'port': 8080})
+
+    def test_health_check_existing_project(self):
+        # The URL configuration of an existing project has no health check
+        # path, so probes only connect to the app.
+        project_id = project_name = 'test_health_check_existing_project'
+        management.call_command('startproject', project_name, self._project_dir)
+        self._generator.generate_all_source_files(
+            project_id,
+            project_name,
+            'polls',
+            self._project_dir,
+            'fake_db_user',
+            'fake_db_password',
+            overwrite=False)
+        app_container = self._load_app_container(project_name)
+        for probe in ('readinessProbe', 'livenessProbe'):
+            self.assertNotIn('httpGet', app_container[probe])
+            self.assertEqual(app_container[probe]['tcpSocket'], {'port': 8080})
+
+
+class TemplateCompilationTest(FileGeneratorTest):
+    """Test case for compiling the templates of the generators once."""
+
+    def setUp(self):
+        super().setUp()
+        # Only the rendering of templates is tested.
+        patcher = mock.patch.object(source_generator.DjangoSourceFileGenerator,
+                                    'setup_django_environment')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._bytecode_cache_dir = os.path.join(self._project_dir, 'cache')
+
+    def _generate(self, template_env):
+        """Generate all source files, returning the number of compilations."""
+        generator = source_generator.DjangoSourceFileGenerator(template_env)
+        project_dir = tempfile.mkdtemp(dir=self._project_dir)
+        with mock.patch.object(
+                template_env, 'compile',
+                wraps=template_env.compile) as mock_compile:
+            generator.generate_all_source_files(
+                'fake-project-id', 'mysite', 'polls', project_dir,
+                'fake_db_user', 'fake_db_password')
+        return mock_compile.call_count
+
+    def test_templates_compiled_once(self):
+        template_env = source_generator._create_template_environment(
+            self._bytecode_cache_dir)
+        self.assertGreater(self._generate(template_env), 0)
+        self.assertEqual(self._generate(template_env), 0)
+
+    def test_compiled_templates_cached_on_disk(self):
+        self._generate(
+            source_generator._create_template_environment(
+                self._bytecode_cache_dir))
+        self.assertNotEmpty(os.listdir(self._bytecode_cache_dir))
+
+        # Another process loads the compiled templates instead of compiling
+        # them again.
+        template_env = source_generator._create_template_environment(
+            self._bytecode_cache_dir)
+        self.assertEqual(self._generate(template_env), 0)
+
+    def test_unwritable_cache_dir(self):
+        # A file is in the way of the cache directory.
+        with open(self._bytecode_cache_dir, 'w'):
+            pass
+        template_env = source_generator._create_template_environment(
+            os.path.join(self._bytecode_cache_dir, 'jinja2'))
+        self.assertIsNone(template_env.bytecode_cache)
+        self.assertGreater(self._generate(template_env), 0)
+        self.assertEqual(self._generate(template_env), 0)
+
+    def test_default_cache_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/fake/cache'}):
+            self.assertEqual(source_generator._default_bytecode_cache_dir(),
+                             '/fake/cache/django-cloud-deploy/jinja2')
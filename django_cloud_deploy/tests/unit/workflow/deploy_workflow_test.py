@@ -0,0 +1,42 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow.deploy_workflow module."""
+
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.workflow import _deploygke
+from django_cloud_deploy.workflow import deploy_workflow
+
+
+class DeployWorkflowTest(absltest.TestCase):
+    """Test case for deploy_workflow.DeployWorkflow."""
+
+    @mock.patch.object(_deploygke, 'DeploygkeWorkflow', autospec=True)
+    def test_gke_workflow_created_once(self, mock_workflow_class):
+        workflow = deploy_workflow.DeployWorkflow(mock.Mock())
+        workflow.create_gke_cluster('fake-project', 'fake-cluster')
+        workflow.build_and_push_gke_image('/fake/app', 'gcr.io/fake/app')
+        workflow.deploy_gke_app_to_cluster('fake-project', 'fake-cluster',
+                                           '/fake/app', 'fake-app', {})
+        mock_workflow_class.assert_called_once_with(workflow.credentials)
+        workflow_instance = mock_workflow_class.return_value
+        workflow_instance.create_cluster_sync.assert_called_once()
+        workflow_instance.build_and_push_image.assert_called_once()
+        workflow_instance.deploy_app_to_cluster.assert_called_once()
+
+
+if __name__ == '__main__':
+    absltest.main()
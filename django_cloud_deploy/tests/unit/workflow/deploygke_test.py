@@ -0,0 +1,266 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._deploygke module."""
+
+import os
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy import config
+from django_cloud_deploy.cloudlib import container
+from django_cloud_deploy.workflow import _deploygke
+
+IMAGE_NAME = 'gcr.io/fake-project/fake-app'
+
+DEPLOYMENT_YAML = """
+apiVersion: extensions/v1beta1
+kind: Deployment
+metadata:
+  name: fake-app
+spec:
+  replicas: 1
+  template:
+    spec:
+      containers:
+      - name: fake-app-app
+        image: gcr.io/fake-project/fake-app
+      - name: cloudsql-proxy
+        image: gcr.io/cloudsql-docker/gce-proxy
+"""
+
+SERVICE_YAML = """
+apiVersion: v1
+kind: Service
+metadata:
+  name: fake-app
+spec:
+  type: LoadBalancer
+  ports:
+  - port: 80
+    targetPort: 8080
+"""
+
+
+class BuildAndPushImageTest(absltest.TestCase):
+    """Test case for DeploygkeWorkflow.build_and_push_image."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient.from_credentials')
+        self._container_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self._context = mock.Mock(fingerprint='fingerprint')
+        self._container_client.get_build_context.return_value = self._context
+        self._container_client.push_docker_image.return_value = 'sha256:1234'
+        self._container_client.get_remote_image_digest.return_value = (
+            'sha256:1234')
+        self._app_directory = tempfile.mkdtemp()
+        self._workflow = _deploygke.DeploygkeWorkflow(mock.Mock())
+
+    def test_first_build(self):
+        self.assertTrue(
+            self._workflow.build_and_push_image(self._app_directory,
+                                                IMAGE_NAME))
+        self._container_client.build_docker_image.assert_called_once_with(
+            IMAGE_NAME,
+            self._app_directory,
+            cache_from=[IMAGE_NAME],
+            progress_callback=mock.ANY,
+            context=self._context)
+        self._container_client.push_docker_image.assert_called_once_with(
+            IMAGE_NAME, progress_callback=mock.ANY)
+        config_obj = config.Configuration(self._app_directory)
+        self.assertEqual(
+            config_obj.get('build_context_fingerprint'), 'fingerprint')
+        self.assertEqual(config_obj.get('image_digest'), 'sha256:1234')
+
+    def test_progress_sums_build_and_push(self):
+
+        def build_docker_image(*args, progress_callback, **kwargs):
+            progress_callback(10, 10)
+
+        def push_docker_image(*args, progress_callback):
+            progress_callback(5, 20)
+            return 'sha256:1234'
+
+        self._container_client.build_docker_image.side_effect = (
+            build_docker_image)
+        self._container_client.push_docker_image.side_effect = (
+            push_docker_image)
+        progress = []
+        self._workflow.build_and_push_image(
+            self._app_directory, IMAGE_NAME,
+            lambda done, total: progress.append((done, total)))
+        self.assertEqual(progress, [(10, 10), (15, 30)])
+
+    def test_unchanged_build_context(self):
+        self._workflow.build_and_push_image(self._app_directory, IMAGE_NAME)
+        self._container_client.reset_mock()
+        self.assertFalse(
+            self._workflow.build_and_push_image(self._app_directory,
+                                                IMAGE_NAME))
+        self._container_client.build_docker_image.assert_not_called()
+        self._container_client.push_docker_image.assert_not_called()
+
+    def test_changed_build_context(self):
+        self._workflow.build_and_push_image(self._app_directory, IMAGE_NAME)
+        self._context.fingerprint = 'new_fingerprint'
+        self.assertTrue(
+            self._workflow.build_and_push_image(self._app_directory,
+                                                IMAGE_NAME))
+        self.assertEqual(
+            self._container_client.build_docker_image.call_count, 2)
+
+    def test_image_changed_in_registry(self):
+        self._workflow.build_and_push_image(self._app_directory, IMAGE_NAME)
+        self._container_client.get_remote_image_digest.return_value = None
+        self.assertTrue(
+            self._workflow.build_and_push_image(self._app_directory,
+                                                IMAGE_NAME))
+        self.assertEqual(self._container_client.push_docker_image.call_count,
+                         2)
+
+
+class DeployAppToClusterTest(absltest.TestCase):
+    """Test case for DeploygkeWorkflow.deploy_app_to_cluster."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient.from_credentials')
+        self._container_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self._container_client.wait_for_service_ingress.return_value = (
+            '1.2.3.4')
+        self._app_directory = tempfile.mkdtemp()
+        self._workflow = _deploygke.DeploygkeWorkflow(mock.Mock())
+
+    def _write_yaml(self, content):
+        with open(os.path.join(self._app_directory, 'fake-app.yaml'),
+                  'w') as yaml_file:
+            yaml_file.write(content)
+
+    def _deploy_app(self):
+        return self._workflow.deploy_app_to_cluster(
+            'fake-project', 'fake-cluster', self._app_directory, 'fake-app',
+            {'cloudsql': {'password': 'password'}})
+
+    def test_apply_all_objects(self):
+        self._write_yaml(DEPLOYMENT_YAML + '---' + SERVICE_YAML)
+        self.assertEqual(self._deploy_app(), 'http://1.2.3.4/')
+        manifests = self._container_client.apply_manifests.call_args[0][0]
+        self.assertEqual([m['kind'] for m in manifests],
+                         ['Secret', 'Deployment', 'Service'])
+        self.assertEqual(manifests[0], {
+            'apiVersion': 'v1',
+            'kind': 'Secret',
+            'metadata': {'name': 'cloudsql'},
+            'data': {'password': 'cGFzc3dvcmQ='},
+        })
+        wait = self._container_client.wait_for_deployment_ready
+        wait.assert_called_once_with('app=fake-app', mock.ANY)
+
+    def test_missing_service(self):
+        self._write_yaml(DEPLOYMENT_YAML)
+        with self.assertRaises(_deploygke.DeployNewAppError):
+            self._deploy_app()
+        self._container_client.apply_manifests.assert_not_called()
+
+    def test_apply_error(self):
+        self._write_yaml(DEPLOYMENT_YAML + '---' + SERVICE_YAML)
+        self._container_client.apply_manifests.side_effect = (
+            container.ManifestApplyError('Unprocessable Entity'))
+        with self.assertRaisesRegex(_deploygke.DeployNewAppError,
+                                    'Unprocessable Entity'):
+            self._deploy_app()
+
+
+class UpdateAppTest(absltest.TestCase):
+    """Test case for DeploygkeWorkflow.update_app_sync."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient.from_credentials')
+        self._container_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self._container_client.update_deployment.return_value = 3
+        self._app_directory = tempfile.mkdtemp()
+        with open(os.path.join(self._app_directory, 'fake-app.yaml'),
+                  'w') as yaml_file:
+            yaml_file.write(DEPLOYMENT_YAML)
+        self._workflow = _deploygke.DeploygkeWorkflow(mock.Mock())
+        self._container_client.wait_for_service_ingress.return_value = (
+            '1.2.3.4')
+        self._workflow.build_and_push_image = mock.Mock()
+
+    def _update_app(self):
+        return self._workflow.update_app_sync('fake-project', 'fake-cluster',
+                                              self._app_directory, 'fake-app',
+                                              IMAGE_NAME)
+
+    def _deployment_containers(self):
+        deployment_data = (
+            self._container_client.update_deployment.call_args[0][0])
+        return deployment_data['spec']['template']['spec']['containers']
+
+    def test_image_pinned_to_digest(self):
+        config_obj = config.Configuration(self._app_directory)
+        config_obj.set('image_digest', 'sha256:1234')
+        config_obj.save()
+        self.assertEqual(self._update_app(), 'http://1.2.3.4/')
+        self._container_client.update_deployment.assert_called_once_with(
+            mock.ANY, mock.ANY, restart=False)
+        self.assertEqual(
+            [c['image'] for c in self._deployment_containers()],
+            [IMAGE_NAME + '@sha256:1234', 'gcr.io/cloudsql-docker/gce-proxy'])
+        wait = self._container_client.wait_for_deployment_rollout
+        wait.assert_called_once_with('fake-app', 3, mock.ANY)
+
+    def test_apply_other_objects(self):
+        with open(os.path.join(self._app_directory, 'fake-app.yaml'),
+                  'w') as yaml_file:
+            yaml_file.write(DEPLOYMENT_YAML + '---' + SERVICE_YAML)
+        self._update_app()
+        manifests = self._container_client.apply_manifests.call_args[0][0]
+        self.assertEqual([m['kind'] for m in manifests], ['Service'])
+
+    def test_restart_without_digest(self):
+        self._update_app()
+        self._container_client.update_deployment.assert_called_once_with(
+            mock.ANY, mock.ANY, restart=True)
+        self.assertEqual(self._deployment_containers()[0]['image'],
+                         IMAGE_NAME)
+
+    def test_ingress_url_scoped_to_app(self):
+        self._update_app()
+        wait = self._container_client.wait_for_service_ingress
+        wait.assert_called_once_with('app=fake-app', mock.ANY)
+
+    def test_ingress_timeout(self):
+        self._container_client.wait_for_service_ingress.side_effect = (
+            container.WatchTimeoutError('did not finish'))
+        with self.assertRaises(_deploygke.DeployNewAppError):
+            self._update_app()
+
+    def test_rollout_error(self):
+        self._container_client.wait_for_deployment_rollout.side_effect = (
+            container.DeploymentRolloutError('timed out progressing'))
+        with self.assertRaisesRegex(_deploygke.DeployNewAppError,
+                                    'timed out progressing'):
+            self._update_app()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,136 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._scheduler module."""
+
+import threading
+import time
+
+from absl.testing import absltest
+
+from django_cloud_deploy.workflow import _scheduler
+
+
+class StepGraphTest(absltest.TestCase):
+    """Test case for _scheduler.StepGraph."""
+
+    def test_run_respects_dependencies(self):
+        graph = _scheduler.StepGraph()
+        finished = []
+        graph.add_step('a', lambda: finished.append('a'))
+        graph.add_step(
+            'b', lambda: finished.append('b'), dependencies=['a'])
+        graph.add_step(
+            'c', lambda: finished.append('c'), dependencies=['b'])
+        graph.run()
+        self.assertEqual(finished, ['a', 'b', 'c'])
+
+    def test_independent_steps_run_concurrently(self):
+        graph = _scheduler.StepGraph()
+        # Each step waits until the other one started. This can only finish
+        # if both steps are running at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+        graph.add_step('a', barrier.wait)
+        graph.add_step('b', barrier.wait)
+        graph.run()
+
+    def test_results_of_dependencies(self):
+        graph = _scheduler.StepGraph()
+        graph.add_step('a', lambda: 1)
+        graph.add_step('b', lambda: 2)
+        graph.add_step(
+            'sum',
+            lambda: graph.result('a') + graph.result('b'),
+            dependencies=['a', 'b'])
+        results = graph.run()
+        self.assertEqual(results, {'a': 1, 'b': 2, 'sum': 3})
+
+    def test_step_start_messages(self):
+        messages = []
+        graph = _scheduler.StepGraph(on_step_start=messages.append)
+        graph.add_step('a', lambda: None, message='Step A')
+        graph.add_step('b', lambda: None, dependencies=['a'])
+        graph.run()
+        self.assertEqual(messages, ['Step A'])
+
+    def test_step_finish_messages(self):
+        messages = []
+        graph = _scheduler.StepGraph(
+            on_step_finish=lambda message, seconds: messages.append(message))
+        graph.add_step('a', lambda: None, message='Step A')
+        graph.add_step('b', lambda: None, dependencies=['a'])
+        graph.add_step('c', lambda: None, dependencies=['b'], message='Step C')
+        graph.run()
+        self.assertEqual(messages, ['Step A', 'Step C'])
+        self.assertEqual(len(graph), 3)
+
+    def test_failed_step_stops_dependents(self):
+        graph = _scheduler.StepGraph()
+        finished = []
+
+        def fail():
+            raise ValueError('fail')
+
+        graph.add_step('a', fail)
+        graph.add_step(
+            'b', lambda: finished.append('b'), dependencies=['a'])
+        with self.assertRaises(ValueError):
+            graph.run()
+        self.assertEqual(finished, [])
+
+    def test_failed_step_cancels_running_steps(self):
+        graph = _scheduler.StepGraph()
+        started = threading.Event()
+
+        def fail():
+            self.assertTrue(started.wait(5))
+            raise ValueError('fail')
+
+        def wait_for_cancel():
+            started.set()
+            # Stands in for a long operation, e.g. creating a GKE cluster.
+            if graph.cancel_event.wait(5):
+                raise RuntimeError('cancelled')
+
+        graph.add_step('a', fail)
+        graph.add_step('b', wait_for_cancel)
+        start = time.monotonic()
+        # The exception of the failed step is raised, not the one of the
+        # cancelled step.
+        with self.assertRaises(ValueError):
+            graph.run()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(graph.cancel_event.is_set())
+
+    def test_duplicate_step(self):
+        graph = _scheduler.StepGraph()
+        graph.add_step('a', lambda: None)
+        with self.assertRaises(_scheduler.StepGraphError):
+            graph.add_step('a', lambda: None)
+
+    def test_unknown_dependency(self):
+        graph = _scheduler.StepGraph()
+        graph.add_step('a', lambda: None, dependencies=['unknown'])
+        with self.assertRaises(_scheduler.StepGraphError):
+            graph.run()
+
+    def test_dependency_cycle(self):
+        graph = _scheduler.StepGraph()
+        graph.add_step('a', lambda: None, dependencies=['b'])
+        graph.add_step('b', lambda: None, dependencies=['a'])
+        with self.assertRaises(_scheduler.StepGraphError):
+            graph.run()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -23,11 +23,14 @@ import webbrowser
 from django_cloud_deploy import config
 from django_cloud_deploy.cli import io
 from django_cloud_deploy.cloudlib import billing
+from django_cloud_deploy.cloudlib import static_content_serve
 from django_cloud_deploy.skeleton import source_generator
+from django_cloud_deploy.workflow import _cache
 from django_cloud_deploy.workflow import _database
 from django_cloud_deploy.workflow import _enable_service
 from django_cloud_deploy.workflow import deploy_workflow
 from django_cloud_deploy.workflow import _project
+from django_cloud_deploy.workflow import _scheduler
 from django_cloud_deploy.workflow import _service_account
 from django_cloud_deploy.workflow import _static_content_serve
 import portpicker
@@ -48,13 +51,23 @@ class InvalidConfigError(Exception):
     """A error occurred when fail to read required information from config."""
 
 
+class UnsupportedOptionError(ValueError):
+    """An option is not supported with the chosen backend."""
+
+
 class WorkflowManager(object):
     """A class to control workflow for deploying Django apps on GKE."""
 
-    _TOTAL_NEW_STEPS = 8
     _TOTAL_UPDATE_STEPS = 3
 
+    # Needed to create the Redis instance caching data of the app.
+    _REDIS_SERVICE = {
+        'title': 'Google Cloud Memorystore for Redis API',
+        'name': 'redis.googleapis.com'
+    }
+
     def __init__(self, credentials: credentials.Credentials):
+        self._credentials = credentials
         self._source_generator = source_generator.DjangoSourceFileGenerator()
         self._billing_client = billing.BillingClient.from_credentials(
             credentials)
@@ -90,7 +103,8 @@ class WorkflowManager(object):
             region: str = 'us-west1',
             cloud_sql_proxy_path: str = 'cloud_sql_proxy',
             backend: str = 'gke',
-            open_browser: bool = True):
+            open_browser: bool = True,
+            redis: bool = False):
         """Workflow of deploying a newly generated Django app to GKE.
 
         Args:
@@ -135,10 +149,24 @@ class WorkflowManager(object):
             backend: The desired backend to deploy the Django App on.
             open_browser: Whether we open the browser to show the deployed app
                 at the end.
+            redis: Whether to create a Memorystore Redis instance, in which
+                the app caches data and sessions. Only supported on GKE.
 
         Returns:
             The url of the deployed Django app.
+
+        Raises:
+            UnsupportedOptionError: If redis is requested for a backend other
+                than GKE.
         """
+        if redis and backend != 'gke':
+            # App Engine standard can only reach the private IP address of a
+            # Memorystore instance through a Serverless VPC Access connector.
+            # Without one, every cache call would wait for the connection
+            # timeout.
+            raise UnsupportedOptionError(
+                'Memorystore Redis is only supported with the "gke" backend')
+
         # A bunch of variables necessary for deployment we hardcode for user.
         database_username = 'postgres'
         cloud_storage_bucket_name = cloud_storage_bucket_name or project_id
@@ -147,6 +175,7 @@ class WorkflowManager(object):
         cluster_name = sanitized_django_project_name
         database_name = sanitized_django_project_name + '-db'
         database_instance_name = sanitized_django_project_name + '-instance'
+        cache_instance_name = sanitized_django_project_name + '-cache'
 
         image_name = '/'.join(
             ['gcr.io', project_id, sanitized_django_project_name])
@@ -154,45 +183,90 @@ class WorkflowManager(object):
 
         cloud_sql_proxy_port = portpicker.pick_unused_port()
 
-        self._console_io.tell('[1/{}]: Create GCP Project'.format(
-            self._TOTAL_NEW_STEPS))
-        self._project_workflow.create_project(project_name, project_id,
-                                              project_creation_mode)
-
-        self._console_io.tell('[2/{}]: Billing Set Up'.format(
-            self._TOTAL_NEW_STEPS))
-        if not self._billing_client.check_billing_enabled(project_id):
-            self._billing_client.enable_project_billing(project_id,
-                                                        billing_account_name)
-
-        self._console_io.tell('[3/{}]: Django Source Generation'.format(
-            self._TOTAL_NEW_STEPS))
-
         # Source generation requires service account ids.
         required_service_accounts = (
             required_service_accounts or
             self._service_account_workflow.load_service_accounts())
-        cloud_sql_secrets, django_secrets = self._load_secret_names(
-            required_service_accounts)
-        self._source_generator.generate_all_source_files(
-            project_id=project_id,
-            project_name=django_project_name,
-            app_name=django_app_name,
-            project_dir=django_directory_path,
-            database_user=database_username,
-            database_password=database_password,
-            instance_name=database_instance_name,
-            database_name=database_name,
-            cloud_sql_proxy_port=cloud_sql_proxy_port,
-            cloud_storage_bucket_name=cloud_storage_bucket_name,
-            cloudsql_secrets=cloud_sql_secrets,
-            django_secrets=django_secrets,
-            service_name=appengine_service_name,
-            image_tag=image_name)
-
-        with self._console_io.progressbar(
-                300, '[4/{}]: Database Set Up'.format(self._TOTAL_NEW_STEPS)):
-            self._database_workflow.create_and_setup_database(
+        if required_services is None:
+            required_services = self._enable_service_workflow.load_services()
+        if redis:
+            required_services = required_services + [self._REDIS_SERVICE]
+
+        # The steps below form a dependency graph. Steps without dependencies
+        # between each other (e.g. creating the Cloud SQL instance and creating
+        # the GKE cluster) run concurrently, and every step starts as soon as
+        # the steps it depends on have finished.
+        #
+        # Several steps run at the same time, so instead of a progress bar per
+        # step, every step is reported when it starts and when it finishes.
+        finished_steps = []
+
+        def on_step_start(title):
+            self._console_io.tell('{}...'.format(title))
+
+        def on_step_finish(title, seconds):
+            finished_steps.append(title)
+            self._console_io.tell('[{}/{}]: {} done ({:.0f}s)'.format(
+                len(finished_steps), len(graph), title, seconds))
+
+        graph = _scheduler.StepGraph(
+            on_step_start=on_step_start, on_step_finish=on_step_finish)
+
+        graph.add_step(
+            'project',
+            lambda: self._project_workflow.create_project(
+                project_name, project_id, project_creation_mode),
+            message='Create GCP Project')
+
+        def set_up_billing():
+            if not self._billing_client.check_billing_enabled(project_id):
+                self._billing_client.enable_project_billing(
+                    project_id, billing_account_name)
+
+        graph.add_step(
+            'billing',
+            set_up_billing,
+            dependencies=['project'],
+            message='Billing Set Up')
+
+        def generate_source():
+            cloud_sql_secrets, django_secrets = self._load_secret_names(
+                required_service_accounts)
+            self._source_generator.generate_all_source_files(
+                project_id=project_id,
+                project_name=django_project_name,
+                app_name=django_app_name,
+                project_dir=django_directory_path,
+                database_user=database_username,
+                database_password=database_password,
+                instance_name=database_instance_name,
+                database_name=database_name,
+                cloud_sql_proxy_port=cloud_sql_proxy_port,
+                cloud_storage_bucket_name=cloud_storage_bucket_name,
+                cloudsql_secrets=cloud_sql_secrets,
+                django_secrets=django_secrets,
+                service_name=appengine_service_name,
+                image_tag=image_name,
+                redis=redis)
+
+        # Source generation overwrites the project directory, so only do it
+        # once we know the project can be used.
+        graph.add_step(
+            'source',
+            generate_source,
+            dependencies=['project'],
+            message='Django Source Generation')
+
+        graph.add_step(
+            'services',
+            lambda: self._enable_service_workflow.enable_required_services(
+                project_id, required_services),
+            dependencies=['billing'],
+            message='Enable Services')
+
+        graph.add_step(
+            'database',
+            lambda: self._database_workflow.create_and_setup_database(
                 project_id=project_id,
                 instance_name=database_instance_name,
                 database_name=database_name,
@@ -203,46 +277,110 @@ class WorkflowManager(object):
                 database_user=database_username,
                 cloud_sql_proxy_path=cloud_sql_proxy_path,
                 region=region,
-                port=cloud_sql_proxy_port)
-
-        with self._console_io.progressbar(
-                180, '[5/{}]: Enable Services'.format(self._TOTAL_NEW_STEPS)):
-            if required_services is None:
-                required_services = (
-                    self._enable_service_workflow.load_services())
-            self._enable_service_workflow.enable_required_services(
-                project_id, required_services)
-
-        with self._console_io.progressbar(
-                300, '[6/{}]: Static Content Serve Set Up'.format(
-                    self._TOTAL_NEW_STEPS)):
-            self._static_content_workflow.serve_static_content(
-                project_id, cloud_storage_bucket_name, static_content_dir)
-
-        self._console_io.tell(
-            '[7/{}]: Create Service Account Necessary For Deployment'.format(
-                self._TOTAL_NEW_STEPS))
-        secrets = self._generate_secrets(project_id, database_username,
-                                         database_password,
-                                         required_service_accounts)
+                port=cloud_sql_proxy_port,
+                cancel_event=graph.cancel_event),
+            dependencies=['services', 'source'],
+            message='Database Set Up')
+
+        # The deployed app needs static/staticfiles.json, written when
+        # collecting static files, to find its content-hashed static files. So
+        # deploying waits for the collection, but not for the upload.
+        graph.add_step(
+            'collect_static',
+            self._static_content_workflow.collect_static_content,
+            dependencies=['source'],
+            message='Collect Static Files')
+
+        graph.add_step(
+            'static_content',
+            lambda: self._static_content_workflow.serve_static_content(
+                project_id,
+                cloud_storage_bucket_name,
+                static_content_dir,
+                collect=False),
+            dependencies=['services', 'collect_static'],
+            message='Static Content Serve Set Up')
+
+        graph.add_step(
+            'secrets',
+            lambda: self._generate_secrets(project_id, database_username,
+                                           database_password,
+                                           required_service_accounts),
+            dependencies=['services'],
+            message='Create Service Account Necessary For Deployment')
+
+        deploy_dependencies = []
+        if redis:
+
+            def create_redis_instance():
+                # Only projects using Redis need the Memorystore client.
+                cache_workflow = _cache.CacheWorkflow(self._credentials)
+                return cache_workflow.create_redis_instance(
+                    project_id,
+                    cache_instance_name,
+                    region,
+                    cancel_event=graph.cancel_event)
+
+            graph.add_step(
+                'cache',
+                create_redis_instance,
+                dependencies=['services'],
+                message='Create Memorystore Redis Instance')
+            deploy_dependencies.append('cache')
 
         if backend == 'gke':
-            with self._console_io.progressbar(
-                    1200, '[8/{}]: Deployment'.format(self._TOTAL_NEW_STEPS)):
-                app_url = self.deploy_workflow.deploy_gke_app(
+
+            def deploy_gke_app():
+                secrets = graph.result('secrets')
+                if redis:
+                    secrets = dict(secrets, redis=graph.result('cache'))
+                return self.deploy_workflow.deploy_gke_app_to_cluster(
                     project_id, cluster_name, django_directory_path,
-                    django_project_name, image_name, secrets)
+                    django_project_name, secrets)
+
+            graph.add_step(
+                'cluster',
+                lambda: self.deploy_workflow.create_gke_cluster(
+                    project_id,
+                    cluster_name,
+                    cancel_event=graph.cancel_event),
+                dependencies=['services'],
+                message='Create GKE Cluster')
+            # The image includes static/staticfiles.json, so it is only built
+            # once static files have been collected.
+            graph.add_step(
+                'image',
+                lambda: self.deploy_workflow.build_and_push_gke_image(
+                    django_directory_path, image_name),
+                dependencies=['services', 'collect_static'],
+                message='Build And Push Docker Image')
+            graph.add_step(
+                'deploy',
+                deploy_gke_app,
+                dependencies=(['cluster', 'image', 'secrets', 'database'] +
+                              deploy_dependencies),
+                message='Deployment')
         else:
-            self._upload_secrets_to_bucket(project_id, secrets)
 
-            # If the app engine service name is provided, then this function
-            # is run in E2E test.
-            is_new = appengine_service_name is None
-            with self._console_io.progressbar(
-                    300, '[8/{}]: Deployment'.format(self._TOTAL_NEW_STEPS)):
-                app_url = self.deploy_workflow.deploy_gae_app(
+            def deploy_gae_app():
+                self._upload_secrets_to_bucket(project_id,
+                                               graph.result('secrets'))
+
+                # If the app engine service name is provided, then this
+                # function is run in E2E test.
+                is_new = appengine_service_name is None
+                return self.deploy_workflow.deploy_gae_app(
                     project_id, django_directory_path, is_new=is_new)
 
+            graph.add_step(
+                'deploy',
+                deploy_gae_app,
+                # The deployed app includes static/staticfiles.json.
+                dependencies=['secrets', 'database', 'collect_static'],
+                message='Deployment')
+
+        app_url = graph.run()['deploy']
+
         # Create configuration file to save information needed in "update"
         # command.
         attributes = {
@@ -262,7 +400,8 @@ class WorkflowManager(object):
                        database_password: str,
                        cloud_sql_proxy_path: str = 'cloud_sql_proxy',
                        region: str = 'us-west1',
-                       open_browser: bool = True):
+                       open_browser: bool = True,
+                       delete_stale_static: bool = False):
         """Workflow of updating a deployed Django app.
 
         Args:
@@ -273,6 +412,8 @@ class WorkflowManager(object):
             region: Where the service is hosted.
             open_browser: Whether we open the browser to show the deployed app
                 at the end.
+            delete_stale_static: Whether to delete static files in the bucket
+                which do not exist in the Django project anymore.
 
         Raises:
             InvalidConfigError: When failed to read required information in the
@@ -316,23 +457,49 @@ class WorkflowManager(object):
         with self._console_io.progressbar(
                 120, '[2/{}]: Static Content Update'.format(
                     self._TOTAL_UPDATE_STEPS)):
-            self._static_content_workflow.update_static_content(
-                cloud_storage_bucket_name, static_content_dir)
-
-        with self._console_io.progressbar(
-                180,
-                '[3/{}]: Update Deployment'.format(self._TOTAL_UPDATE_STEPS)):
-            if backend == 'gke':
+            upload_stats = self._static_content_workflow.update_static_content(
+                cloud_storage_bucket_name,
+                static_content_dir,
+                delete_stale=delete_stale_static)
+        self._console_io.tell(self._format_upload_stats(upload_stats))
+
+        update_message = '[3/{}]: Update Deployment'.format(
+            self._TOTAL_UPDATE_STEPS)
+        if backend == 'gke':
+            # Most of the time is spent pulling and pushing docker layers, so
+            # the progress bar follows the bytes transferred.
+            with self._console_io.transfer_progressbar(
+                    update_message) as progress_callback:
                 app_url = self.deploy_workflow.update_gke_app(
-                    project_id, cluster_name, django_directory_path,
-                    django_project_name, image_name)
-            else:
+                    project_id,
+                    cluster_name,
+                    django_directory_path,
+                    django_project_name,
+                    image_name,
+                    progress_callback=progress_callback)
+        else:
+            with self._console_io.progressbar(180, update_message):
                 app_url = self.deploy_workflow.deploy_gae_app(
                     project_id, django_directory_path, is_new=False)
         self._console_io.tell('Your app is running at {}.'.format(app_url))
         if open_browser:
             webbrowser.open(app_url)
 
+    @staticmethod
+    def _format_upload_stats(
+            upload_stats: static_content_serve.UploadStats) -> str:
+        """Returns a message summarizing an upload of static content."""
+        message = ('Uploaded {} files ({:.1f} MB) in {:.1f}s ({:.1f} MB/s), '
+                   '{} unchanged files skipped.').format(
+                       upload_stats.files, upload_stats.total_bytes / 2**20,
+                       upload_stats.seconds,
+                       upload_stats.bytes_per_second / 2**20,
+                       upload_stats.skipped_files)
+        if upload_stats.deleted_files:
+            message += ' Deleted {} stale files.'.format(
+                upload_stats.deleted_files)
+        return message
+
     @staticmethod
     def _sanitize_name(name: str) -> str:
         """Convert a python identifier to a valid GCP resource name.
@@ -0,0 +1,59 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Workflow for managing the cache of the Django app."""
+
+import threading
+from typing import Dict, Optional
+
+from django_cloud_deploy.cloudlib import memorystore
+
+from google.auth import credentials
+
+
+class CacheWorkflow(object):
+    """A class to control workflow for setting up the cache for a Django app.
+    """
+
+    def __init__(self, credentials: credentials.Credentials):
+        self._memorystore_client = (
+            memorystore.MemorystoreClient.from_credentials(credentials))
+
+    def create_redis_instance(self,
+                              project_id: str,
+                              instance_name: str,
+                              region: str = 'us-west1',
+                              memory_size_gb: int = 1,
+                              cancel_event: Optional[threading.Event] = None
+                             ) -> Dict[str, str]:
+        """Create a Memorystore Redis instance to cache data of the app.
+
+        Args:
+            project_id: GCP project id.
+            instance_name: Name of the Redis instance to create or reuse.
+            region: Where the Redis instance should be. It is only reachable
+                from the same region.
+            memory_size_gb: The amount of memory, in GiB, of the instance.
+            cancel_event: When this event is set, waiting for the instance
+                stops.
+
+        Returns:
+            The endpoint of the instance, as a dictionary with its IP address
+            under "host" and its port under "port".
+        """
+        return self._memorystore_client.create_instance_sync(
+            project_id,
+            instance_name,
+            region,
+            memory_size_gb,
+            cancel_event=cancel_event)
@@ -13,6 +13,7 @@
 # limitations under the License.
 """Workflow for managing database of the Django app."""
 
+import threading
 from typing import Callable, Optional
 
 from django_cloud_deploy.cloudlib import database
@@ -39,7 +40,9 @@ class DatabaseWorkflow(object):
                                   database_user: str = 'postgres',
                                   cloud_sql_proxy_path: str = 'cloud_sql_proxy',
                                   region: str = 'us-west1',
-                                  port: Optional[int] = 5432):
+                                  port: Optional[int] = 5432,
+                                  cancel_event: Optional[threading.Event] = None
+                                 ):
         """Create a cloud database and set password for default user.
 
         Follows the steps found @
@@ -61,18 +64,25 @@ class DatabaseWorkflow(object):
             cloud_sql_proxy_path: The command to run your cloud sql proxy.
             region: Where the Cloud SQL instance is in.
             port: The port being forwarded by cloud sql proxy.
+            cancel_event: When this event is set, waiting for the Cloud SQL
+                instance stops.
         """
 
-        self._database_client.create_instance_sync(project_id, instance_name)
+        self._database_client.create_instance_sync(
+            project_id, instance_name, cancel_event=cancel_event)
         self._database_client.create_database_sync(project_id, instance_name,
                                                    database_name)
         self._database_client.set_database_password(
             project_id, instance_name, database_user, database_password)
-        self._database_client.migrate_database(
-            project_id, instance_name, cloud_sql_proxy_path, region, port)
-        self._database_client.create_super_user(
-            superuser_name, superuser_email, superuser_password, project_id,
-            instance_name, cloud_sql_proxy_path, region, port)
+        # Keep one cloud sql proxy running for both migrating the database and
+        # creating the super user.
+        with self._database_client.with_cloud_sql_proxy(
+                project_id, instance_name, cloud_sql_proxy_path, region, port):
+            self._database_client.migrate_database(
+                project_id, instance_name, cloud_sql_proxy_path, region, port)
+            self._database_client.create_super_user(
+                superuser_name, superuser_email, superuser_password,
+                project_id, instance_name, cloud_sql_proxy_path, region, port)
 
     def migrate_database(self,
                          project_id: str,
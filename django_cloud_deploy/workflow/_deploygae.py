@@ -16,14 +16,18 @@
 import os
 import shutil
 import subprocess
-import time
 import yaml
 
-from googleapiclient import discovery
+from django_cloud_deploy.cloudlib import discovery_client
+from django_cloud_deploy.cloudlib import operation
 
 from google.auth import credentials
 
 
+# Seconds to wait for a new App Engine application to be created.
+_CREATE_APP_TIMEOUT = 10 * 60
+
+
 class DeployNewAppError(Exception):
     """A class to control the workflow for deploying an Django app to GAE."""
 
@@ -32,8 +36,8 @@ class DeploygaeWorkflow(object):
     """Workflow to deploy Django app on GAE."""
 
     def __init__(self, credentials: credentials.Credentials):
-        self._appengine_service = discovery.build(
-            'appengine', 'v1', credentials=credentials, cache_discovery=False)
+        self._appengine_service = discovery_client.build(
+            'appengine', 'v1', credentials)
 
     def _create_app(self, project_id: str, region: str):
         """Synchronously create an App Engine application in the project."""
@@ -46,17 +50,14 @@ class DeploygaeWorkflow(object):
         # The creation response will be reference to an on-going operation.
         # Pool the operation until it is complete or returns an error. See:
         # https://cloud.google.com/appengine/docs/admin-api/creating-an-application
-        operation_id = create_response['name'].split('/')[-1]
-        while True:
-            operation = self._appengine_service.apps().operations().get(
-                appsId=project_id, operationsId=operation_id).execute()
-            if 'error' in operation:
-                raise DeployNewAppError(
-                    'Failed to create App Engine app: {}'.format(
-                        operation['error']))
-            elif operation.get('done'):
-                break
-            time.sleep(2)
+        try:
+            operation.wait(
+                operation.appengine_operation(self._appengine_service,
+                                              project_id, create_response),
+                _CREATE_APP_TIMEOUT)
+        except operation.OperationError as e:
+            raise DeployNewAppError(
+                'Failed to create App Engine app: {}'.format(e)) from e
 
     def deploy_gae_app(self,
                        project_id: str,
@@ -15,10 +15,11 @@
 
 import base64
 import os
-from typing import Dict
+import threading
+from typing import Any, Callable, Dict, Optional
 import urllib.parse
 
-import backoff
+from django_cloud_deploy import config
 from django_cloud_deploy.cloudlib import container
 import kubernetes
 import yaml
@@ -34,6 +35,11 @@ class DeployNewAppError(Exception):
 class DeploygkeWorkflow(object):
     """A class to control the workflow for deploying an Django app to GKE."""
 
+    # Keys in the configuration file of the Django app describing the last
+    # pushed docker image.
+    _FINGERPRINT_CONFIG_KEY = 'build_context_fingerprint'
+    _DIGEST_CONFIG_KEY = 'image_digest'
+
     def __init__(self, credentials: credentials.Credentials):
         self._container_client = container.ContainerClient.from_credentials(
             credentials)
@@ -68,44 +74,156 @@ class DeploygkeWorkflow(object):
             The url of the deployed Django app.
         """
 
+        self.create_cluster_sync(project_id, cluster_name, region, zone)
+        self.build_and_push_image(app_directory, image_name)
+        return self.deploy_app_to_cluster(project_id, cluster_name,
+                                          app_directory, app_name, secrets,
+                                          zone)
+
+    def create_cluster_sync(self,
+                            project_id: str,
+                            cluster_name: str,
+                            region: str = 'us-west1',
+                            zone: str = 'us-west1-a',
+                            cancel_event: Optional[threading.Event] = None):
+        """Create the GKE cluster to host the app and wait for it to run.
+
+        Args:
+            project_id: GCP project id.
+            cluster_name: Name of the cluster to host the app.
+            region: Where do you want to host the cluster.
+            zone: Name of the Google Compute Engine zone in which the cluster
+                resides.
+            cancel_event: When this event is set, waiting for the cluster
+                stops.
+        """
         self._container_client.create_cluster_sync(project_id, cluster_name,
-                                                   region, zone)
-        self._container_client.build_docker_image(image_name, app_directory)
-        self._container_client.push_docker_image(image_name)
+                                                   region, zone, cancel_event)
+
+    def build_and_push_image(
+            self,
+            app_directory: str,
+            image_name: str,
+            progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> bool:
+        """Build the docker image of the app and push it to gcr.io.
+
+        The fingerprint of the build context and the digest of the pushed image
+        are saved in the configuration file of the app. If the build context
+        did not change since then, and the tag still points to the same image
+        in gcr.io, the image is neither built nor pushed again.
+
+        The build reuses the layers of the previously pushed image.
+
+        Args:
+            app_directory: Absolute path of the directory of your Django app.
+            image_name: Tag of the docker image of the app.
+            progress_callback: Called with the number of bytes transferred so
+                far and the total number of bytes known to be transferred, over
+                pulling cached layers, sending the build context to the docker
+                daemon and pushing the image.
+
+        Returns:
+            Whether a new image was built and pushed.
+        """
+        config_obj = config.Configuration(app_directory)
+        # The configuration file is rewritten after every push, so it must not
+        # be part of the build context.
+        context = self._container_client.get_build_context(
+            app_directory, [config.Configuration.FILE_NAME])
+        fingerprint = context.fingerprint
+        pushed_digest = config_obj.get(self._DIGEST_CONFIG_KEY)
+        if (pushed_digest and
+                config_obj.get(self._FINGERPRINT_CONFIG_KEY) == fingerprint and
+                self._container_client.get_remote_image_digest(image_name) ==
+                pushed_digest):
+            return False
+
+        transfer_progress = container.TransferProgress(progress_callback)
+        self._container_client.build_docker_image(
+            image_name,
+            app_directory,
+            cache_from=[image_name],
+            progress_callback=transfer_progress.transfer('build'),
+            context=context)
+        digest = self._container_client.push_docker_image(
+            image_name, progress_callback=transfer_progress.transfer('push'))
+        config_obj.set(self._FINGERPRINT_CONFIG_KEY, fingerprint)
+        config_obj.set(self._DIGEST_CONFIG_KEY, digest)
+        config_obj.save()
+        return True
+
+    def deploy_app_to_cluster(self,
+                              project_id: str,
+                              cluster_name: str,
+                              app_directory: str,
+                              app_name: str,
+                              secrets: Dict[str, Dict[str, str]],
+                              zone: str = 'us-west1-a') -> str:
+        """Deploy a Django app to an existing cluster.
+
+        The cluster should be running and the docker image of the app should be
+        pushed before calling this method.
+
+        All Kubernetes objects of the app are applied: objects which already
+        exist are only updated if they changed, so this can be run again after
+        a partial deployment.
+
+        Args:
+            project_id: GCP project id.
+            cluster_name: Name of the cluster to host the app.
+            app_directory: Absolute path of the directory of your Django app.
+            app_name: Name of the Django app.
+            secrets: Secrets necessary to run the app.
+            zone: Name of the Google Compute Engine zone in which the cluster
+                resides.
+
+        Raises:
+            DeployNewAppError: If unable to deploy the app.
+
+        Returns:
+            The url of the deployed Django app.
+        """
         yaml_file_path = os.path.join(app_directory, app_name + '.yaml')
         with open(yaml_file_path) as yaml_file:
-            for data in yaml.load_all(yaml_file):
-                if data['kind'] == 'Deployment':
-                    deployment_data = data
-                elif data['kind'] == 'Service':
-                    service_data = data
+            manifests = [
+                data for data in yaml.safe_load_all(yaml_file) if data
+            ]
+        kinds = [data.get('kind') for data in manifests]
 
         # This happens if the generated Django app does not have a valid yaml
         # file.
-        if not deployment_data or not service_data:
+        if 'Deployment' not in kinds or 'Service' not in kinds:
             raise DeployNewAppError(
                 ('Invalid kubernetes configuration file for Django app '
                  '"{}" in "{}"').format(app_name, app_directory))
         kube_config = self._container_client.create_kubernetes_configuration(
             self._credentials, project_id, cluster_name, zone)
+        secret_manifests = []
         for secret_name, secret in secrets.items():
+            data = {}
             for key, value in secret.items():
                 if isinstance(value, str):
                     value = value.encode('utf-8')
 
                 # Kubernetes api only accepts base64 encoded strings.
                 # See https://github.com/kubernetes-client/python/blob/master/kubernetes/docs/V1Secret.md  # noqa: E501
-                secret[key] = base64.standard_b64encode(value).decode('utf-8')
-            secret_data = kubernetes.client.V1Secret(
-                api_version='v1',
-                data=secret,
-                kind='Secret',
-                metadata={'name': secret_name})
-            self._container_client.create_secret(secret_data, kube_config)
-        self._container_client.create_deployment(deployment_data, kube_config)
-        self._wait_for_deployment_ready(kube_config, app_name)
-        self._container_client.create_service(service_data, kube_config)
-        ingress_url = self._get_ingress_url(kube_config)
+                data[key] = base64.standard_b64encode(value).decode('utf-8')
+            secret_manifests.append({
+                'apiVersion': 'v1',
+                'kind': 'Secret',
+                'metadata': {
+                    'name': secret_name
+                },
+                'data': data,
+            })
+        try:
+            self._container_client.apply_manifests(
+                secret_manifests + manifests, kube_config)
+        except container.ManifestApplyError as e:
+            raise DeployNewAppError(str(e)) from e
+        self._wait_for_app_ready(kube_config, app_name)
+        ingress_url = self._get_ingress_url(kube_config, app_name)
         return ingress_url
 
     def update_app_sync(self,
@@ -114,9 +232,16 @@ class DeploygkeWorkflow(object):
                         app_directory: str,
                         app_name: str,
                         image_name: str,
-                        zone: str = 'us-west1-a') -> str:
+                        zone: str = 'us-west1-a',
+                        progress_callback: Optional[Callable[[int, int],
+                                                             None]] = None
+                       ) -> str:
         """Update an existing Django app on gke.
 
+        The deployment of the app gets a rolling update. The other Kubernetes
+        objects of the app, e.g. its autoscaler, are applied, so they are
+        created or updated if they changed.
+
         Args:
             project_id: GCP project id.
             cluster_name: Name of the cluster to host the app.
@@ -125,6 +250,9 @@ class DeploygkeWorkflow(object):
             image_name: Tag of the docker image of the app.
             zone: Name of the Google Compute Engine zone in which the cluster
                 resides.
+            progress_callback: Called with the number of bytes transferred so
+                far while building and pushing the docker image of the app,
+                and the total number of bytes known to be transferred.
 
         Raises:
             DeployNewAppError: If unable to deploy the app.
@@ -132,13 +260,18 @@ class DeploygkeWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        self._container_client.build_docker_image(image_name, app_directory)
-        self._container_client.push_docker_image(image_name)
+        self.build_and_push_image(app_directory, image_name, progress_callback)
+        deployment_data = None
+        other_manifests = []
         yaml_file_path = os.path.join(app_directory, app_name + '.yaml')
         with open(yaml_file_path) as yaml_file:
-            for data in yaml.load_all(yaml_file):
+            for data in yaml.safe_load_all(yaml_file):
+                if not data:
+                    continue
                 if data['kind'] == 'Deployment':
                     deployment_data = data
+                else:
+                    other_manifests.append(data)
 
         # This happens if the generated Django app does not have a valid yaml
         # file.
@@ -148,68 +281,91 @@ class DeploygkeWorkflow(object):
                  '"{}" in "{}"').format(app_name, app_directory))
         kube_config = self._container_client.create_kubernetes_configuration(
             self._credentials, project_id, cluster_name, zone)
-        self._container_client.update_deployment(deployment_data, kube_config)
-        self._wait_for_deployment_ready(kube_config, app_name)
-        ingress_url = self._get_ingress_url(kube_config)
+        try:
+            self._container_client.apply_manifests(other_manifests,
+                                                   kube_config)
+        except container.ManifestApplyError as e:
+            raise DeployNewAppError(str(e)) from e
+        # Refer to the pushed image by its digest, so that the pod template
+        # only changes, and pods are only replaced, when the image does.
+        digest = config.Configuration(app_directory).get(
+            self._DIGEST_CONFIG_KEY)
+        pinned = digest and self._pin_image_digest(deployment_data,
+                                                   image_name, digest)
+        generation = self._container_client.update_deployment(
+            deployment_data, kube_config, restart=not pinned)
+        try:
+            self._container_client.wait_for_deployment_rollout(
+                deployment_data['metadata']['name'], generation, kube_config)
+        except container.DeploymentRolloutError as e:
+            raise DeployNewAppError(str(e)) from e
+        ingress_url = self._get_ingress_url(kube_config, app_name)
         return ingress_url
 
-    def _get_ingress_url(self,
-                         kube_config: kubernetes.client.Configuration) -> str:
-        """Returns the URL that can be used to access the app.
+    @staticmethod
+    def _pin_image_digest(deployment_data: Dict[str, Any], image_name: str,
+                          digest: str) -> bool:
+        """Make the containers using the given image refer to its digest.
 
         Args:
-            kube_config: A kubernetes configuration which has access to the
-                given cluster.
+            deployment_data: Definition of the deployment, updated in place.
+            image_name: Tag of the docker image of the app.
+            digest: Digest of the image, e.g. "sha256:1234...".
 
         Returns:
-            Url of the deployed Django app.
+            Whether any container of the deployment uses the image.
         """
+        pinned = False
+        for container_data in (
+                deployment_data['spec']['template']['spec']['containers']):
+            if container_data.get('image') == image_name:
+                container_data['image'] = '{}@{}'.format(image_name, digest)
+                pinned = True
+        return pinned
 
-        api_client = kubernetes.client.ApiClient(kube_config)
-        api = kubernetes.client.CoreV1Api(api_client)
-        return self._try_get_ingress_url(api)
+    def _wait_for_app_ready(self,
+                            kube_config: kubernetes.client.Configuration,
+                            app_name: str):
+        """Wait for the deployment of the Django app to have a ready pod.
 
-    @backoff.on_predicate(backoff.constant, interval=0.5, logger=None)
-    def _try_get_ingress_url(self, api: kubernetes.client.CoreV1Api) -> str:
-        """Return Ingress url when service is ready."""
-        items = api.list_service_for_all_namespaces().items
-        for item in items:
-            ingress = item.status.load_balancer.ingress
-            if ingress:
-                return 'http://{}/'.format(ingress[0].hostname or ingress[0].ip)
+        Args:
+            kube_config: A kubernetes configuration which has access to the
+                given cluster.
+            app_name: Name of the Django app.
 
-        # @backoff.on_predicate(backoff.constant) will keep running this method
-        # until it gets a non-falsey result. Return value of '' means that the
-        # service is not ready yet.
-        return ''
+        Raises:
+            DeployNewAppError: If no pod gets ready in time.
+        """
+        try:
+            self._container_client.wait_for_deployment_ready(
+                self._label_selector(app_name), kube_config)
+        except container.WatchTimeoutError as e:
+            raise DeployNewAppError(str(e)) from e
 
-    def _wait_for_deployment_ready(
-            self, kube_config: kubernetes.client.Configuration, app_name: str):
-        """Wait for the deployment of Django app to get ready.
+    def _get_ingress_url(self, kube_config: kubernetes.client.Configuration,
+                         app_name: str) -> str:
+        """Returns the URL that can be used to access the app.
 
         Args:
             kube_config: A kubernetes configuration which has access to the
                 given cluster.
             app_name: Name of the Django app.
+
+        Raises:
+            DeployNewAppError: If the service of the app does not get an
+                external address in time.
+
+        Returns:
+            Url of the deployed Django app.
         """
+        try:
+            address = self._container_client.wait_for_service_ingress(
+                self._label_selector(app_name), kube_config)
+        except container.WatchTimeoutError as e:
+            raise DeployNewAppError(str(e)) from e
+        return 'http://{}/'.format(address)
 
-        api_client = kubernetes.client.ApiClient(kube_config)
-        api = kubernetes.client.ExtensionsV1beta1Api(api_client)
-        label_selector = '='.join(['app', app_name])
-        self._try_get_ready_replicas(api, label_selector)
-
-    @backoff.on_predicate(backoff.constant, interval=0.5, logger=None)
-    def _try_get_ready_replicas(self,
-                                api: kubernetes.client.ExtensionsV1beta1Api,
-                                label_selector: str) -> int:
-        """Return ready replicas when deployment is ready."""
-        items = api.list_deployment_for_all_namespaces(
-            label_selector=label_selector).items
-        for item in items:
-            if item.status.ready_replicas:
-                return item.status.ready_replicas
-
-        # @backoff.on_predicate(backoff.constant) will keep running this method
-        # until it gets a non-falsey result. Return value of 0 means that the
-        # deployment is not ready yet.
-        return 0
+    @staticmethod
+    def _label_selector(app_name: str) -> str:
+        """Returns the selector of the Kubernetes objects of the app."""
+        return '='.join(['app', app_name])
@@ -48,9 +48,8 @@ class EnableServiceWorkflow(object):
         """
 
         services = services or EnableServiceWorkflow.load_services()
-        for service in services:
-            self._enable_service_client.enable_service_sync(
-                project_id, service['name'])
+        self._enable_service_client.enable_services_sync(
+            project_id, [service['name'] for service in services])
 
     @staticmethod
     def load_services() -> List[Dict[str, str]]:
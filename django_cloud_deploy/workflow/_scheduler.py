@@ -0,0 +1,218 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs workflow steps concurrently while respecting their dependencies."""
+
+from concurrent import futures
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class StepGraphError(Exception):
+    """An exception raised when the step graph is not valid."""
+
+
+class _Step(object):
+    """A single unit of work in a StepGraph."""
+
+    def __init__(self, name: str, func: Callable[[], Any],
+                 dependencies: Iterable[str], message: Optional[str]):
+        self.name = name
+        self.func = func
+        self.dependencies = frozenset(dependencies)
+        self.message = message
+
+
+class StepGraph(object):
+    """A declarative graph of workflow steps.
+
+    Steps are added with the names of the steps they depend on. When the graph
+    is run, every step whose dependencies have completed is submitted to a
+    thread pool, so independent steps (e.g. creating a Cloud SQL instance and a
+    GKE cluster) wait on GCP operations at the same time instead of one after
+    another.
+
+    Example:
+        graph = StepGraph()
+        graph.add_step('project', create_project)
+        graph.add_step('database', create_database, dependencies=['project'])
+        graph.add_step('cluster', create_cluster, dependencies=['project'])
+        graph.add_step('deploy', lambda: deploy(graph.result('cluster')),
+                       dependencies=['database', 'cluster'])
+        graph.run()
+
+    Steps waiting on long operations should pass "cancel_event" to their
+    waiters, so that they stop as soon as another step failed.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = 8,
+            on_step_start: Optional[Callable[[str], None]] = None,
+            on_step_finish: Optional[Callable[[str, float], None]] = None):
+        """Constructor of the class.
+
+        Args:
+            max_workers: The maximum number of steps that can run at the same
+                time.
+            on_step_start: A function called with the message of a step right
+                before the step starts. Steps without messages are not
+                reported.
+            on_step_finish: A function called with the message of a step and
+                the number of seconds it took, after the step finished
+                successfully. It is called from the thread running the graph,
+                one step at a time. Steps without messages are not reported.
+        """
+        self._max_workers = max_workers
+        self._on_step_start = on_step_start
+        self._on_step_finish = on_step_finish
+        self._steps = {}  # type: Dict[str, _Step]
+        self._results = {}  # type: Dict[str, Any]
+        self._results_lock = threading.Lock()
+        # Set when a step fails.
+        self.cancel_event = threading.Event()
+
+    def add_step(self,
+                 name: str,
+                 func: Callable[[], Any],
+                 dependencies: Optional[Iterable[str]] = None,
+                 message: Optional[str] = None):
+        """Add a step to the graph.
+
+        Args:
+            name: Unique name of the step.
+            func: The function doing the work of the step. Its return value
+                can be retrieved with "result" by steps depending on it.
+            dependencies: Names of the steps which must finish before this step
+                starts.
+            message: A message describing the step, passed to "on_step_start"
+                and "on_step_finish".
+
+        Raises:
+            StepGraphError: If a step with the same name already exists.
+        """
+        if name in self._steps:
+            raise StepGraphError('duplicate step {!r}'.format(name))
+        self._steps[name] = _Step(name, func, dependencies or [], message)
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def result(self, name: str) -> Any:
+        """Returns the return value of a finished step.
+
+        Args:
+            name: Name of the step.
+
+        Raises:
+            StepGraphError: If the step has not finished.
+        """
+        with self._results_lock:
+            if name not in self._results:
+                raise StepGraphError(
+                    'step {!r} has not finished yet'.format(name))
+            return self._results[name]
+
+    def _validate(self):
+        """Check that all dependencies exist and the graph has no cycle.
+
+        Raises:
+            StepGraphError: If the graph is not a valid DAG.
+        """
+        for step in self._steps.values():
+            unknown = step.dependencies - set(self._steps)
+            if unknown:
+                raise StepGraphError(
+                    'step {!r} depends on unknown steps {!r}'.format(
+                        step.name, sorted(unknown)))
+
+        # Kahn's algorithm. Any step left unvisited is part of a cycle.
+        remaining = {
+            name: set(step.dependencies) for name, step in self._steps.items()
+        }
+        ready = [name for name, deps in remaining.items() if not deps]
+        visited = 0
+        while ready:
+            done = ready.pop()
+            visited += 1
+            for name, deps in remaining.items():
+                if done in deps:
+                    deps.remove(done)
+                    if not deps:
+                        ready.append(name)
+        if visited != len(self._steps):
+            raise StepGraphError('steps {!r} form a dependency cycle'.format(
+                sorted(name for name, deps in remaining.items() if deps)))
+
+    def _run_step(self, step: _Step) -> float:
+        """Run a step and returns the number of seconds it took."""
+        if self._on_step_start and step.message:
+            self._on_step_start(step.message)
+        start = time.monotonic()
+        result = step.func()
+        with self._results_lock:
+            self._results[step.name] = result
+        return time.monotonic() - start
+
+    def run(self) -> Dict[str, Any]:
+        """Run all steps, each as soon as its dependencies have finished.
+
+        If a step raises, no new steps are started and "cancel_event" is set,
+        so that running steps waiting on it stop early. The steps already
+        running are waited on and the exception of the failed step is
+        re-raised.
+
+        Returns:
+            A dictionary mapping step names to their return values.
+
+        Raises:
+            StepGraphError: If the graph is not a valid DAG.
+        """
+        self._validate()
+        finished = set()
+        pending = dict(self._steps)
+        running = {}  # type: Dict[futures.Future, str]
+        error = None  # type: Optional[BaseException]
+
+        with futures.ThreadPoolExecutor(
+                max_workers=self._max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    startable = [
+                        step for step in pending.values()
+                        if step.dependencies <= finished
+                    ]  # type: List[_Step]
+                    for step in startable:
+                        del pending[step.name]
+                        running[executor.submit(self._run_step, step)] = (
+                            step.name)
+                if not running:
+                    break
+                done, _ = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    exception = future.exception()
+                    if exception is not None:
+                        error = error or exception
+                        self.cancel_event.set()
+                    else:
+                        finished.add(name)
+                        message = self._steps[name].message
+                        if self._on_step_finish and message:
+                            self._on_step_finish(message, future.result())
+
+        if error is not None:
+            raise error
+        return dict(self._results)
@@ -26,8 +26,20 @@ class StaticContentServeWorkflow(object):
             static_content_serve.StaticContentServeClient.from_credentials(
                 credentials))
 
-    def serve_static_content(self, project_id: str, bucket_name: str,
-                             static_content_dir: str):
+    def collect_static_content(self):
+        """Collect the static content of the provided project.
+
+        This also writes "static/staticfiles.json", which the app needs at
+        runtime to find its content-hashed static files.
+        """
+        self._static_content_serve_client.collect_static_content()
+
+    def serve_static_content(
+            self,
+            project_id: str,
+            bucket_name: str,
+            static_content_dir: str,
+            collect: bool = True) -> static_content_serve.UploadStats:
         """Do all the work for serving static content of the provided project.
 
         The static content is served with a public Google Cloud Storage Bucket.
@@ -37,13 +49,19 @@ class StaticContentServeWorkflow(object):
             bucket_name: Name of the bucket to create and serve static content.
             static_content_dir: Absolute path of the directory for static
                 content.
+            collect: Whether to collect the static content first. False if
+                collect_static_content was already called.
+
+        Returns:
+            Summary of the static content upload.
         """
 
-        self._static_content_serve_client.collect_static_content()
+        if collect:
+            self._static_content_serve_client.collect_static_content()
         self._static_content_serve_client.create_bucket(project_id, bucket_name)
         self._static_content_serve_client.make_bucket_public(bucket_name)
-        self._static_content_serve_client.upload_content(
-            bucket_name, static_content_dir)
+        return self._static_content_serve_client.sync_content(
+            bucket_name, static_content_dir, web_assets=True)
 
     def serve_secret_content(self, project_id: str, bucket_name: str,
                              secrec_content_dir: str):
@@ -62,14 +80,28 @@ class StaticContentServeWorkflow(object):
         self._static_content_serve_client.upload_content(
             bucket_name, secrec_content_dir, gcs_folder_root='secrets')
 
-    def update_static_content(self, bucket_name: str, static_content_dir: str):
+    def update_static_content(
+            self,
+            bucket_name: str,
+            static_content_dir: str,
+            delete_stale: bool = False) -> static_content_serve.UploadStats:
         """Update GCS bucket after user modified the Django app.
 
+        Only new and modified static files are uploaded.
+
         Args:
             bucket_name: Name of the bucket to create and serve static content.
             static_content_dir: Absolute path of the directory for static
                 content.
+            delete_stale: Whether to delete static files in the bucket which
+                do not exist locally anymore.
+
+        Returns:
+            Summary of the static content upload.
         """
         self._static_content_serve_client.collect_static_content()
-        self._static_content_serve_client.upload_content(
-            bucket_name, static_content_dir)
+        return self._static_content_serve_client.sync_content(
+            bucket_name,
+            static_content_dir,
+            delete_stale=delete_stale,
+            web_assets=True)
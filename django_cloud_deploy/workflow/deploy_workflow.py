@@ -13,10 +13,8 @@
 # limitations under the License.
 """Workflow to to fork between GKE and GAE."""
 
-from typing import Dict
-
-from django_cloud_deploy.workflow import _deploygae
-from django_cloud_deploy.workflow import _deploygke
+import threading
+from typing import Callable, Dict, Optional
 
 
 class DeployWorkflow(object):
@@ -24,6 +22,26 @@ class DeployWorkflow(object):
 
     def __init__(self, credentials):
         self.credentials = credentials
+        self._gke_workflow_instance = None
+        self._gke_workflow_lock = threading.Lock()
+
+    # The backend workflows are imported only when used, so that deploying to
+    # GAE does not load kubernetes and docker, which are slow to import.
+
+    def _gae_workflow(self):
+        from django_cloud_deploy.workflow import _deploygae
+        return _deploygae.DeploygaeWorkflow(self.credentials)
+
+    def _gke_workflow(self):
+        # Creating the GKE workflow refreshes the credentials and logs in to
+        # gcr.io, so it is only done once, even when steps creating the
+        # cluster and building the image call this at the same time.
+        with self._gke_workflow_lock:
+            if self._gke_workflow_instance is None:
+                from django_cloud_deploy.workflow import _deploygke
+                self._gke_workflow_instance = _deploygke.DeploygkeWorkflow(
+                    self.credentials)
+            return self._gke_workflow_instance
 
     def deploy_gae_app(self,
                        project_id: str,
@@ -45,7 +63,7 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygae.DeploygaeWorkflow(self.credentials)
+        workflow = self._gae_workflow()
         return workflow.deploy_gae_app(project_id, django_directory_path,
                                        region, is_new)
 
@@ -77,18 +95,91 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygke.DeploygkeWorkflow(self.credentials)
+        workflow = self._gke_workflow()
         return workflow.deploy_new_app_sync(project_id, cluster_name,
                                             app_directory, app_name, image_name,
                                             secrets, region, zone)
 
+    def create_gke_cluster(self,
+                           project_id: str,
+                           cluster_name: str,
+                           region: str = 'us-west1',
+                           zone: str = 'us-west1-a',
+                           cancel_event: Optional[threading.Event] = None):
+        """Create the GKE cluster to host a Django app.
+
+        Args:
+            project_id: GCP project id.
+            cluster_name: Name of the cluster to host the app.
+            region: Where do you want to host the cluster.
+            zone: Name of the Google Compute Engine zone in which the cluster
+                resides.
+            cancel_event: When this event is set, waiting for the cluster
+                stops.
+        """
+        workflow = self._gke_workflow()
+        workflow.create_cluster_sync(project_id, cluster_name, region, zone,
+                                     cancel_event)
+
+    def build_and_push_gke_image(
+            self,
+            app_directory: str,
+            image_name: str,
+            progress_callback: Optional[Callable[[int, int], None]] = None):
+        """Build the docker image of a Django app and push it to gcr.io.
+
+        Args:
+            app_directory: Absolute path of the directory of your Django app.
+            image_name: Tag of the docker image of the app.
+            progress_callback: Called with the number of bytes transferred so
+                far and the total number of bytes known to be transferred.
+        """
+        workflow = self._gke_workflow()
+        workflow.build_and_push_image(app_directory, image_name,
+                                      progress_callback)
+
+    def deploy_gke_app_to_cluster(self,
+                                  project_id: str,
+                                  cluster_name: str,
+                                  app_directory: str,
+                                  app_name: str,
+                                  secrets: Dict[str, Dict[str, str]],
+                                  zone: str = 'us-west1-a') -> str:
+        """Deploy a Django app to an existing GKE cluster.
+
+        Should be called after "create_gke_cluster" and
+        "build_and_push_gke_image".
+
+        Args:
+            project_id: GCP project id.
+            cluster_name: Name of the cluster to host the app.
+            app_directory: Absolute path of the directory of your Django app.
+            app_name: Name of the Django app.
+            secrets: Secrets necessary to run the app.
+            zone: Name of the Google Compute Engine zone in which the cluster
+                resides.
+
+        Raises:
+            DeployNewAppError: If unable to deploy the app.
+
+        Returns:
+            The url of the deployed Django app.
+        """
+        workflow = self._gke_workflow()
+        return workflow.deploy_app_to_cluster(project_id, cluster_name,
+                                              app_directory, app_name, secrets,
+                                              zone)
+
     def update_gke_app(self,
                        project_id: str,
                        cluster_name: str,
                        app_directory: str,
                        app_name: str,
                        image_name: str,
-                       zone: str = 'us-west1-a') -> str:
+                       zone: str = 'us-west1-a',
+                       progress_callback: Optional[Callable[[int, int],
+                                                            None]] = None
+                      ) -> str:
         """Update an existing Django app on gke.
 
         Args:
@@ -99,6 +190,9 @@ class DeployWorkflow(object):
             image_name: Tag of the docker image of the app.
             zone: Name of the Google Compute Engine zone in which the cluster
                 resides.
+            progress_callback: Called with the number of bytes transferred so
+                far while building and pushing the docker image of the app,
+                and the total number of bytes known to be transferred.
 
         Raises:
             DeployNewAppError: If unable to deploy the app.
@@ -106,6 +200,7 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygke.DeploygkeWorkflow(self.credentials)
+        workflow = self._gke_workflow()
         return workflow.update_app_sync(project_id, cluster_name, app_directory,
-                                        app_name, image_name, zone)
+                                        app_name, image_name, zone,
+                                        progress_callback)